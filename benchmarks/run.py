@@ -0,0 +1,292 @@
+#! /usr/bin/env python3
+
+# Benchmarks for the lt8900_spi hot paths, run against the simulated
+# radio from lt8900_spi.simulator.  Results are written as JSON so that
+# releases can be compared, and the number of SPI transactions used by
+# each logical operation is checked against the limits below.
+#
+# Usage:
+#     python3 benchmarks/run.py [--iterations N] [--output FILE] [--no-check]
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lt8900_spi
+from lt8900_spi.simulator import SimulatedAir, SimulatedLT8900
+
+# Upper limits on SPI usage per logical operation.  A transaction is a
+# single call into the transport (one ioctl), a transfer is a single
+# chip-select framed register access within a transaction.  Bursts in
+# multi_transmit read the FIFO state with each status poll, to see
+# whether an acknowledgement emptied the FIFO
+expected_spi_usage = {
+	'initialize':               {'transactions': 3,  'transfers': 15},
+	'set_syncword':             {'transactions': 4,  'transfers': 4},
+	'transmit':                 {'transactions': 2,  'transfers': 5},
+	'transmit_current_channel': {'transactions': 3,  'transfers': 6},
+	'multi_transmit':           {'transactions': 18, 'transfers': 45},
+	'receive':                  {'transactions': 3,  'transfers': 3}
+}
+
+syncword = [0x258B, 0x147A]
+message = [0xB0, 0x51, 0xF0, 0x00, 0x00, 0x01, 212]
+
+class TimestampedPacketReadyEvent(lt8900_spi.PacketReadyEvent):
+	# Records when the simulated radio raised PKT_FLAG
+	def __init__(self):
+		super().__init__()
+		self.set_time = None
+
+	def set(self):
+		self.set_time = time.perf_counter()
+		super().set()
+
+def new_radio(air = None, config = None, **chip_args):
+	chip = SimulatedLT8900(air, **chip_args)
+
+	radio_config = {
+		'transport': chip,
+		'reset_command': chip.reset
+	}
+	if config is not None:
+		radio_config.update(config)
+
+	radio = lt8900_spi.Radio(0, 0, radio_config)
+	if not radio.initialize():
+		raise ValueError('Initialize failed')
+	radio.set_syncword(syncword)
+
+	return (radio, chip)
+
+def percentile(samples, fraction):
+	ordered = sorted(samples)
+	index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+	return ordered[index]
+
+def summarize(samples, elapsed):
+	return {
+		'count': len(samples),
+		'per_second': len(samples) / elapsed if elapsed > 0 else None,
+		'p50_usec': percentile(samples, 0.50) * 1000000.0,
+		'p99_usec': percentile(samples, 0.99) * 1000000.0,
+		'mean_usec': (sum(samples) / len(samples)) * 1000000.0
+	}
+
+def bench_transmit(iterations, config = None):
+	radio, chip = new_radio(config = config)
+
+	samples = []
+	start = time.perf_counter()
+	for index in range(iterations):
+		before = time.perf_counter()
+		radio.transmit(message, 9)
+		samples.append(time.perf_counter() - before)
+	elapsed = time.perf_counter() - start
+
+	return summarize(samples, elapsed)
+
+def bench_multi_transmit(iterations):
+	radio, chip = new_radio()
+
+	samples = []
+	start = time.perf_counter()
+	for index in range(iterations):
+		before = time.perf_counter()
+		radio.multi_transmit(message, [9, 40, 71], retries = 3, delay = 0)
+		samples.append(time.perf_counter() - before)
+	elapsed = time.perf_counter() - start
+
+	result = summarize(samples, elapsed)
+	result['packets_per_second'] = len(chip.transmitted) / elapsed
+
+	return result
+
+def bench_receive(iterations, use_event):
+	# Time from the packet arriving at the receiving radio until
+	# receive() returns it
+	air = SimulatedAir()
+	event = TimestampedPacketReadyEvent()
+	rx_config = {}
+	if use_event:
+		rx_config['packet_ready_event'] = event
+	sender, sender_chip = new_radio(air)
+	receiver, receiver_chip = new_radio(air, rx_config, packet_ready_event = event)
+
+	samples = []
+	def receive_packets():
+		for index in range(iterations):
+			receiver.receive(channel = 9, wait = True, wait_time = 0.001)
+			samples.append(time.perf_counter() - event.set_time)
+
+	thread = threading.Thread(target = receive_packets, daemon = True)
+	thread.start()
+
+	start = time.perf_counter()
+	for index in range(iterations):
+		# Wait for the receiver to be listening again
+		while not (receiver_chip._is_listening(9) and not receiver_chip.packet_flag):
+			time.sleep(0.0001)
+		sender.transmit(message, 9)
+		while len(samples) <= index and thread.is_alive():
+			time.sleep(0.0001)
+	thread.join()
+	elapsed = time.perf_counter() - start
+
+	return summarize(samples, elapsed)
+
+def bench_queue(queues, items_per_queue):
+	radio, chip = new_radio(config = {'use_software_tx_queue': True})
+
+	total = queues * items_per_queue
+	start = time.perf_counter()
+	for index in range(items_per_queue):
+		for queue in range(queues):
+			radio.transmit(message, 9, syncword = syncword, submit_queue = 'queue-{}'.format(queue))
+
+	while len(chip.transmitted) < total:
+		time.sleep(0.0001)
+	elapsed = time.perf_counter() - start
+
+	radio.configure({'use_software_tx_queue': False})
+
+	return {
+		'queues': queues,
+		'items': total,
+		'elapsed_sec': elapsed,
+		'items_per_second': total / elapsed
+	}
+
+def bench_queue_priority(bulk_items, urgent_items):
+	# Time taken to send urgent items queued behind a backlog of bulk
+	# items, the simulated radio is slowed down so the backlog lasts
+	radio, chip = new_radio(config = {
+		'use_software_tx_queue': True,
+		'queue_config': {'urgent': {'priority': 10}}
+	}, latency = 0.0005)
+
+	for index in range(bulk_items):
+		radio.transmit(message, 9, syncword = syncword, submit_queue = 'bulk')
+
+	samples = []
+	start = time.perf_counter()
+	for index in range(urgent_items):
+		# Let the bulk items get going again between urgent items
+		time.sleep(0.005)
+
+		urgent_message = [0xee, index & 0xff]
+		transmitted = len(chip.transmitted)
+		before = time.perf_counter()
+		radio.transmit(urgent_message, 40, syncword = syncword, submit_queue = 'urgent')
+		while not any(payload[1:] == bytes(urgent_message) for channel, payload in chip.transmitted[transmitted:]):
+			time.sleep(0.0001)
+		samples.append(time.perf_counter() - before)
+
+	elapsed = time.perf_counter() - start
+	while len(chip.transmitted) < bulk_items + urgent_items:
+		time.sleep(0.0001)
+
+	radio.configure({'use_software_tx_queue': False})
+
+	result = summarize(samples, elapsed)
+	result['max_usec'] = max(samples) * 1000000.0
+	result['preemptions'] = radio.queue_statistics()['preemptions']
+
+	return result
+
+def measure(chip, operation):
+	transactions = chip.transaction_count
+	transfers = chip.transfer_count
+	byte_count = chip.byte_count
+
+	operation()
+
+	return {
+		'transactions': chip.transaction_count - transactions,
+		'transfers': chip.transfer_count - transfers,
+		'bytes': chip.byte_count - byte_count
+	}
+
+def measure_spi_usage():
+	air = SimulatedAir()
+	radio, chip = new_radio(air)
+	receiver, receiver_chip = new_radio(air)
+
+	usage = {}
+	usage['initialize'] = measure(chip, radio.initialize)
+	usage['set_syncword'] = measure(chip, lambda: radio.set_syncword(syncword, force = True))
+
+	# Warm up the format configuration before measuring transmits
+	radio.transmit(message, 9)
+	usage['transmit'] = measure(chip, lambda: radio.transmit(message, 9))
+	usage['transmit_current_channel'] = measure(chip, lambda: radio.transmit(message))
+	usage['multi_transmit'] = measure(chip, lambda: radio.multi_transmit(message, [9, 40, 71], retries = 3, delay = 0))
+
+	receiver.receive()
+	receiver.start_listening(9)
+	radio.transmit(message, 9)
+	usage['receive'] = measure(receiver_chip, receiver.receive)
+
+	return usage
+
+def check_spi_usage(usage):
+	failures = []
+	for operation, limits in expected_spi_usage.items():
+		for key, limit in limits.items():
+			value = usage[operation][key]
+			if value > limit:
+				failures.append('{}: {} {} (expected at most {})'.format(operation, value, key, limit))
+
+	return failures
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Benchmark lt8900_spi against a simulated radio')
+	parser.add_argument('--iterations', type = int, default = 1000)
+	parser.add_argument('--output', default = None, help = 'File to write the JSON results to (default: stdout)')
+	parser.add_argument('--no-check', action = 'store_true', help = 'Do not check SPI usage against the expected limits')
+	args = parser.parse_args()
+
+	iterations = args.iterations
+
+	results = {
+		'version': 1,
+		'python': sys.version.split()[0],
+		'iterations': iterations,
+		'transmit': bench_transmit(iterations),
+		'transmit_register_cache': bench_transmit(iterations, {'use_register_cache': True}),
+		'transmit_debug_logging': bench_transmit(iterations, {'debug_log_command': lambda message: None}),
+		'multi_transmit': bench_multi_transmit(max(1, iterations // 10)),
+		'receive_polling': bench_receive(max(1, iterations // 10), False),
+		'receive_event': bench_receive(max(1, iterations // 10), True),
+		'queue': bench_queue(16, max(1, iterations // 16)),
+		'queue_priority': bench_queue_priority(max(1, iterations // 2), max(1, iterations // 20)),
+		'spi_usage': measure_spi_usage()
+	}
+
+	failures = []
+	if not args.no_check:
+		failures = check_spi_usage(results['spi_usage'])
+	results['spi_usage_failures'] = failures
+
+	output = json.dumps(results, indent = 4, sort_keys = True)
+	if args.output is None:
+		print(output)
+	else:
+		with open(args.output, 'w') as output_file:
+			output_file.write(output + '\n')
+
+	for failure in failures:
+		print('SPI usage regression: {}'.format(failure), file = sys.stderr)
+
+	if len(failures) != 0:
+		return 1
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -19,10 +19,36 @@
 # -________________________________________________________-
 #                     Raspberry Pi
 
-import spidev
 import time
+import array
 import threading
 import collections
+import contextlib
+import logging
+import heapq
+import ctypes
+import fcntl
+import os
+import select
+import warnings
+
+from .metrics import RadioMetrics
+from . import timing
+from . import capture
+from . import init_image
+
+try:
+	import spidev
+except ImportError:
+	spidev = None
+
+# A packet received by the background receiver
+ReceivedPacket = collections.namedtuple('ReceivedPacket', ['timestamp', 'channel', 'status', 'payload'])
+
+# The outcome of transmit_reliable(), "channel" is the channel the
+# acknowledgement came back on (or the last channel tried) and
+# "attempts" is the number of times the packet was sent
+TransmitResult = collections.namedtuple('TransmitResult', ['acked', 'channel', 'attempts'])
 
 class dummy_context_mgr():
 	def __enter__(self):
@@ -30,6 +56,335 @@ class dummy_context_mgr():
 	def __exit__(self, exc_type, exc_value, traceback):
 		return False
 
+class _StatisticsLock():
+	# A reentrant lock which counts how often it is taken, how often a
+	# thread had to wait for it, and how long it is waited for and held.
+	# "lock" is the underlying lock (e.g., a caller-supplied mutex),
+	# only acquired by the outermost acquisition in each thread.  A
+	# mutex which is only a context manager is entered and exited
+	# instead: it cannot be tried, so it is always waited for (even by
+	# a non-blocking acquisition) and the waits are not counted
+	def __init__(self, lock = None):
+		if lock is None:
+			lock = threading.Lock()
+		self._lock = lock
+		self._enter = None
+		self._exit = None
+		if not hasattr(lock, 'acquire'):
+			self._enter = lock.__enter__
+			self._exit = lock.__exit__
+		self._owner = None
+		self._depth = 0
+		self._acquired_time = 0.0
+
+		self.acquisitions = 0
+		self.contentions = 0
+		self.wait_time = 0.0
+		self.hold_time = 0.0
+		self.max_hold_time = 0.0
+
+	def acquire(self, blocking = True):
+		thread = threading.get_ident()
+		if self._owner == thread:
+			self._depth += 1
+			return True
+
+		now = time.perf_counter()
+		if self._enter is not None:
+			self._enter()
+			now = time.perf_counter()
+		elif not self._lock.acquire(False):
+			if not blocking:
+				return False
+			start_time = now
+			self._lock.acquire()
+			now = time.perf_counter()
+			self.contentions += 1
+			self.wait_time += now - start_time
+
+		self._owner = thread
+		self._depth = 1
+		self._acquired_time = now
+		self.acquisitions += 1
+
+		return True
+
+	def release(self):
+		self._depth -= 1
+		if self._depth != 0:
+			return None
+
+		hold_time = time.perf_counter() - self._acquired_time
+		self.hold_time += hold_time
+		if hold_time > self.max_hold_time:
+			self.max_hold_time = hold_time
+
+		self._owner = None
+		if self._exit is not None:
+			self._exit(None, None, None)
+		else:
+			self._lock.release()
+
+		return None
+
+	def statistics(self):
+		return {
+			'acquisitions': self.acquisitions,
+			'contentions': self.contentions,
+			'wait_time': self.wait_time,
+			'hold_time': self.hold_time,
+			'max_hold_time': self.max_hold_time
+		}
+
+	def __enter__(self):
+		self.acquire()
+		return None
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.release()
+		return False
+
+class _PacketBuffer():
+	# Ring buffer of the packets received by a background receiver, of
+	# "size" packets (the oldest packets are dropped when it is full),
+	# and the callbacks each packet is passed to.  With a size of 0 the
+	# packets are only passed to the callbacks.  Callbacks which fail
+	# are reported to "error" if given, otherwise the error is raised
+	def __init__(self, size, callback = None, error = None):
+		self.running = True
+		self.callbacks = []
+		if callback is not None:
+			self.callbacks.append(callback)
+		self.packets = collections.deque([], size)
+		self.condition = threading.Condition()
+		self.received = 0
+		self.dropped = 0
+		self._error = error
+
+	def stop(self):
+		with self.condition:
+			self.running = False
+			self.condition.notify_all()
+
+		return None
+
+	def add_callback(self, callback):
+		self.callbacks.append(callback)
+
+		return None
+
+	def put(self, packet):
+		with self.condition:
+			if self.packets.maxlen != 0:
+				if len(self.packets) == self.packets.maxlen:
+					self.dropped += 1
+				self.packets.append(packet)
+			self.received += 1
+			self.condition.notify_all()
+
+		for callback in list(self.callbacks):
+			try:
+				callback(packet)
+			except Exception as error_info:
+				if self._error is None:
+					raise
+				self._error("Receiver callback failed: {}", error_info.args)
+
+		return None
+
+	def get(self, timeout = None):
+		# Take the oldest packet, waiting up to "timeout" seconds
+		# (forever if None) for one to arrive
+		if self.packets.maxlen == 0:
+			raise ValueError('Receiver only passes packets to its callbacks')
+
+		with self.condition:
+			if len(self.packets) == 0 and self.running:
+				self.condition.wait_for(lambda: len(self.packets) != 0 or not self.running, timeout)
+
+			if len(self.packets) == 0:
+				return None
+
+			return self.packets.popleft()
+
+	def statistics(self):
+		return {
+			'received': self.received,
+			'dropped': self.dropped,
+			'buffered': len(self.packets)
+		}
+
+class PacketReadyEvent():
+	# Packet-ready event source set by an edge callback on the PKT_FLAG
+	# pin (e.g., gpiozero's "when_activated"), can also be set directly
+	def __init__(self):
+		self._event = threading.Event()
+
+	def set(self):
+		self._event.set()
+
+	def clear(self):
+		self._event.clear()
+
+	def wait(self, timeout = None):
+		return self._event.wait(timeout)
+
+class PollPacketReadyEvent():
+	# Packet-ready event source for a file descriptor which can be
+	# poll()ed for the PKT_FLAG edge, such as a sysfs GPIO value file
+	# with its "edge" configured
+	def __init__(self, fd, events = select.POLLPRI | select.POLLERR):
+		if hasattr(fd, 'fileno'):
+			fd = fd.fileno()
+		self._fd = fd
+		self._poll = select.poll()
+		self._poll.register(fd, events)
+
+	def fileno(self):
+		return self._fd
+
+	def set(self):
+		return None
+
+	def clear(self):
+		# Reading the value acknowledges any pending edge
+		try:
+			os.lseek(self._fd, 0, os.SEEK_SET)
+			os.read(self._fd, 64)
+		except OSError:
+			pass
+
+	def wait(self, timeout = None):
+		if timeout is not None:
+			timeout = timeout * 1000.0
+		return len(self._poll.poll(timeout)) != 0
+
+class FakePacketReadyEvent(PacketReadyEvent):
+	# Packet-ready event source for testing without GPIO, it fires
+	# "delay" seconds after being cleared (or only when set manually
+	# if "delay" is None)
+	def __init__(self, delay = None):
+		super().__init__()
+		self.delay = delay
+		self.timer = None
+
+	def clear(self):
+		super().clear()
+		if self.delay is None:
+			return None
+
+		if self.timer is not None:
+			self.timer.cancel()
+		self.timer = threading.Timer(self.delay, self.set)
+		self.timer.daemon = True
+		self.timer.start()
+
+# Layout of "struct spi_ioc_transfer" from <linux/spi/spidev.h>
+class _spi_ioc_transfer(ctypes.Structure):
+	_fields_ = [
+		('tx_buf', ctypes.c_uint64),
+		('rx_buf', ctypes.c_uint64),
+		('len', ctypes.c_uint32),
+		('speed_hz', ctypes.c_uint32),
+		('delay_usecs', ctypes.c_uint16),
+		('bits_per_word', ctypes.c_uint8),
+		('cs_change', ctypes.c_uint8),
+		('tx_nbits', ctypes.c_uint8),
+		('rx_nbits', ctypes.c_uint8),
+		('word_delay_usecs', ctypes.c_uint8),
+		('pad', ctypes.c_uint8)
+	]
+
+def _spi_ioc_message(count):
+	# SPI_IOC_MESSAGE(count), which is _IOW('k', 0, char[...])
+	return (1 << 30) | ((count * ctypes.sizeof(_spi_ioc_transfer)) << 16) | (ord('k') << 8)
+
+class SpiDevTransport():
+	# SPI transport using the Linux spidev interface.  Transports
+	# provide configure(), xfer(), xfer_many(), and close()
+	def __init__(self, spi_bus, spi_dev):
+		if spidev is None:
+			raise ImportError('The spidev module is required to talk to a radio over SPI')
+
+		self._spi = spidev.SpiDev()
+		self._spi.open(spi_bus, spi_dev)
+		self.max_speed_hz = self._spi.max_speed_hz
+
+	def configure(self, settings):
+		for key, value in settings.items():
+			setattr(self._spi, key, value)
+		self.max_speed_hz = self._spi.max_speed_hz
+
+	def xfer(self, data, delay = 0):
+		if isinstance(data, list):
+			return self._spi.xfer(data, self.max_speed_hz, delay)
+
+		# Buffers (e.g., a bytearray) are sent from where they are,
+		# without being converted to a list first
+		return self._ioctl([(data, delay)])[0]
+
+	def xfer_many(self, segments):
+		# Perform several transfers in a single SPI_IOC_MESSAGE ioctl,
+		# deasserting chip select between each of them.  Each segment
+		# is a tuple of (data, delay)
+		if len(segments) == 1:
+			return [self.xfer(*segments[0])]
+
+		return self._ioctl(segments)
+
+	def _ioctl(self, segments):
+		transfers = (_spi_ioc_transfer * len(segments))()
+		buffers = []
+		for index, (data, delay) in enumerate(segments):
+			if isinstance(data, (bytearray, memoryview)) and not memoryview(data).readonly:
+				tx_buffer = (ctypes.c_uint8 * len(data)).from_buffer(data)
+			else:
+				tx_buffer = (ctypes.c_uint8 * len(data)).from_buffer_copy(bytes(data))
+			rx_buffer = (ctypes.c_uint8 * len(data))()
+			buffers.append(rx_buffer)
+
+			transfer = transfers[index]
+			transfer.tx_buf = ctypes.addressof(tx_buffer)
+			transfer.rx_buf = ctypes.addressof(rx_buffer)
+			transfer.len = len(data)
+			transfer.speed_hz = self.max_speed_hz
+			transfer.delay_usecs = delay
+			transfer.cs_change = 1 if index != (len(segments) - 1) else 0
+
+			# Keep the transmit buffer alive until the ioctl completes
+			buffers.append(tx_buffer)
+
+		fcntl.ioctl(self._spi.fileno(), _spi_ioc_message(len(segments)), transfers)
+
+		return [bytearray(rx_buffer) for rx_buffer in buffers[0::2]]
+
+	def fileno(self):
+		return self._spi.fileno()
+
+	def close(self):
+		self._spi.close()
+
+def _compile_register_map(register_map):
+	# Build the name to number index, keeping the first register
+	# for names that appear more than once (e.g., "Unknown")
+	register_numbers = {}
+	register_fields = []
+	register_field_index = []
+	for reg_number, reg_info in enumerate(register_map):
+		register_numbers.setdefault(reg_info['name'], reg_number)
+
+		# Each field is stored as (name, shift, unshifted mask)
+		fields = []
+		for key, bit_range in reg_info.items():
+			if key == 'name':
+				continue
+			fields.append((key, bit_range[0], (1 << (bit_range[1] - bit_range[0] + 1)) - 1))
+
+		register_fields.append(tuple(fields))
+		register_field_index.append({field[0]: (field[1], field[2]) for field in fields})
+
+	return (register_numbers, tuple(register_fields), tuple(register_field_index))
+
 class Radio:
 	_default_register_values = {
 		'format_config': {
@@ -272,18 +627,165 @@ class Radio:
 			'read_ptr': [0, 5]
 		}
 	]
+	_register_numbers, _register_fields, _register_field_index = _compile_register_map(_register_map)
+
+	# Bits of the status register tested directly while polling
+	_status_crc_error = 1 << 15
+	_status_framer_status_mask = 0x3f << 8
+	_status_packet_flag = 1 << 6
+	_status_fifo_flag = 1 << 5
+	_status_syncword_rx = 1 << 7
+
+	# Size of the hardware FIFO, larger frames are streamed through it
+	_fifo_size = 64
+	_status_register = _register_numbers['status']
+	_fifo_state_register = _register_numbers['fifo_state']
+
+	# Logging is disabled until configure() resolves the log commands
+	_debug_command = None
+	_info_command = None
+	_error_command = None
+	_debug_enabled = False
+	_info_enabled = False
+
+	# Relative cost (in milliseconds) of switching the radio between
+	# settings, used to order items sent from the software tx queue
+	_default_queue_switch_costs = {
+		'syncword': 0.05,
+		'format_config': 5.0,
+		'channel': 0.13
+	}
+
+	# Settings of each software tx queue, see configure_queue().  The
+	# rates are per second, the airtime (and its burst) in seconds
+	_default_queue_settings = {
+		'priority': 0,
+		'rate': None,
+		'burst': 1,
+		'airtime': None,
+		'airtime_burst': 0.05,
+		'deadline': None
+	}
+
+	# Registers whose contents are changed by the radio itself, these
+	# are never served from the register shadow
+	_volatile_registers = frozenset(map(_register_numbers.get, [
+		'phase_lock', 'raw_rssi', 'scan_rssi_state', 'status', 'fifo', 'fifo_state'
+	]))
+
+	# Registers configured by the driver, which are checked (and
+	# repaired) when recovering from an error.  The radio changes
+	# radio_state by itself, so it is reset instead
+	_repairable_registers = tuple(sorted(map(_register_numbers.get, [
+		name for name in _default_register_values if name not in ('radio_state', 'scan_rssi_state')
+	] + ['syncword_0', 'syncword_1', 'syncword_2', 'syncword_3'])))
+
+	_chip_id = (0x6fe0, 0x5681)
 
 	def __init__(self, spi_bus, spi_dev, config = None):
-		spi = spidev.SpiDev()
-		spi.open(spi_bus, spi_dev)
-		self._spi = spi
+		# Talk to the radio using the supplied transport (e.g., a
+		# simulated radio) or the spidev device
+		transport = None
+		if config is not None:
+			transport = config.get('transport')
+		if transport is None:
+			transport = SpiDevTransport(spi_bus, spi_dev)
+		self._spi = transport
 
 		self._dequeue_thread = None
 		self._last_syncword = None
 
+		# The bus lock is held for each SPI transaction (or batch of
+		# them) and makes them atomic, the radio lock is held while the
+		# radio is used for a whole operation (e.g., sending a packet).
+		# The radio lock is always taken before the bus lock.  A mutex
+		# supplied by the caller, e.g., to share the SPI bus with other
+		# devices, is taken along with the bus lock
+		mutex = None
+		if config is not None:
+			mutex = config.get('mutex')
+		self._bus_lock = _StatisticsLock(mutex)
+		self._radio_lock = _StatisticsLock(threading.RLock())
+
+		# Incremented whenever the radio is taken out of (or put back
+		# into) listening mode, so that a receiver waiting without the
+		# radio lock can tell another thread has used the radio
+		self._listen_generation = 0
+
+		# Rest of a message too large for the FIFO, still to be
+		# written while it is being transmitted
+		self._transmit_remaining = None
+
+		# Message being sent, and the status it was sent with, for
+		# the packet capture (see lt8900_spi.capture)
+		self._transmit_message = None
+		self._transmit_status = 0
+
+		# FIFO state read along with the last status poll, if asked for
+		self._transmit_fifo_state = None
+
+		# Encoded value of the packet format configuration applied
+		self._last_format_flags = 0
+
+		# Shadow copy of the non-volatile registers, as last written
+		# to (or read from) the radio
+		self._register_shadow = {}
+
+		# Values the driver has written to the non-volatile registers,
+		# which reads do not change, for repairing the radio
+		self._register_intended = {}
+
 		self._software_tx_queue = {}
 		self._software_tx_queue_next_time = {}
 
+		# Heap of (time, queue name) for each queue with items waiting,
+		# keyed by when that queue may next be run
+		self._software_tx_queue_schedule = []
+		self._software_tx_queue_scheduled = set()
+
+		self._software_tx_queue_mutex = None
+		self._software_tx_queue_condition = None
+
+		# Settings and token buckets of each queue, set up when the
+		# queue is first used
+		self._software_tx_queue_limits = {}
+
+		# Counts of reconfigurations made (and avoided) by the queue,
+		# and of items held back by the queue settings
+		self._software_tx_queue_stats = {}
+		for kind in self._default_queue_switch_costs:
+			self._software_tx_queue_stats[kind + '_switches'] = 0
+			self._software_tx_queue_stats[kind + '_switches_avoided'] = 0
+		self._software_tx_queue_stats['preemptions'] = 0
+		self._software_tx_queue_stats['deadline_drops'] = 0
+		self._software_tx_queue_stats['rate_limited'] = 0
+
+		# Counters and histograms, see lt8900_spi.metrics
+		self.metrics = None
+		if config is None or config.get('metrics', True):
+			self.metrics = RadioMetrics([reg_info['name'] for reg_info in self._register_map])
+			self.metrics.locks['bus'] = self._bus_lock
+			self.metrics.locks['radio'] = self._radio_lock
+
+		# Background receiver state, see start_receiver()
+		self._receiver = None
+		self._receiver_thread = None
+		self._receiver_suspended = 0
+
+		# Transfers deferred while inside a batch, as
+		# (data, delay, callback) tuples
+		self._batch_depth = 0
+		self._batch_transfers = []
+
+		# Preallocated SPI buffers for writing and reading the FIFO,
+		# large enough for a length byte and a 255 byte message.  The
+		# write buffer is busy while a write from it is deferred
+		self._fifo_write_buffer = bytearray(2 + 255)
+		self._fifo_write_buffer[0] = self._register_numbers['fifo']
+		self._fifo_write_buffer_busy = False
+		self._fifo_read_request = bytearray(1 + 255)
+		self._fifo_read_request[0] = self._register_numbers['fifo'] | 0b10000000
+
 		self.configure(config, update = False)
 
 		if len(self._register_map) != 53:
@@ -294,47 +796,77 @@ class Radio:
 	def __del__(self):
 		self._debug('Deleting object')
 		self._config['use_software_tx_queue'] = False
+		if self._receiver is not None:
+			self._receiver['buffer'].stop()
 		self._spi.close()
 
-	def _debug(self, message):
-		if 'debug_log_command' in self._config:
-			self._config['debug_log_command'](message)
+	def _configure_logging(self):
+		# Resolve the log commands once, so that the hot paths only need
+		# to check a flag before doing any formatting.  Log commands
+		# fall back to the next more verbose level, and then to the
+		# "logger" (a logging.Logger) if one is configured
+		debug_command = self._config.get('debug_log_command')
+		info_command = self._config.get('info_log_command', debug_command)
+		error_command = self._config.get('error_log_command', info_command)
+
+		logger = self._config.get('logger')
+		if logger is not None:
+			if debug_command is None and logger.isEnabledFor(logging.DEBUG):
+				debug_command = logger.debug
+			if info_command is None and logger.isEnabledFor(logging.INFO):
+				info_command = logger.info
+			if error_command is None and logger.isEnabledFor(logging.ERROR):
+				error_command = logger.error
+
+		self._debug_command = debug_command
+		self._info_command = info_command
+		self._error_command = error_command
+		self._debug_enabled = debug_command is not None
+		self._info_enabled = info_command is not None
+
 		return None
 
-	def _info(self, message):
-		log_command = None
-		if 'info_log_command' in self._config:
-			log_command = self._config['info_log_command']
-		elif 'debug_log_command' in self._config:
-			log_command = self._config['debug_log_command']
-		if log_command is None:
+	def _debug(self, message, *args):
+		if self._debug_command is None:
 			return None
+		if len(args) != 0:
+			message = message.format(*args)
+		self._debug_command(message)
+		return None
 
-		log_command(message)
+	def _info(self, message, *args):
+		if self._info_command is None:
+			return None
+		if len(args) != 0:
+			message = message.format(*args)
+		self._info_command(message)
 		return None
 
-	def _error(self, message):
-		log_command = None
-		if 'error_log_command' in self._config:
-			log_command = self._config['error_log_command']
-		elif 'info_log_command' in self._config:
-			log_command = self._config['info_log_command']
-		elif 'debug_log_command' in self._config:
-			log_command = self._config['debug_log_command']
-		if log_command is None:
+	def _error(self, message, *args):
+		if self._error_command is None:
 			return None
-		log_command(message)
+		if len(args) != 0:
+			message = message.format(*args)
+		self._error_command(message)
 		return None
 
 	def _get_mutex(self, real_mutex = True):
 		if not real_mutex:
 			return dummy_context_mgr()
 
-		mutex = self._config.get('mutex', dummy_context_mgr())
-		return mutex
+		return self._radio_lock
+
+	def lock_statistics(self):
+		return {
+			'bus': self._bus_lock.statistics(),
+			'radio': self._radio_lock.statistics()
+		}
 
 	def _reset_device(self):
-		self._info("Resetting radio {}".format(__name__))
+		self._info("Resetting radio {}", __name__)
+		self._register_shadow = {}
+		self._register_intended = {}
+
 		reset_command = self._config.get('reset_command', None)
 
 		if reset_command is None:
@@ -350,29 +882,53 @@ class Radio:
 
 		return False
 
+	def _arm_packet_ready_event(self):
+		event = self._config.get('packet_ready_event')
+		if event is not None:
+			event.clear()
+
+		return None
+
+	def _wait_for_packet(self, poll_time):
+		# Without an event source fall back to polling, with one wait
+		# for it to fire, but still poll occasionally in case an edge
+		# was missed
+		event = self._config.get('packet_ready_event')
+		if event is None:
+			time.sleep(poll_time)
+			return None
+
+		if event.wait(self._config.get('packet_ready_timeout', 1.0)):
+			event.clear()
+
+		return None
+
+	def _should_use_register_cache(self):
+		return self._config.get('use_register_cache', False)
+
 	def _register_name(self, reg_number):
 		return self._register_map[reg_number]['name']
 
 	def _register_number(self, reg_string):
-		reg_string_orig = reg_string
-
 		if isinstance(reg_string, int):
 			return reg_string
+
+		reg_number = self._register_numbers.get(reg_string)
+		if reg_number is not None:
+			return reg_number
+
 		if reg_string.isnumeric():
 			return int(reg_string)
-		for reg_number, reg_info in enumerate(self._register_map):
-			if reg_info['name'] == reg_string:
-				return reg_number
-		raise NameError("Invalid register value {}".format(reg_string_orig))
+		raise NameError("Invalid register value {}".format(reg_string))
 
 	def _check_radio(self):
-		value1 = self.get_register(0);
-		value2 = self.get_register(1);
+		value1 = self.get_register(0, cached = False);
+		value2 = self.get_register(1, cached = False);
 
-		if value1 == 0x6fe0 and value2 == 0x5681:
+		if (value1, value2) == self._chip_id:
 			return True
 
-		self._debug(f'Expected 0x6fe0, 0x5681 and got 0x{value1:04x}, 0x{value2:04x}')
+		self._debug('Expected 0x{:04x}, 0x{:04x} and got 0x{:04x}, 0x{:04x}', self._chip_id[0], self._chip_id[1], value1, value2)
 
 		return False
 
@@ -380,61 +936,249 @@ class Radio:
 		return self._default_register_values.get(register, {})
 
 	def _set_default_register_values(self):
+		# Write the precompiled init image in a single batch
+		image = self._get_init_image()
+		format_config_register = self._register_numbers['format_config']
+
 		self._last_format_config = {}
-		for register_name, register_value in self._default_register_values.items():
-			if register_name == 'format_config':
-				self._apply_packet_format_config({})
-				continue
+		with self.batch():
+			for reg, value, delay in image:
+				self.put_register(reg, value, delay = delay)
+				if reg == format_config_register:
+					self._set_last_format_config(value)
 
-			self.put_register_bits(register_name, register_value)
+		return True
+
+	def _set_last_format_config(self, value):
+		# Remember the packet format configuration written as part of
+		# the init image, so that it is not written again needlessly
+		format_config_register = self._register_numbers['format_config']
+		radio_format_config = self._resolve_packet_format_config({})
+		if self._encode_register_bits(format_config_register, radio_format_config) != value:
+			radio_format_config = self.get_register_bits(format_config_register, value)
+			del radio_format_config['name']
+
+		self._last_format_config = radio_format_config
+		self._last_format_flags = value
+
+		return None
+
+	def _get_init_image(self):
+		# The init image is compiled the first time it is needed, or
+		# taken from the "init_image" configuration option: either an
+		# image or the path of one saved for this board (which is
+		# compiled and saved there if it does not exist yet, or if the
+		# register values or delays it was compiled from have changed)
+		if self._init_image is not None:
+			return self._init_image
+
+		source = self._config.get('init_image')
+		if source is None:
+			image = init_image.compile_image(self)
+		elif isinstance(source, str):
+			image = None
+			expected_source = init_image.source_fingerprint(self)
+			if os.path.exists(source):
+				# The saved image is stale if it was compiled from other
+				# register values or delays, or edited since
+				[saved_image, saved_fingerprint, saved_source] = init_image.load(source, with_fingerprint = True)
+				if saved_source == expected_source and init_image.fingerprint(saved_image) == saved_fingerprint:
+					image = saved_image
+				else:
+					self._info("Init image {} is out of date, saving it again", source)
+
+			if image is None:
+				image = init_image.compile_image(self)
+				init_image.save(image, source, [reg_info['name'] for reg_info in self._register_map], source = expected_source)
+		else:
+			image = list(source)
+
+		self._init_image = image
+
+		return image
+
+	def _verify_init_image(self):
+		# Read back the chip ID and every register written by the init
+		# image in a single transaction
+		registers = [reg for reg, value, delay in self._get_init_image() if reg not in self._volatile_registers]
+		values = self._read_registers([0, 1] + registers)
+		if tuple(values[0:2]) != self._chip_id:
+			self._debug('Expected 0x{:04x}, 0x{:04x} and got 0x{:04x}, 0x{:04x}', self._chip_id[0], self._chip_id[1], values[0], values[1])
+			return False
+
+		mismatches = {}
+		for reg, value in zip(registers, values[2:]):
+			expected = self._register_intended.get(reg)
+			if value != expected:
+				mismatches[self._register_name(reg)] = (expected, value)
+
+		if len(mismatches) != 0:
+			self._error("Registers differ from the init image: {}", mismatches)
+			return False
 
 		return True
 
+	@contextlib.contextmanager
+	def batch(self):
+		# Defer register writes until the outermost batch is exited and
+		# then perform them all in as few SPI transactions as possible.
+		# The bus is held for the whole batch
+		with self._bus_lock:
+			self._batch_depth += 1
+			try:
+				yield self
+			finally:
+				self._batch_depth -= 1
+				if self._batch_depth == 0:
+					self._flush_batch()
+
+	def _flush_batch(self):
+		transfers = self._batch_transfers
+		if len(transfers) == 0:
+			return None
+
+		self._batch_transfers = []
+
+		segments = [(data, delay) for (data, delay, callback) in transfers]
+		results = self._xfer_many(segments)
+		self._fifo_write_buffer_busy = False
+
+		metrics = self.metrics
+		if metrics is not None:
+			metrics.counters['spi_transactions'] += 1
+			for data, delay in segments:
+				metrics.spi_transfer(data[0] & 0x7f, len(data))
+
+		for (data, delay, callback), result in zip(transfers, results):
+			if callback is not None:
+				callback(data, result)
+
+		return None
+
+	def _read_registers(self, registers):
+		# Read several registers in a single SPI transaction, without
+		# updating the register shadow
+		if len(registers) == 0:
+			return []
+
+		delay = self._timing['register_write']
+		segments = [([reg | 0b10000000, 0, 0], delay) for reg in registers]
+
+		with self._bus_lock:
+			if self._batch_depth != 0:
+				self._flush_batch()
+
+			results = self._xfer_many(segments)
+
+			metrics = self.metrics
+			if metrics is not None:
+				metrics.counters['spi_transactions'] += 1
+				for reg in registers:
+					metrics.spi_transfer(reg, 3)
+
+		return [result[1] << 8 | result[2] for result in results]
+
+	def _xfer_many(self, segments):
+		try:
+			return self._spi.xfer_many(segments)
+		except OSError as error_info:
+			self._debug("Batched transfer failed, falling back to individual transfers: {}", error_info)
+
+		return [self._spi.xfer(data, delay) for (data, delay) in segments]
+
+	def _transfer(self, data, delay, callback = None):
+		with self._bus_lock:
+			# Writes made inside a batch are deferred, reads first
+			# complete any deferred writes so they are seen in order
+			if self._batch_depth != 0:
+				if data[0] & 0x80 == 0:
+					self._batch_transfers.append((data, delay, callback))
+					return None
+				self._flush_batch()
+
+			result = self._spi.xfer(data, delay)
+
+			metrics = self.metrics
+			if metrics is not None:
+				metrics.counters['spi_transactions'] += 1
+				metrics.spi_transfer(data[0] & 0x7f, len(data))
+
+			if callback is not None:
+				callback(data, result)
+
+		return result
+
+	def _log_register_transfer(self, data, result):
+		reg = data[0]
+		if reg & 0x80 == 0x80:
+			self._debug(" regRead[{:02X}] = {}", reg & 0x7f, result)
+		else:
+			self._debug("regWrite[{:02X}:0x{:02X}{:02X}] = {}", reg, data[1], data[2], result)
+
+		return None
+
 	def _put_register_high_low(self, reg, high, low, delay = None):
 		if delay is None:
-			delay = 10
+			delay = self._timing['register_write']
 
 		reg = self._register_number(reg)
 
-		result = self._spi.xfer([reg, high, low], self._spi.max_speed_hz, delay)
+		callback = None
+		if self._debug_enabled:
+			callback = self._log_register_transfer
 
-		if reg & 0x80 == 0x80:
-			self._debug(" regRead[%02X] = %s" % ((reg & 0x7f), result))
-		else:
-			self._debug("regWrite[%02X:0x%02X%02X] = %s" % (reg, high, low, result))
+		result = self._transfer([reg, high, low], delay, callback)
 
 		return result
 
 	def put_register(self, reg, value, delay = None):
+		reg = self._register_number(reg)
+
 		high = (value >> 8) & 0xff
 		low  = value & 0xff
-		return self._put_register_high_low(reg, high, low, delay = delay)
+		result = self._put_register_high_low(reg, high, low, delay = delay)
+
+		if reg not in self._volatile_registers:
+			self._register_shadow[reg] = value & 0xffff
+			self._register_intended[reg] = value & 0xffff
+
+		return result
 
 	def put_register_bits(self, reg, bits_dict, delay = None):
 		# Convert register to an integer
 		reg = self._register_number(reg)
 
-		# Lookup register in the register map
-		register_info = self._register_map[reg]
+		value = self._encode_register_bits(reg, bits_dict)
+
+		result = self.put_register(reg, value, delay = delay)
+
+		return result
+
+	def _encode_register_bits(self, reg, bits_dict):
+		# Lookup the precompiled fields for this register
+		field_index = self._register_field_index[reg]
 
-		# Create a dictionary to hold the parsed results
 		value = 0
-		for key in bits_dict:
+		for key, key_value in bits_dict.items():
 			if key == "name":
 				continue
-			bit_range = register_info[key]
-			mask = ((1 << (bit_range[1] - bit_range[0] + 1)) - 1) << bit_range[0]
-			key_value = (bits_dict[key] << bit_range[0]) & mask
-			value = value | key_value
+			shift, mask = field_index[key]
+			value |= (key_value & mask) << shift
 
-		result = self.put_register(reg, value, delay = delay)
-
-		return result
+		return value
 
-	def get_register(self, reg):
+	def get_register(self, reg, cached = True):
 		# Convert register to an integer
 		reg = self._register_number(reg)
 
+		# Answer from the register shadow if possible, in verify mode
+		# the radio is still read and compared with the shadow
+		expected = None
+		if cached and self._should_use_register_cache():
+			expected = self._register_shadow.get(reg)
+			if expected is not None and not self._config.get('verify_register_cache', False):
+				return expected
+
 		# Reading of a register is indicated by setting high bit
 		read_reg = reg | 0b10000000
 
@@ -444,33 +1188,53 @@ class Radio:
 		# The reply is stored in the lower two bytes
 		result = value[1] << 8 | value[2]
 
+		if reg not in self._volatile_registers:
+			if expected is not None and expected != result:
+				self._error("Register shadow for {} is 0x{:04x} but radio has 0x{:04x}", self._register_name(reg), expected, result)
+			self._register_shadow[reg] = result
+
 		# Return result
 		return result
 
-	def get_register_bits(self, reg, value = None):
+	def verify_register_cache(self, registers = None):
+		if registers is None:
+			registers = list(self._register_shadow)
+
+		# Compare the shadow against the radio, reporting (and
+		# correcting the shadow for) any register which differs
+		mismatches = {}
+		for reg in registers:
+			reg = self._register_number(reg)
+			expected = self._register_shadow.get(reg)
+			actual = self.get_register(reg, cached = False)
+			if expected is not None and expected != actual:
+				mismatches[self._register_name(reg)] = (expected, actual)
+
+		if len(mismatches) != 0:
+			self._error("Register shadow differs from radio: {}", mismatches)
+
+		return mismatches
+
+	def get_register_bits(self, reg, value = None, cached = True):
 		# Convert register to an integer
 		reg = self._register_number(reg)
 
 		# Get the register's value (unless one was supplied)
 		if value is None:
-			value = self.get_register(reg)
-
-		# Lookup register in the register map
-		register_info = self._register_map[reg]
+			value = self.get_register(reg, cached = cached)
 
 		# Create a dictionary to hold the parsed results
-		result = {'name': register_info['name']}
-		for key in register_info:
-			if key == "name":
-				continue
-			bit_range = register_info[key]
-			mask = ((1 << (bit_range[1] - bit_range[0] + 1)) - 1) << bit_range[0]
-			key_value = (value & mask) >> bit_range[0]
-			result[key] = key_value
+		result = {'name': self._register_map[reg]['name']}
+		for key, shift, mask in self._register_fields[reg]:
+			result[key] = (value >> shift) & mask
 
 		# Return the filled in structure
 		return result
 
+	def _get_status(self):
+		# Raw status register value, for polling with plain bit tests
+		return self.get_register(self._status_register)
+
 	def configure(self, config, update = True):
 		if config is None:
 			config = {}
@@ -480,27 +1244,59 @@ class Radio:
 		else:
 			self._config = config
 
-		with self._get_mutex():
-			self._spi.max_speed_hz = self._config.get('frequency', 4000000)
-			self._spi.bits_per_word = self._config.get('bits_per_word', 8)
-			self._spi.cshigh = self._config.get('csigh', False)
-			self._spi.no_cs  = self._config.get('no_cs', False)
-			self._spi.lsbfirst = self._config.get('lsbfirst', False)
-			self._spi.threewire = self._config.get('threewire', False)
-			self._spi.mode = self._config.get('mode', 1)
+		self._configure_logging()
+
+		# Delays used when talking to the radio, see lt8900_spi.timing
+		self._timing = timing.resolve(self._config.get('timing_profile'))
+
+		# Register defaults, with any overrides for this board, which
+		# are compiled into the init image when it is next needed (see
+		# lt8900_spi.init_image)
+		self._default_register_values = type(self)._default_register_values
+		overrides = self._config.get('init_registers')
+		if overrides is not None:
+			register_values = {name: dict(bits) for name, bits in self._default_register_values.items()}
+			for name, bits in overrides.items():
+				if name not in self._register_numbers:
+					raise ValueError('Unknown register {} in init_registers'.format(name))
+				register_values.setdefault(name, {}).update(bits)
+			self._default_register_values = register_values
+		self._init_image = None
+
+		# Settings of the software tx queues, which take effect when
+		# each queue is next used
+		if not update or 'queue_config' in config:
+			for settings in self._config.get('queue_config', {}).values():
+				self._resolve_queue_settings(settings)
+			self._software_tx_queue_limits = {}
+
+		with self._bus_lock:
+			self._spi.configure({
+				'max_speed_hz': self._config.get('frequency', 4000000),
+				'bits_per_word': self._config.get('bits_per_word', 8),
+				'cshigh': self._config.get('csigh', False),
+				'no_cs': self._config.get('no_cs', False),
+				'lsbfirst': self._config.get('lsbfirst', False),
+				'threewire': self._config.get('threewire', False),
+				'mode': self._config.get('mode', 1)
+			})
 
 		# If using a queue, start a thread to run the queue
 		if self._should_use_queue():
 			if self._dequeue_thread is None:
 				self._dequeue_thread = threading.Thread(target = self._run_queue, daemon = True)
 				self._software_tx_queue_mutex = threading.Lock()
+				self._software_tx_queue_condition = threading.Condition(self._software_tx_queue_mutex)
 				self._dequeue_thread.start()
 		else:
 			if self._dequeue_thread is not None:
 				self._debug("Joining existing thread to wait for termination")
+				with self._software_tx_queue_condition:
+					self._software_tx_queue_condition.notify_all()
 				self._dequeue_thread.join()
 				self._dequeue_thread = None
 				self._software_tx_queue_mutex = None
+				self._software_tx_queue_condition = None
 
 		return None
 
@@ -509,20 +1305,114 @@ class Radio:
 
 		self._set_default_register_values()
 
+		# Optionally read back everything written, along with the chip
+		# ID, in a single transaction
+		if self._config.get('verify_init_image', False):
+			return self._verify_init_image()
+
 		if not self._check_radio():
 			return False
 		return True
 
 	def _reinitialize(self):
+		if self.metrics is not None:
+			self.metrics.increment('reinitializations')
+
 		self.initialize()
 		self.set_syncword(self._last_syncword, submit_queue = None, force = True)
 		self._apply_packet_format_config(self._last_format_config)
 
+	def _recover(self, reason):
+		# Bring the radio back into a known state after an error, doing
+		# as little as possible: repair any registers which differ from
+		# what was written, then stop the radio and clear the FIFO, and
+		# only if either of those fails reset and reinitialize the radio
+		self._error("Recovering the radio after {}", reason)
+
+		if self._recovery_tier('repair_registers', self._repair_registers):
+			if self._recovery_tier('reset_state', self._reset_radio_state):
+				return True
+
+		self._recovery_tier('reinitialize', self._reinitialize)
+
+		return False
+
+	def _recovery_tier(self, tier, method):
+		start_time = time.perf_counter()
+		try:
+			recovered = method()
+		except Exception as error_info:
+			self._error("Recovery step {} failed: {}", tier, error_info.args)
+			recovered = False
+
+		if self.metrics is not None:
+			self.metrics.recovery_latency[tier].observe(time.perf_counter() - start_time)
+
+		if recovered is False:
+			self._error("Recovery step {} did not recover the radio", tier)
+
+		return recovered
+
+	def _repair_registers(self):
+		# Compare the registers configured by the driver with the radio,
+		# in a single transaction, and write back any which differ.  The
+		# chip ID is read too, to check the radio is answering at all.
+		# The values written are compared, not the register shadow,
+		# which reads of a corrupted register would have changed
+		registers = [reg for reg in self._repairable_registers if reg in self._register_intended]
+		values = self._read_registers([0, 1] + registers)
+		if tuple(values[0:2]) != self._chip_id:
+			return False
+
+		repairs = []
+		for reg, value in zip(registers, values[2:]):
+			expected = self._register_intended[reg]
+			if value != expected:
+				repairs.append((reg, expected))
+
+		if len(repairs) == 0:
+			return True
+
+		self._info("Repairing registers: {}", [self._register_name(reg) for reg, value in repairs])
+		if self.metrics is not None:
+			self.metrics.increment('registers_repaired', len(repairs))
+
+		with self.batch():
+			for reg, value in repairs:
+				delay = None
+				if reg == self._register_numbers['format_config']:
+					delay = self._timing['format_config']
+				self.put_register(reg, value, delay = delay)
+
+		values = self._read_registers([reg for reg, value in repairs])
+
+		return values == [value for reg, value in repairs]
+
+	def _reset_radio_state(self):
+		# Stop transmitting or receiving and empty the FIFO
+		self._transmit_remaining = None
+		self._listen_generation += 1
+
+		with self.batch():
+			self.put_register_bits('radio_state', {
+				'tx_enabled': 0,
+				'rx_enabled': 0,
+				'channel': 0
+			})
+			self.put_register_bits('fifo_state', {
+				'clear_read': 1,
+				'clear_write': 1
+			})
+
+		fifo_state = self.get_register_bits('fifo_state')
+
+		return fifo_state['write_ptr'] == 0 and fifo_state['read_ptr'] == 0
+
 	def set_channel(self, channel):
 		state = self.get_register_bits('radio_state')
 		state['channel'] = channel
 
-		self.put_register_bits('radio_state', state, delay = 130)
+		self.put_register_bits('radio_state', state, delay = self._timing['set_channel'])
 
 		return state
 
@@ -538,6 +1428,9 @@ class Radio:
 				if syncword == self._last_syncword:
 					return None
 
+		if self.metrics is not None and syncword != self._last_syncword:
+			self.metrics.increment('syncword_switches')
+
 		self._last_syncword = syncword
 
 		packet_config = self.get_register_bits('packet_config')
@@ -564,20 +1457,86 @@ class Radio:
 
 		return None
 
-	def fill_fifo(self, message, include_length = True, lock = True):
-		new_message = [self._register_number('fifo')]
-		if include_length:
-			new_message = new_message + [len(message)]
-		new_message = new_message + message
-		log_message = new_message.copy()
+	def fill_fifo(self, message, include_length = True, lock = None, length = None):
+		# "message" may be a list of integers, bytes, a bytearray, or a
+		# memoryview.  "length" is the length to encode, if only the
+		# start of a longer message is being written.  Returns a copy of
+		# the bytes written.  The write only needs the bus, so "lock" is
+		# no longer used
+		if lock is not None:
+			warnings.warn('The "lock" argument of fill_fifo() is no longer used', DeprecationWarning, stacklevel = 2)
+
+		# Copied before another write can reuse the buffer
+		with self._bus_lock:
+			return bytes(self._fill_fifo(message, include_length, length))
+
+	def _fill_fifo(self, message, include_length = True, length = None):
+		# Returns the transfer, which is only valid until the FIFO is
+		# next written
+		if length is None:
+			length = len(message)
+
+		delay = self._timing['fifo_byte'] * len(message)
+
+		with self._bus_lock:
+			# Assemble the transfer in the preallocated buffer, unless
+			# it holds a write which has not happened yet
+			buffer = self._fifo_write_buffer
+			if self._fifo_write_buffer_busy or len(message) > len(buffer) - 2:
+				buffer = bytearray(len(message) + 2)
+				buffer[0] = self._register_numbers['fifo']
+
+			start = 1
+			if include_length:
+				buffer[1] = length
+				start = 2
+			end = start + len(message)
+			buffer[start:end] = message
+			new_message = memoryview(buffer)[:end]
+
+			if self._batch_depth != 0 and buffer is self._fifo_write_buffer:
+				self._fifo_write_buffer_busy = True
+
+			# Transfer the message, the result is checked once the
+			# transfer has actually happened (which may be deferred
+			# until the end of a batch)
+			self._transfer(new_message, delay, self._check_fill_fifo_result)
+
+		return new_message
+
+	def _read_fifo(self, count, into = None, offset = 0):
+		# Read "count" bytes from the FIFO in a single transfer, the
+		# first byte returned is the status and is discarded.  If "into"
+		# (a bytearray or memoryview) is supplied the bytes are written
+		# to it at "offset" instead of being returned
+		request = self._fifo_read_request
+		if count < len(request):
+			request = memoryview(request)[:count + 1]
+		else:
+			request = bytearray(count + 1)
+			request[0] = self._fifo_read_request[0]
 
-		delay = 10 * len(message)
+		callback = None
+		if self._debug_enabled:
+			callback = self._log_register_transfer
 
-		# Transfer the message
-		with self._get_mutex(lock):
-			result = self._spi.xfer(new_message, self._spi.max_speed_hz, delay)
+		result = self._transfer(request, self._timing['register_write'], callback)
+
+		if into is not None:
+			data = result[1:count + 1]
+			if isinstance(into, memoryview) and not isinstance(data, (bytes, bytearray)):
+				data = bytes(data)
+			into[offset:offset + count] = data
+			return None
+
+		if isinstance(result, bytearray):
+			return result[1:]
+
+		return bytearray(result[1:])
 
-		self._debug("Writing: {} = {}".format(log_message, result))
+	def _check_fill_fifo_result(self, data, result):
+		if self._debug_enabled:
+			self._debug("Writing: {} = {}", list(data), result)
 
 		need_reset = False
 		for check_result in result:
@@ -585,10 +1544,11 @@ class Radio:
 				need_reset = True
 
 		if need_reset:
-			self._error("While transmitting we got an error, reinitializing everything")
-			self._reinitialize()
+			if self.metrics is not None:
+				self.metrics.increment('fill_fifo_resets')
+			self._recover('an error while writing the FIFO')
 
-		return new_message
+		return None
 
 	def transmit(self, message, channel = None, lock = True, post_delay = 0, syncword = None, submit_queue = '__DEFAULT__', format_config = None):
 		# If we are using a radio transmit queue, just queue this message
@@ -602,29 +1562,71 @@ class Radio:
 		sent_packet = True
 
 		with self._get_mutex(lock):
+			[channel, manual_terminate] = self._transmit_start(message, channel, syncword, format_config)
+
+			while not manual_terminate:
+				sent_packet = self._transmit_poll()
+				if sent_packet is not None:
+					break
+				if self._transmit_remaining is None:
+					self._wait_for_packet(0.001)
+
+			self._transmit_finish(channel, manual_terminate)
+
+		if post_delay != 0:
+			time.sleep(post_delay)
+
+		return sent_packet
+
+	def _transmit_start(self, message, channel, syncword, format_config, repeat = False):
+		# If "repeat" is set, send the message already in the FIFO again
+		# (with the same syncword and format) by rewinding the FIFO
+		self._transmit_start_time = time.perf_counter()
+
+		if repeat:
+			radio_format_config = self._last_format_config
+		else:
 			# Set the syncword
 			if syncword is not None:
 				self.set_syncword(syncword, submit_queue = None)
 
 			# Apply any format changes
 			radio_format_config = self._apply_packet_format_config(format_config)
-			self._debug("Radio format_config = {}".format(radio_format_config))
+			self._debug("Radio format_config = {}", radio_format_config)
 
-			# Determine if the length should be included
-			if radio_format_config['packet_length_encoded'] == 1:
-				include_length = True
-			else:
-				include_length = False
+		# Determine if the length should be included
+		if radio_format_config['packet_length_encoded'] == 1:
+			include_length = True
+		else:
+			include_length = False
 
-			if radio_format_config['auto_term_tx'] == 1:
-				manual_terminate = False
-			else:
-				manual_terminate = True
+		if radio_format_config['auto_term_tx'] == 1:
+			manual_terminate = False
+		else:
+			manual_terminate = True
 
-			if channel is None:
-				state = self.get_register_bits('radio_state')
-				channel = state['channel']
+		self._listen_generation += 1
+
+		# Messages too large for the FIFO are written as they are sent,
+		# so the FIFO cannot be rewound to send them again.  One byte of
+		# the FIFO is left free so that its pointers do not wrap
+		self._transmit_message = message
+		self._transmit_status = 0
+		capacity = self._fifo_size - 1
+		if include_length:
+			capacity -= 1
+			if len(message) > 255:
+				raise ValueError('Message is too long ({} bytes, at most 255 may be sent)'.format(len(message)))
+		if len(message) > capacity:
+			repeat = False
 
+		if channel is None:
+			state = self.get_register_bits('radio_state')
+			channel = state['channel']
+
+		self._arm_packet_ready_event()
+
+		with self.batch():
 			# Initialize the transmitter
 			self.put_register_bits('radio_state', {
 				'tx_enabled': 0,
@@ -632,149 +1634,405 @@ class Radio:
 				'channel': 0
 			})
 
-			self.put_register_bits('fifo_state', {
-				'clear_read': 1,
-				'clear_write': 1
-			})
+			if repeat:
+				# Rewind the FIFO to send its contents again
+				self.put_register_bits('fifo_state', {
+					'clear_read': 1,
+					'clear_write': 0
+				})
+			else:
+				self.put_register_bits('fifo_state', {
+					'clear_read': 1,
+					'clear_write': 1
+				})
 
-			# Format message to send to fifo
-			self.fill_fifo(message, include_length = include_length, lock = False)
+				# Format message to send to fifo
+				self._transmit_remaining = None
+				if len(message) > capacity:
+					self._transmit_remaining = message[capacity:]
+				self._fill_fifo(message[:capacity], include_length = include_length, length = len(message))
 
 			# Tell the radio to transmit the FIFO buffer to the specified channel
 			self.put_register_bits('radio_state', {
 				'tx_enabled': 1,
 				'rx_enabled': 0,
 				'channel': channel
-			}, delay = 1000)
+			}, delay = self._timing['tx_enable'])
+
+		if self.metrics is not None:
+			self.metrics.channel(channel)
+		self._transmit_enable_time = time.perf_counter()
+
+		return [channel, manual_terminate]
+
+	def _transmit_poll(self, check_ack = False):
+		# Returns True once the packet has been sent, False if sending
+		# failed, or None if the radio is still transmitting.  If
+		# "check_ack" is set and auto_ack is enabled, the FIFO state is
+		# read in the same transaction, for _transmit_acked()
+		self._transmit_fifo_state = None
+		if check_ack and self._last_format_config.get('auto_ack', 0) == 1:
+			[radio_status, self._transmit_fifo_state] = self._read_registers([self._status_register, self._fifo_state_register])
+		else:
+			radio_status = self._get_status()
+		if self._debug_enabled:
+			self._debug("radio_status={}", self.get_register_bits('status', radio_status))
+
+		if radio_status & self._status_packet_flag:
+			if self.metrics is not None:
+				self.metrics.increment('packets_sent')
+				self.metrics.pkt_flag_latency.observe(time.perf_counter() - self._transmit_enable_time)
+			self._transmit_remaining = None
+			self._transmit_status = radio_status
+			return True
 
-			while not manual_terminate:
-				radio_status = self.get_register_bits('status')
-				self._debug("radio_status={}".format(radio_status))
+		if not radio_status & self._status_framer_status_mask:
+			if self.metrics is not None:
+				self.metrics.increment('failed_sends')
+			self._transmit_remaining = None
+			self._transmit_status = radio_status
+			return False
 
-				if radio_status['packet_flag'] == 1:
-					break
+		# Keep the FIFO topped up while the message is being sent, the
+		# FIFO flag (almost empty) fires too late to be waited for
+		if self._transmit_remaining is not None:
+			self._refill_fifo()
 
-				if radio_status['framer_status'] == 0:
-					sent_packet = False
-					break
-				time.sleep(0.001)
+		return None
 
-			# Stop transmitting, if needed
-			if manual_terminate:
-				self.put_register_bits('radio_state', {
-					'tx_enabled': 0,
-					'rx_enabled': 0,
-					'channel': channel
-				})
+	def _fifo_count(self):
+		# Number of bytes in the FIFO not yet read (or sent)
+		fifo_state = self.get_register('fifo_state')
+		return ((fifo_state >> 8) - fifo_state) & 0x3f
 
-		if post_delay != 0:
-			time.sleep(post_delay)
+	def _refill_fifo(self):
+		remaining = self._transmit_remaining
+		count = min(len(remaining), self._fifo_size - 1 - self._fifo_count())
+		if count <= 0:
+			return None
 
-		return sent_packet
+		self._fill_fifo(remaining[:count], include_length = False)
+
+		if count == len(remaining):
+			self._transmit_remaining = None
+		else:
+			self._transmit_remaining = remaining[count:]
+
+		return None
+
+	def _transmit_finish(self, channel, manual_terminate):
+		# Stop transmitting, if needed
+		if manual_terminate:
+			self.put_register_bits('radio_state', {
+				'tx_enabled': 0,
+				'rx_enabled': 0,
+				'channel': channel
+			})
+
+		if self.metrics is not None:
+			self.metrics.tx_latency.observe(time.perf_counter() - self._transmit_start_time)
+
+		capture_writer = self._config.get('capture')
+		if capture_writer is not None:
+			capture_writer.write(capture.direction_tx, channel, self._last_syncword, self._last_format_flags, self._transmit_status, self._transmit_message)
+
+		# Go back to listening if the background receiver is running
+		if self._receiver_suspended == 0:
+			self._resume_receiver()
+
+		return None
 
-	def multi_transmit(self, message, channels, retries = 3, delay = 0.1, syncword = None, submit_queue = '__DEFAULT__', format_config = None):
+	def _multi_transmit_frames(self, message, channels, retries, delay):
+		# List of (channel, post_delay) for each frame sent by multi_transmit
 		if len(channels) == 0 or retries == 0:
-			self._error("Asked to send the message {} a total of zero times ({} channels, {} retries)".format(message, channels, retries))
+			self._error("Asked to send the message {} a total of zero times ({} channels, {} retries)", message, channels, retries)
 
-		# Wait at-least 650 microseconds between frames
-		min_delay = 650.0 / 1000000.0
+		# Wait at-least the frame gap between frames
+		min_delay = self._timing['frame_gap'] / 1000000.0
 		post_delay = min_delay
 		final_delay = delay
 
+		frames = []
 		for channel_idx in range(len(channels)):
 			if channel_idx == (len(channels) - 1):
 				retries -= 1
 			channel = channels[channel_idx]
 			for i in range(retries):
-				if not self.transmit(message, channel, post_delay = post_delay, syncword = syncword, submit_queue = submit_queue, format_config = format_config):
+				frames.append((channel, post_delay))
+		frames.append((channel, final_delay))
+
+		return frames
+
+	def multi_transmit(self, message, channels, retries = 3, delay = 0.1, syncword = None, submit_queue = '__DEFAULT__', format_config = None, burst = None):
+		frames = self._multi_transmit_frames(message, channels, retries, delay)
+
+		# Unless queueing, load the FIFO once and rewind it for each frame
+		if burst is None:
+			burst = self._config.get('burst_transmit', True)
+		if submit_queue is not None and self._should_use_queue():
+			burst = False
+
+		if burst:
+			return self._transmit_burst(message, frames, syncword, format_config)
+
+		for channel, post_delay in frames:
+			if not self.transmit(message, channel, post_delay = post_delay, syncword = syncword, submit_queue = submit_queue, format_config = format_config):
+				return False
+
+		return True
+
+	def _transmit_burst(self, message, frames, syncword, format_config):
+		# Send the message once for each (channel, post_delay) frame, the
+		# radio is held (and the receiver kept away) until the last frame
+		# has been sent
+		with self._get_mutex(), self._suspend_receiver():
+			repeat = False
+			for frame_idx, (channel, post_delay) in enumerate(frames):
+				[channel, manual_terminate] = self._transmit_start(message, channel, syncword, format_config, repeat = repeat)
+				check_ack = frame_idx != (len(frames) - 1)
+
+				sent_packet = True
+				self._transmit_fifo_state = None
+				while not manual_terminate:
+					sent_packet = self._transmit_poll(check_ack)
+					if sent_packet is not None:
+						break
+					if self._transmit_remaining is None:
+						self._wait_for_packet(0.001)
+
+				self._transmit_finish(channel, manual_terminate)
+
+				if not sent_packet:
 					return False
-		if not self.transmit(message, channel, post_delay = final_delay, syncword = syncword, submit_queue = submit_queue, format_config = format_config):
-			return False
+
+				# An acknowledgement empties the FIFO, which then has to
+				# be loaded again for the next frame
+				if check_ack:
+					repeat = not self._transmit_acked(self._transmit_fifo_state)
+
+				if post_delay != 0 and frame_idx != (len(frames) - 1):
+					time.sleep(post_delay)
+
+		if post_delay != 0:
+			time.sleep(post_delay)
 
 		return True
 
+	def _transmit_acked(self, fifo_state = None):
+		# With auto_ack enabled, the radio empties the FIFO (the write
+		# pointer goes back to 0) when an acknowledgement is received.
+		# "fifo_state" is the FIFO state register, if already read
+		if self._last_format_config.get('auto_ack', 0) != 1:
+			return False
+
+		if fifo_state is None:
+			fifo_state = self.get_register('fifo_state')
+
+		return self.get_register_bits('fifo_state', fifo_state)['write_ptr'] == 0
+
+	def transmit_reliable(self, message, channels, retries = 3, syncword = None, format_config = None):
+		# Send the message with auto_ack enabled on each channel in turn,
+		# up to "retries" times per channel, stopping as soon as it is
+		# acknowledged.  Each send also uses the radio's own retransmits
+		# (rexmit_times in chip_power), which the radio does not count,
+		# so "attempts" counts the sends made here
+		if not isinstance(channels, (list, tuple, range)):
+			channels = [channels]
+
+		format_config = dict(format_config or {})
+		format_config['auto_ack'] = 1
+
+		# The FIFO is emptied by the acknowledgement, messages too large
+		# for it would make that impossible to see.  So would an empty
+		# message sent without a length byte, which leaves the FIFO
+		# empty whether or not it is acknowledged
+		length_encoded = self._resolve_packet_format_config(format_config)['packet_length_encoded'] == 1
+		capacity = self._fifo_size - 1
+		if length_encoded:
+			capacity -= 1
+		if len(message) > capacity:
+			raise ValueError('Message is too long for a reliable transmit ({} bytes, at most {} may be sent)'.format(len(message), capacity))
+		if len(message) == 0 and not length_encoded:
+			raise ValueError('An empty message cannot be sent reliably without its length')
+
+		attempts = 0
+		channel = None
+		with self._get_mutex(), self._suspend_receiver():
+			for channel in channels:
+				for attempt in range(retries):
+					if attempts != 0:
+						time.sleep(self._timing['frame_gap'] / 1000000.0)
+					attempts += 1
+
+					sent_packet = self.transmit(message, channel, syncword = syncword, submit_queue = None, format_config = format_config)
+					if sent_packet and self._transmit_acked():
+						if self.metrics is not None:
+							self.metrics.increment('acks_received')
+						return TransmitResult(True, channel, attempts)
+
+		if self.metrics is not None:
+			self.metrics.increment('acks_missed')
+
+		return TransmitResult(False, channel, attempts)
+
 	def _enqueue(self, submit_queue, syncword, message, channel, post_delay = 0, format_config = None):
 		if not self._should_use_queue():
 			raise ValueError('internal error: _enqueue called with queueing disabled')
 
-		with self._software_tx_queue_mutex:
+		with self._software_tx_queue_condition:
 			if submit_queue not in self._software_tx_queue:
 				self._software_tx_queue[submit_queue] = collections.deque([])
+				self._queue_limits(submit_queue)
 
 			self._software_tx_queue[submit_queue].append({
 				'syncword': syncword,
 				'message': message,
 				'channel': channel,
 				'post_delay': post_delay,
-				'format_config': format_config
+				'format_config': format_config,
+				'enqueue_time': time.monotonic()
 			})
 
+			# Syncword changes (with no message) are not captured
+			capture_writer = self._config.get('capture')
+			if capture_writer is not None and message is not None:
+				format_flags = self._encode_register_bits(self._register_numbers['format_config'], self._resolve_packet_format_config(format_config))
+				capture_writer.write(capture.direction_queued, channel, syncword, format_flags, 0, message)
+
+			if self.metrics is not None:
+				self.metrics.queue_depth_changed(submit_queue, len(self._software_tx_queue[submit_queue]))
+
+			# Wake the dequeue thread if this queue was not already waiting
+			if self._schedule_queue(submit_queue):
+				self._software_tx_queue_condition.notify()
+
 		return None
 
-	def _run_queue(self):
-		self._debug("Started run_queue process")
+	def _schedule_queue(self, submit_queue):
+		# Must be called with the queue mutex held
+		if submit_queue in self._software_tx_queue_scheduled:
+			return False
+		if len(self._software_tx_queue[submit_queue]) == 0:
+			return False
 
-		sleep_time = 0
+		queue_next_time = self._software_tx_queue_next_time.get(submit_queue, 0)
+		heapq.heappush(self._software_tx_queue_schedule, (queue_next_time, submit_queue))
+		self._software_tx_queue_scheduled.add(submit_queue)
+
+		return True
+
+	def _wait_for_queues(self):
+		# Must be called with the queue mutex held, returns the names of
+		# the queues which are due to be run, or None if the dequeue
+		# thread should exit
+		schedule = self._software_tx_queue_schedule
 		while True:
-			if sleep_time != 0:
-				self._debug("Sleeping for {} seconds".format(sleep_time))
-				time.sleep(sleep_time)
+			now = time.monotonic()
 
-			with self._software_tx_queue_mutex:
-				for queue in self._software_tx_queue:
-					if len(self._software_tx_queue[queue]) != 0:
-						self._debug("Running the queue named {}: {} items left".format(queue, len(self._software_tx_queue[queue])))
+			due_queues = []
+			while len(schedule) != 0 and schedule[0][0] <= now:
+				submit_queue = heapq.heappop(schedule)[1]
+				self._software_tx_queue_scheduled.discard(submit_queue)
 
-			try:
-				[processed_items, remaining_items] = self._run_queue_once()
-			except Exception as error_info:
-				self._error("Failed to run queue: {}".format(error_info.args))
-				processed_items = 0
-				remaining_items = 0
+				# The queue may have been delayed further since it was
+				# scheduled, if so put it back at the right time
+				if self._software_tx_queue_next_time.get(submit_queue, 0) > now:
+					self._schedule_queue(submit_queue)
+					continue
+
+				due_queues.append(submit_queue)
 
-			self._debug("Completed running the queue, did {} items and {} items left (continue queue = {})".format(processed_items, remaining_items, self._should_use_queue()))
+			if len(due_queues) != 0:
+				return due_queues
 
-			if remaining_items == 0:
+			if len(schedule) == 0:
 				# If the queue is empty and we are no longer queuing
-				# events, exit this function (which should be joined)
+				# events, exit (the thread should be joined)
 				if not self._should_use_queue():
-					self._debug("Request to stop run_queue process, exiting")
 					return None
+				timeout = None
+			else:
+				timeout = schedule[0][0] - now
 
-				# If there are no events, wait a bit
-				# longer before trying again
-				sleep_time = 0.5
-				continue
+			self._software_tx_queue_condition.wait(timeout)
 
-			if processed_items == 0:
-				# If we processed no items, but there are items left to
-				# process, back off slightly
-				if sleep_time == 0:
-					sleep_time = 0.001
-				else:
-					sleep_time = min(0.5, sleep_time * 2)
-				continue
+	def _run_queue(self):
+		self._debug("Started run_queue process")
+
+		while True:
+			with self._software_tx_queue_condition:
+				due_queues = self._wait_for_queues()
+
+			if due_queues is None:
+				self._debug("Request to stop run_queue process, exiting")
+				return None
+
+			try:
+				[processed_items, remaining_items] = self._run_queue_once(due_queues)
+			except Exception as error_info:
+				self._error("Failed to run queue: {}", error_info.args)
+				processed_items = 0
+				remaining_items = 0
+
+			# Schedule any queues which still have items waiting
+			with self._software_tx_queue_condition:
+				for submit_queue in due_queues:
+					self._schedule_queue(submit_queue)
 
-			# If there are more events to process, try again
-			sleep_time = 0
+			self._debug("Completed running the queue, did {} items and {} items left (continue queue = {})", processed_items, remaining_items, self._should_use_queue())
 
 		return None
 
-	def _run_queue_once(self):
+	def _run_queue_once(self, due_queues = None):
 		to_transmit = []
 		remaining_items = 0
-		now = time.time()
+		now = time.monotonic()
 		with self._software_tx_queue_mutex:
-			for submit_queue in self._software_tx_queue:
-				# Determine if we should run this queue yet
-				if submit_queue not in self._software_tx_queue_next_time:
-					self._software_tx_queue_next_time[submit_queue] = now
-
-				queue_next_time = self._software_tx_queue_next_time[submit_queue]
+			if due_queues is None:
+				due_queues = list(self._software_tx_queue)
+
+			# Determine which queues we should run yet, putting off any
+			# queue which is over its rate limits until it is not
+			runnable_queues = []
+			for submit_queue in due_queues:
+				queue_next_time = self._software_tx_queue_next_time.get(submit_queue, now)
 				if now < queue_next_time:
 					remaining_items += len(self._software_tx_queue[submit_queue])
 					continue
 
+				if len(self._software_tx_queue[submit_queue]) == 0:
+					continue
+
+				ready_time = self._queue_ready_time(self._queue_limits(submit_queue), now)
+				if ready_time > now:
+					self._software_tx_queue_next_time[submit_queue] = ready_time
+					self._software_tx_queue_stats['rate_limited'] += 1
+					if self.metrics is not None:
+						self.metrics.increment('queue_rate_limited')
+					remaining_items += len(self._software_tx_queue[submit_queue])
+					continue
+
+				runnable_queues.append(submit_queue)
+
+			# Only the most urgent of those queues are run, the others
+			# are run once no more urgent queue is due
+			priority = None
+			for submit_queue in runnable_queues:
+				queue_priority = self._queue_limits(submit_queue)['priority']
+				if priority is None or queue_priority > priority:
+					priority = queue_priority
+
+			for submit_queue in runnable_queues:
+				limits = self._queue_limits(submit_queue)
+				if limits['priority'] != priority:
+					remaining_items += len(self._software_tx_queue[submit_queue])
+					continue
+
+				# Take no more items than the queue has tokens for
+				max_items = None
+				if limits['settings']['rate'] is not None:
+					max_items = int(limits['tokens'])
+
 				# Record how many items to pop off this queue
 				pop_items = 0
 				for item in self._software_tx_queue[submit_queue]:
@@ -784,19 +2042,26 @@ class Radio:
 					# a note of it in the queue time and don't pull anything else
 					# from this queue
 					item['submit_queue'] = submit_queue
-					if item['post_delay'] != 0:
+					item['limits'] = limits
+					if item['post_delay'] != 0 or pop_items == max_items:
 						break
 
 				# Pop off the items to transmit in this run into a list
 				if pop_items != 0:
-					self._debug("Found {} items to transmit in the {} queue".format(pop_items, submit_queue))
+					self._debug("Found {} items to transmit in the {} queue", pop_items, submit_queue)
 				while pop_items != 0:
-					to_transmit.append(self._software_tx_queue[submit_queue].popleft())
+					item = self._software_tx_queue[submit_queue].popleft()
+					to_transmit.append(item)
 					pop_items -= 1
 
 				remaining_items += len(self._software_tx_queue[submit_queue])
+				if self.metrics is not None:
+					self.metrics.queue_depth_changed(submit_queue, len(self._software_tx_queue[submit_queue]))
 
-		to_transmit_ordered = {}
+		# Group the items to transmit by queue, preserving their order
+		# within each queue
+		sequences = collections.OrderedDict()
+		transmittable = []
 		default_syncword = None
 		for item in to_transmit:
 			syncword = item['syncword']
@@ -811,59 +2076,453 @@ class Radio:
 				item['syncword'] = syncword
 
 			if message is None or channel is None:
+				if self.metrics is not None:
+					self.metrics.queue_item_waited(item['submit_queue'], now - item['enqueue_time'])
 				continue
 
-			key = str([syncword, channel])
+			item['settings'] = self._queue_item_settings(item)
+			transmittable.append(item)
 
-			if key not in to_transmit_ordered:
-				to_transmit_ordered[key] = []
+			if item['submit_queue'] not in sequences:
+				sequences[item['submit_queue']] = collections.deque([])
+			sequences[item['submit_queue']].append(item)
 
-			to_transmit_ordered[key].append(item)
+		initial_settings = self._current_radio_settings()
+		to_transmit_ordered = self._order_queue_items(list(sequences.values()), initial_settings)
+
+		# Items which are not sent in this run, because a more urgent
+		# queue became due or their queue ran out of airtime, are put
+		# back at the front of their queues
+		deferred = []
+		held_queues = set()
+		sent = []
+
+		self._debug("Getting ready to transmit {} items", len(to_transmit))
+		with self._get_mutex(), self._suspend_receiver():
+			for index, item in enumerate(to_transmit_ordered):
+				if item['submit_queue'] in held_queues:
+					deferred.append(item)
+					continue
+
+				if index != 0 and self._queue_preempted(priority):
+					self._software_tx_queue_stats['preemptions'] += 1
+					if self.metrics is not None:
+						self.metrics.increment('queue_preemptions')
+					deferred += to_transmit_ordered[index:]
+					break
+
+				limits = item['limits']
+				start_time = time.monotonic()
+
+				deadline = limits['settings']['deadline']
+				if deadline is not None and start_time - item['enqueue_time'] > deadline:
+					self._debug("Dropping item {} which missed its deadline", item)
+					self._software_tx_queue_stats['deadline_drops'] += 1
+					if self.metrics is not None:
+						self.metrics.increment('queue_deadline_drops')
+					continue
+
+				if self._queue_ready_time(limits, start_time) > start_time:
+					held_queues.add(item['submit_queue'])
+					deferred.append(item)
+					continue
+
+				self._debug("Transmitting item {}", item)
+				syncword = item['syncword']
+				channel = item['channel']
+				format_config = item['format_config']
+				message = item['message']
+
+				self.transmit(message, channel, lock = False, submit_queue = None, syncword = syncword, post_delay = 0, format_config = format_config)
+
+				end_time = time.monotonic()
+				sent.append(item)
+				self._software_tx_queue_next_time[item['submit_queue']] = end_time + item['post_delay']
+				if limits['settings']['rate'] is not None:
+					limits['tokens'] -= 1
+				if limits['settings']['airtime'] is not None:
+					limits['airtime_tokens'] -= end_time - start_time
+
+				if self.metrics is not None:
+					self.metrics.queue_item_waited(item['submit_queue'], start_time - item['enqueue_time'])
+
+		# Switches are counted for the items which were sent
+		if len(sent) != len(transmittable):
+			sent_ids = set(map(id, sent))
+			transmittable = [item for item in transmittable if id(item) in sent_ids]
+		self._record_queue_switches(initial_settings, sent, transmittable)
+
+		if len(deferred) != 0:
+			now = time.monotonic()
+			with self._software_tx_queue_mutex:
+				for item in reversed(deferred):
+					self._software_tx_queue[item['submit_queue']].appendleft(item)
+
+				for submit_queue in set(item['submit_queue'] for item in deferred):
+					if submit_queue in held_queues:
+						self._software_tx_queue_next_time[submit_queue] = self._queue_ready_time(self._queue_limits(submit_queue), now)
+						self._software_tx_queue_stats['rate_limited'] += 1
+						if self.metrics is not None:
+							self.metrics.increment('queue_rate_limited')
+					if self.metrics is not None:
+						self.metrics.queue_depth_changed(submit_queue, len(self._software_tx_queue[submit_queue]))
+
+			remaining_items += len(deferred)
+
+		return [len(to_transmit) - len(deferred), remaining_items]
+
+	def _resolve_queue_settings(self, settings):
+		# Turn the settings for a queue into a complete set of settings
+		for key in settings:
+			if key not in self._default_queue_settings:
+				raise ValueError('Unknown queue setting {}'.format(key))
+
+		result = dict(self._default_queue_settings)
+		result.update(settings)
+
+		for key in ['rate', 'airtime']:
+			if result[key] is not None and result[key] <= 0:
+				raise ValueError('Queue setting {} must be positive'.format(key))
+
+		if result['burst'] < 1:
+			raise ValueError('Queue setting burst must be at least 1')
+
+		if result['airtime_burst'] < 0:
+			raise ValueError('Queue setting airtime_burst must not be negative')
+
+		return result
+
+	def _queue_limits(self, submit_queue):
+		# Settings and token buckets of a queue, set up from the
+		# "queue_config" configuration option when the queue is first
+		# used.  Must be called with the queue mutex held, or from the
+		# dequeue thread
+		limits = self._software_tx_queue_limits.get(submit_queue)
+		if limits is None:
+			settings = self._resolve_queue_settings(self._config.get('queue_config', {}).get(submit_queue, {}))
+			limits = {
+				'settings': settings,
+				'priority': settings['priority'],
+				'tokens': settings['burst'],
+				'airtime_tokens': settings['airtime_burst'],
+				'updated': time.monotonic()
+			}
+			self._software_tx_queue_limits[submit_queue] = limits
+
+		return limits
+
+	def _queue_ready_time(self, limits, now):
+		# Refill the token buckets of a queue, and return when it may
+		# next send an item ("now" if it may already).  Sending an item
+		# takes a token, and the time taken sending it from the airtime
+		# bucket, which may go into debt
+		settings = limits['settings']
+		if now > limits['updated']:
+			elapsed = now - limits['updated']
+			limits['updated'] = now
+			if settings['rate'] is not None:
+				limits['tokens'] = min(settings['burst'], limits['tokens'] + elapsed * settings['rate'])
+			if settings['airtime'] is not None:
+				limits['airtime_tokens'] = min(settings['airtime_burst'], limits['airtime_tokens'] + elapsed * settings['airtime'])
+
+		ready_time = now
+		if settings['rate'] is not None and limits['tokens'] < 1:
+			ready_time = max(ready_time, now + (1 - limits['tokens']) / settings['rate'])
+		if settings['airtime'] is not None and limits['airtime_tokens'] < 0:
+			ready_time = max(ready_time, now - limits['airtime_tokens'] / settings['airtime'])
+
+		return ready_time
+
+	def _queue_preempted(self, priority):
+		# Whether a queue more urgent than "priority" has items which
+		# are due to be sent
+		now = time.monotonic()
+		with self._software_tx_queue_mutex:
+			for queue_time, submit_queue in self._software_tx_queue_schedule:
+				if queue_time > now or self._software_tx_queue_next_time.get(submit_queue, 0) > now:
+					continue
+
+				limits = self._queue_limits(submit_queue)
+				if limits['priority'] > priority and self._queue_ready_time(limits, now) <= now:
+					return True
+
+		return False
+
+	def configure_queue(self, submit_queue, settings):
+		# Change the settings of a queue (see the "queue_config"
+		# configuration option), which take effect from the next item
+		# sent from it with its token buckets full
+		self._resolve_queue_settings(settings)
+
+		queue_config = dict(self._config.get('queue_config', {}))
+		queue_config[submit_queue] = settings
+		self._config['queue_config'] = queue_config
+
+		# The dequeue thread sets the queue up again when next used
+		self._software_tx_queue_limits.pop(submit_queue, None)
+
+		return None
+
+	def _queue_item_settings(self, item):
+		# The radio settings needed to transmit an item, as a tuple of
+		# (syncword, format config, channel) that can be compared
+		syncword = item['syncword']
+		if syncword is not None:
+			syncword = tuple(syncword)
+
+		format_config = self._resolve_packet_format_config(item['format_config'])
+
+		return (syncword, tuple(sorted(format_config.items())), item['channel'])
+
+	def _current_radio_settings(self):
+		syncword = self._last_syncword
+		if syncword is not None:
+			syncword = tuple(syncword)
+
+		format_config = getattr(self, '_last_format_config', None)
+		if format_config is not None:
+			format_config = tuple(sorted(format_config.items()))
+
+		channel = self._register_shadow.get(self._register_number('radio_state'))
+		if channel is not None:
+			channel = channel & 0x7f
+
+		return (syncword, format_config, channel)
+
+	def _queue_switches(self, settings, new_settings):
+		# Names of the settings which differ, a syncword of None means
+		# the current syncword is kept
+		switches = []
+		if new_settings[0] is not None and new_settings[0] != settings[0]:
+			switches.append('syncword')
+		if new_settings[1] != settings[1]:
+			switches.append('format_config')
+		if new_settings[2] != settings[2]:
+			switches.append('channel')
+
+		return switches
+
+	def _order_queue_items(self, sequences, initial_settings):
+		# Order the items to minimize the cost of reconfiguring the
+		# radio between them, starting from "initial_settings".  Each
+		# sequence holds the items from a single queue, in order, and the
+		# next item is chosen greedily from the head of each sequence so
+		# that order is preserved
+		costs = self._default_queue_switch_costs.copy()
+		costs.update(self._config.get('queue_switch_costs', {}))
+
+		def switch_cost(settings, new_settings):
+			return sum(costs[kind] for kind in self._queue_switches(settings, new_settings))
+
+		ordered = []
+		settings = initial_settings
+		while True:
+			best_sequence = None
+			best_cost = None
+			for sequence in sequences:
+				if len(sequence) == 0:
+					continue
+				cost = switch_cost(settings, sequence[0]['settings'])
+				if best_cost is None or cost < best_cost:
+					best_sequence = sequence
+					best_cost = cost
+					if cost == 0:
+						break
+
+			if best_sequence is None:
+				break
+
+			item = best_sequence.popleft()
+			ordered.append(item)
+			settings = self._merge_radio_settings(settings, item['settings'])
+
+		return ordered
+
+	def _record_queue_switches(self, initial_settings, sent, arrival_order):
+		# Record the switches made, and those avoided compared with
+		# sending the items in the order they were queued
+		switches = self._count_queue_switches(initial_settings, sent)
+		arrival_switches = self._count_queue_switches(initial_settings, arrival_order)
+		for kind in self._default_queue_switch_costs:
+			self._software_tx_queue_stats[kind + '_switches'] += switches.get(kind, 0)
+			avoided = arrival_switches.get(kind, 0) - switches.get(kind, 0)
+			if avoided > 0:
+				self._software_tx_queue_stats[kind + '_switches_avoided'] += avoided
+
+		return None
+
+	def _merge_radio_settings(self, settings, new_settings):
+		syncword = new_settings[0]
+		if syncword is None:
+			syncword = settings[0]
+
+		return (syncword, new_settings[1], new_settings[2])
+
+	def _count_queue_switches(self, settings, items):
+		counts = {}
+		for item in items:
+			for kind in self._queue_switches(settings, item['settings']):
+				counts[kind] = counts.get(kind, 0) + 1
+			settings = self._merge_radio_settings(settings, item['settings'])
+
+		return counts
+
+	def queue_statistics(self):
+		return self._software_tx_queue_stats.copy()
 
-		self._debug("Getting ready to transmit {} items".format(len(to_transmit)))
-		with self._get_mutex():
-			for (key, items) in to_transmit_ordered.items():
-				for item in items:
-					self._debug("Transmitting item {}".format(item))
-					syncword = item['syncword']
-					channel = item['channel']
-					format_config = item['format_config']
-					message = item['message']
-
-					self.transmit(message, channel, lock = False, submit_queue = None, syncword = syncword, post_delay = 0, format_config = format_config)
-					self._software_tx_queue_next_time[item['submit_queue']] = time.time() + item['post_delay']
-
-		return [len(to_transmit), remaining_items]
-		
 	def start_listening(self, channel):
-		# Initialize the receiver
-		self.stop_listening()
+		self._listen_generation += 1
+
+		with self.batch():
+			# Initialize the receiver
+			self.stop_listening()
+
+			# Go into listening mode
+			self.put_register_bits('radio_state', {
+				'tx_enabled': 0,
+				'rx_enabled': 1,
+				'channel': channel
+			})
 
-		# Go into listening mode
-		self.put_register_bits('radio_state', {
-			'tx_enabled': 0,
-			'rx_enabled': 1,
-			'channel': channel
-		})
+		if self.metrics is not None:
+			self.metrics.channel(channel)
 
 		return True
 
 	def stop_listening(self):
-		# Initialize the receiver
-		self.put_register_bits('radio_state', {
-			'tx_enabled': 0,
-			'rx_enabled': 0,
-			'channel': 0
-		})
-
-		self.put_register_bits('fifo_state', {
-			'clear_read': 1,
-			'clear_write': 1
-		})
+		with self.batch():
+			# Initialize the receiver
+			self.put_register_bits('radio_state', {
+				'tx_enabled': 0,
+				'rx_enabled': 0,
+				'channel': 0
+			})
+
+			self.put_register_bits('fifo_state', {
+				'clear_read': 1,
+				'clear_write': 1
+			})
 
 		return True
 
-	def _apply_packet_format_config(self, format_config):
+	def scan_channels(self, channels, dwell = None, hardware = None):
+		# Measure the signal strength (RSSI, 0 to 63) on each channel,
+		# returned as an array of bytes in the same order as "channels".
+		# "dwell" is the time, in microseconds, spent on each channel
+		channels = list(channels)
+		if dwell is None:
+			dwell = self._get_default_register_value('scan_rssi_state')['wait_time']
+		if hardware is None:
+			hardware = self._config.get('hardware_rssi_scan', True)
+
+		rssi = None
+		with self._get_mutex(), self._suspend_receiver():
+			self._listen_generation += 1
+			if hardware:
+				rssi = self._scan_rssi_hardware(sorted(set(channels)), dwell)
+				if rssi is None:
+					self._error("Hardware RSSI scan did not complete, reading raw_rssi instead")
+
+			if rssi is None:
+				rssi = self._scan_rssi_raw(sorted(set(channels)), dwell)
+
+			self.stop_listening()
+
+		return array.array('B', [rssi[channel] for channel in channels])
+
+	def _scan_rssi_hardware(self, channels, dwell):
+		# Sweep up to 64 channels at a time with the chip's scan mode,
+		# which writes the RSSI of each channel to the FIFO
+		rssi = {}
+		scan_rssi = self._get_default_register_value('scan_rssi').copy()
+		try:
+			index = 0
+			while index < len(channels):
+				start = channels[index]
+				while index < len(channels) and channels[index] < start + 64:
+					index += 1
+				count = channels[index - 1] - start + 1
+
+				self._arm_packet_ready_event()
+				with self.batch():
+					self.put_register_bits('radio_state', {
+						'tx_enabled': 0,
+						'rx_enabled': 0,
+						'channel': 0
+					})
+					self.put_register_bits('fifo_state', {
+						'clear_read': 1,
+						'clear_write': 1
+					})
+
+					scan_rssi['channel'] = count - 1
+					self.put_register_bits('scan_rssi', scan_rssi)
+					self.put_register_bits('scan_rssi_state', {
+						'enabled': 1,
+						'channel_offset': start,
+						'wait_time': dwell
+					})
+
+					self.put_register_bits('radio_state', {
+						'tx_enabled': 0,
+						'rx_enabled': 1,
+						'channel': start
+					})
+
+				# The chip raises PKT_FLAG once the sweep is done
+				deadline = time.monotonic() + (count * (dwell + self._timing['set_channel']) * 2.0 / 1000000.0) + 0.01
+				while not self._get_status() & self._status_packet_flag:
+					if time.monotonic() > deadline:
+						return None
+					self._wait_for_packet(0.001)
+
+				values = self._read_fifo(count)
+				for channel in channels:
+					if start <= channel < start + count:
+						rssi[channel] = values[channel - start] & 0x3f
+		finally:
+			# Leave scan mode
+			with self.batch():
+				self.put_register_bits('scan_rssi_state', self._get_default_register_value('scan_rssi_state'))
+				self.put_register_bits('scan_rssi', self._get_default_register_value('scan_rssi'))
+
+		return rssi
+
+	def _scan_rssi_raw(self, channels, dwell):
+		# Listen on each channel in turn and read its RSSI
+		rssi = {}
+		for channel in channels:
+			with self.batch():
+				self.put_register_bits('radio_state', {
+					'tx_enabled': 0,
+					'rx_enabled': 0,
+					'channel': 0
+				})
+				self.put_register_bits('radio_state', {
+					'tx_enabled': 0,
+					'rx_enabled': 1,
+					'channel': channel
+				}, delay = self._timing['set_channel'] + dwell)
+
+			rssi[channel] = self.get_register_bits('raw_rssi')['raw_rssi']
+
+		return rssi
+
+	def quietest_channels(self, channels, count, dwell = None, samples = 1):
+		# The "count" channels with the lowest RSSI, taking the highest
+		# RSSI seen on each channel over "samples" scans
+		channels = list(channels)
+		loudest = array.array('B', [0] * len(channels))
+		for sample in range(samples):
+			rssi = self.scan_channels(channels, dwell)
+			for index in range(len(channels)):
+				loudest[index] = max(loudest[index], rssi[index])
+
+		order = sorted(range(len(channels)), key = lambda index: loudest[index])
+
+		return [channels[index] for index in order[:count]]
+
+	def _resolve_packet_format_config(self, format_config):
 		# Apply radio format configuration difference from baseline
 		radio_format_config = self._get_default_register_value('format_config').copy()
 
@@ -871,18 +2530,96 @@ class Radio:
 		if format_config is not None:
 			radio_format_config.update(format_config)
 
+		return radio_format_config
+
+	def _apply_packet_format_config(self, format_config):
+		radio_format_config = self._resolve_packet_format_config(format_config)
+
 		if radio_format_config == self._last_format_config:
 			return radio_format_config
 
+		if self.metrics is not None:
+			self.metrics.increment('format_config_switches')
+
 		self._last_format_config = radio_format_config
+		self._last_format_flags = self._encode_register_bits(self._register_numbers['format_config'], radio_format_config)
 
-		self.put_register_bits('format_config', radio_format_config, delay = 5000)
-		new_config = self.get_register_bits('format_config')
-		self._info("Updated format_config to be {}".format(new_config))
+		self.put_register_bits('format_config', radio_format_config, delay = self._timing['format_config'])
+
+		# Read back the new configuration, only needed for logging
+		if self._info_enabled:
+			new_config = self.get_register_bits('format_config')
+			self._info("Updated format_config to be {}", new_config)
 
 		return radio_format_config
 
-	def receive(self, channel = None, wait = False, length = None, format_config = None, wait_time = 0.1):
+	def receive(self, channel = None, wait = False, length = None, format_config = None, wait_time = 0.1, into = None):
+		# If "into" is supplied the message is read into it and its
+		# length returned, instead of the message itself
+		if into is not None and not isinstance(into, bytearray):
+			into = memoryview(into)
+
+		# If the background receiver is running, take the next packet
+		# it has received instead of talking to the radio
+		if self._receiver is not None:
+			packet = self.get_packet(timeout = None if wait else 0)
+			if packet is None:
+				return None
+			if into is None:
+				return packet.payload
+			self._check_receive_buffer(into, len(packet.payload))
+			into[:len(packet.payload)] = packet.payload
+			return len(packet.payload)
+
+		# The radio is only held while it is polled, so other threads
+		# may use it while this one waits.  They take priority: if the
+		# radio was used, it is put back into listening mode (and any
+		# frame which was arriving is lost).  A transmit which let go of
+		# the radio while sending (from an AsyncRadio) is not disturbed,
+		# the radio is left alone until it is done
+		state = {'crc_error_count': 0, 'receiving': False}
+		generation = None
+		while True:
+			# While it is left alone the radio is not even taken to check,
+			# an AsyncRadio transmitting only tries for it and backs off
+			if wait and self._receiver_suspended != 0:
+				self._wait_for_packet(wait_time)
+				continue
+
+			with self._get_mutex():
+				if self._receiver_suspended != 0:
+					message = None
+					state['receiving'] = False
+				else:
+					if generation is None or (wait and self._listen_generation != generation):
+						[channel, length] = self._receive_start(channel, wait, length, format_config)
+						state['partial'] = None
+
+					message = self._receive_poll(channel, length, state, into)
+					generation = self._listen_generation
+
+			if message is not None:
+				break
+
+			if not wait:
+				return None
+
+			# Keep polling while a frame is arriving, only giving other
+			# threads a chance to run
+			if state['receiving']:
+				time.sleep(0)
+			else:
+				self._wait_for_packet(wait_time)
+
+		return message
+
+	def _check_receive_buffer(self, into, message_length):
+		if message_length > len(into):
+			raise ValueError('Buffer too small for the message ({} bytes, {} received)'.format(len(into), message_length))
+
+		return None
+
+	def _receive_format_config(self, length, format_config):
 		# If a length is supplied, assume that the packet is not length encoded
 		# but allow the user to override that by supplying a format config
 		if length is not None:
@@ -892,74 +2629,280 @@ class Radio:
 				format_config = format_config.copy()
 				format_config['packet_length_encoded'] = 0
 
-		with self._get_mutex():
-			# Apply the current configuration, if it is already applied
-			# this will be a no-op
-			self._apply_packet_format_config(format_config)
-
-			if wait:
-				if channel is None:
-					state = self.get_register_bits('radio_state')
-					channel = state['channel']
-
-				self.start_listening(channel)
-
-			message = []
-
-			crc_error_count = 0
-			while True:
-				radio_status = self.get_register_bits('status')
-				self._debug("radio_status={}".format(radio_status))
-
-				if radio_status['crc_error'] == 1:
-					crc_error_count += 1
-					if crc_error_count > 30:
-						self._reinitialize()
-			
-					self.start_listening(channel)
-					continue
+		return format_config
 
-				crc_error_count = 0
+	def _receive_start(self, channel, wait, length, format_config):
+		format_config = self._receive_format_config(length, format_config)
 
-				if radio_status['packet_flag'] == 0:
-					if wait:
-						time.sleep(wait_time)
-						continue
-					else:
-						self._unlock_radio()
-						return None
+		# Apply the current configuration, if it is already applied
+		# this will be a no-op
+		self._apply_packet_format_config(format_config)
 
-				# Data is available, read it from the FIFO register
-				# The first result will include the length
-				fifo_data = self.get_register('fifo')
+		if wait:
+			if channel is None:
+				state = self.get_register_bits('radio_state')
+				channel = state['channel']
 
-				if length is not None:
-					message_length = length
-					message += [fifo_data >> 8]
-					message_length -= 1
-				else:
-					message_length = fifo_data >> 8
+			self._arm_packet_ready_event()
+			self.start_listening(channel)
+
+		return [channel, length]
+
+	def _receive_poll(self, channel, length, state, into = None):
+		# Returns the message received, or None if there is no
+		# message ready yet.  If "into" (a bytearray or memoryview) is
+		# supplied the message is read into it and its length returned
+		radio_status = self._get_status()
+		if self._debug_enabled:
+			self._debug("radio_status={}", self.get_register_bits('status', radio_status))
+
+		# A frame too large for the FIFO overflows it faster than
+		# waiting between polls (or waking on FIFO_FLAG) can react, so
+		# the radio is polled without waiting from the first byte until
+		# the end of the frame.  Without a length, frames are streamed
+		# if they may be that large
+		if length is None:
+			stream = self._config.get('max_frame_length', 0) > self._fifo_size
+		else:
+			stream = length > self._fifo_size
+
+		state['status'] = radio_status
+		state['receiving'] = stream
+
+		if radio_status & self._status_crc_error:
+			if self.metrics is not None:
+				self.metrics.increment('crc_errors')
+			state['crc_error_count'] += 1
+			if state['crc_error_count'] > 30:
+				if self.metrics is not None:
+					self.metrics.increment('crc_error_resets')
+				self._recover('{} CRC errors in a row'.format(state['crc_error_count']))
+				state['crc_error_count'] = 0
+
+			state['partial'] = None
+			self._arm_packet_ready_event()
+			self.start_listening(channel)
+			return None
 
-				if message_length == 0:
-					self.start_listening(channel)
-					continue
+		state['crc_error_count'] = 0
 
-				# Keep track of the total message length to truncate it
-				final_message_length = message_length
+		# Bytes of a frame too large for the FIFO, drained while it
+		# was arriving
+		partial = state.get('partial')
 
-				message += [fifo_data & 0xff]
-				message_length -= 1
+		if not radio_status & self._status_packet_flag:
+			# Drain the FIFO once it is almost full (or, for a frame too
+			# large for it, as soon as the frame starts), and from then
+			# on until the whole frame has arrived
+			syncword_rx = (radio_status & self._status_syncword_rx) != 0
+			if radio_status & self._status_fifo_flag or partial is not None or (stream and syncword_rx):
+				if partial is None:
+					partial = bytearray()
+				partial += self._read_fifo(self._fifo_count())
+				state['partial'] = partial
 
-				# Read subsequent bytes from the FIFO register until
-				# there are no more bytes to read
-				while message_length > 0:
-					fifo_data = self.get_register('fifo')
-					message += [fifo_data >> 8, fifo_data & 0xff]
-					message_length -= 2
+			state['receiving'] = syncword_rx or stream
+			return None
 
-				# Truncate the message to its final size, since we have
-				# to read in 16-bit words, we may have an extra byte
-				message = message[0:final_message_length]
-				break
+		state['partial'] = None
+
+		# Data is available, read it from the FIFO register
+		# The first byte will be the length, unless it was supplied
+		if partial is None:
+			partial = bytearray()
+		if length is None:
+			if len(partial) == 0:
+				partial = self._read_fifo(1)
+			message_length = partial[0]
+			partial = partial[1:]
+		else:
+			message_length = length
+
+		if message_length == 0:
+			self._arm_packet_ready_event()
+			self.start_listening(channel)
+			return None
+
+		# A message too large for the caller's buffer is dropped
+		if into is not None and message_length > len(into):
+			if channel is None:
+				channel = self.get_register_bits('radio_state')['channel']
+			self._arm_packet_ready_event()
+			self.start_listening(channel)
+			self._check_receive_buffer(into, message_length)
+
+		if self.metrics is not None:
+			self.metrics.increment('packets_received')
+
+		# Read the rest of the message in a single burst
+		if into is not None:
+			if len(partial) != 0:
+				into[:len(partial)] = partial
+			self._read_fifo(message_length - len(partial), into, len(partial))
+			message = message_length
+		elif len(partial) == 0:
+			message = self._read_fifo(message_length)
+		else:
+			message = partial + self._read_fifo(message_length - len(partial))
+
+		capture_writer = self._config.get('capture')
+		if capture_writer is not None:
+			payload = message
+			if into is not None:
+				payload = memoryview(into)[:message_length]
+			capture_writer.write(capture.direction_rx, channel, self._last_syncword, self._last_format_flags, radio_status, payload)
 
 		return message
+
+	def start_receiver(self, channel = None, buffer_size = 64, callback = None, length = None, format_config = None, wait_time = 0.1):
+		# Keep the radio listening in the background, pushing received
+		# packets into a ring buffer of "buffer_size" packets (the
+		# oldest packets are dropped when it is full, and with a size of
+		# 0 packets are only passed to the callbacks)
+		if self._receiver is not None:
+			raise ValueError('Receiver is already running')
+
+		with self._get_mutex():
+			[channel, length] = self._receive_start(channel, True, length, format_config)
+
+			# Put back after each transmit, so it is kept as applied
+			self._receiver = {
+				'channel': channel,
+				'length': length,
+				'format_config': self._receive_format_config(length, format_config),
+				'wait_time': wait_time,
+				'buffer': _PacketBuffer(buffer_size, callback, self._error)
+			}
+
+		self._receiver_thread = threading.Thread(target = self._run_receiver, args = (self._receiver,), daemon = True)
+		self._receiver_thread.start()
+
+		return None
+
+	def stop_receiver(self):
+		receiver = self._receiver
+		if receiver is None:
+			return None
+
+		receiver['buffer'].stop()
+
+		self._receiver_thread.join()
+		self._receiver_thread = None
+
+		with self._get_mutex():
+			self._receiver = None
+			self.stop_listening()
+
+		return None
+
+	def add_receiver_callback(self, callback):
+		if self._receiver is None:
+			raise ValueError('Receiver is not running')
+
+		return self._receiver['buffer'].add_callback(callback)
+
+	def receiver_statistics(self):
+		receiver = self._receiver
+		if receiver is None:
+			return None
+
+		return receiver['buffer'].statistics()
+
+	def get_packet(self, timeout = None):
+		# Take the oldest packet from the receiver's ring buffer, waiting
+		# up to "timeout" seconds (forever if None) for one to arrive
+		receiver = self._receiver
+		if receiver is None:
+			raise ValueError('Receiver is not running')
+
+		return receiver['buffer'].get(timeout)
+
+	def received_packets(self, timeout = None):
+		# Iterate over received packets until the receiver is stopped
+		# (or no packet arrives within "timeout" seconds)
+		while True:
+			packet = self.get_packet(timeout)
+			if packet is None:
+				return
+			yield packet
+
+	@contextlib.contextmanager
+	def _suspend_receiver(self):
+		# Defer going back to listening until several transmits are done
+		self._receiver_suspended += 1
+		try:
+			yield None
+		finally:
+			self._receiver_suspended -= 1
+			if self._receiver_suspended == 0:
+				self._resume_receiver()
+
+	def _resume_receiver(self):
+		receiver = self._receiver
+		if receiver is None or not receiver['buffer'].running:
+			return None
+
+		self._apply_packet_format_config(receiver['format_config'])
+		self._arm_packet_ready_event()
+		self.start_listening(receiver['channel'])
+
+		return None
+
+	def _run_receiver(self, receiver):
+		self._debug("Started receiver process")
+
+		channel = receiver['channel']
+		length = receiver['length']
+		buffer = receiver['buffer']
+		state = {'crc_error_count': 0, 'receiving': False}
+		generation = self._listen_generation
+		while buffer.running:
+			# Don't even take the radio while the receiver is suspended,
+			# an AsyncRadio transmitting only tries for it and backs off
+			if self._receiver_suspended != 0:
+				generation = None
+				self._wait_for_packet(receiver['wait_time'])
+				continue
+
+			with self._get_mutex():
+				if not buffer.running:
+					break
+
+				# Leave the radio alone while a transmit which let go of
+				# it (from an AsyncRadio) is in flight, or while several
+				# transmits are being made
+				if self._receiver_suspended != 0:
+					message = None
+					state['receiving'] = False
+					generation = None
+				else:
+					# Anything drained from the FIFO before the radio was
+					# used by someone else is not part of the next frame
+					if self._listen_generation != generation:
+						state['partial'] = None
+
+					try:
+						message = self._receive_poll(channel, length, state)
+					except Exception as error_info:
+						self._error("Failed to receive: {}", error_info.args)
+						message = None
+
+					# Go straight back to listening for the next packet
+					if message is not None:
+						self._arm_packet_ready_event()
+						self.start_listening(channel)
+
+					generation = self._listen_generation
+
+			if message is None:
+				if state['receiving']:
+					time.sleep(0)
+				else:
+					self._wait_for_packet(receiver['wait_time'])
+				continue
+
+			buffer.put(ReceivedPacket(time.time(), channel, state['status'], message))
+
+		self._debug("Receiver process exiting")
+
+		return None
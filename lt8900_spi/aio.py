@@ -0,0 +1,242 @@
+#! /usr/bin/env python3
+
+# asyncio interface to an lt8900_spi.Radio
+#
+#     radio = lt8900_spi.aio.AsyncRadio(lt8900_spi.Radio(0, 0, config))
+#     await radio.transmit([0x01, 0x02], 9)
+#     async for packet in radio.packets(9):
+#         ...
+
+import asyncio
+
+from . import PacketReadyEvent
+
+# The loop of the running coroutine, asyncio.get_running_loop() is new
+# in Python 3.7 (and get_event_loop() is deprecated in coroutines since)
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+class AsyncPacketReadyEvent(PacketReadyEvent):
+	# Packet-ready event source which can also be awaited, set by an
+	# edge callback on the PKT_FLAG pin from any thread.  Unless "loop"
+	# is given, it belongs to the loop which first awaits it
+	def __init__(self, loop = None):
+		super().__init__()
+		self._loop = None
+		self._async_event = None
+		if loop is not None:
+			self._bind(loop)
+
+	def _bind(self, loop):
+		self._async_event = asyncio.Event()
+		self._loop = loop
+
+	def set(self):
+		super().set()
+		loop = self._loop
+		if loop is not None:
+			loop.call_soon_threadsafe(self._async_event.set)
+
+	def clear(self):
+		super().clear()
+		if self._async_event is not None:
+			self._async_event.clear()
+
+	async def wait_async(self, timeout = None):
+		if self._loop is None:
+			self._bind(_get_running_loop())
+
+		# Set before the loop was known
+		if self._event.is_set():
+			return True
+
+		try:
+			await asyncio.wait_for(self._async_event.wait(), timeout)
+		except asyncio.TimeoutError:
+			return False
+		return True
+
+class _RadioMutex():
+	# Takes the radio's lock, which threads may hold for a while (e.g.,
+	# for a whole burst), without blocking the event loop: the lock is
+	# tried, and tried again every "poll_time" seconds until it is free
+	def __init__(self, radio, poll_time):
+		self._mutex = radio._get_mutex()
+		self._poll_time = poll_time
+
+	async def __aenter__(self):
+		while not self._mutex.acquire(blocking = False):
+			await asyncio.sleep(self._poll_time)
+		return None
+
+	async def __aexit__(self, exc_type, exc_value, traceback):
+		self._mutex.release()
+		return False
+
+class AsyncRadio():
+	def __init__(self, radio, poll_time = 0.001):
+		self.radio = radio
+		self.poll_time = poll_time
+		self._lock = None
+
+	def _get_lock(self):
+		# Created on first use so that it belongs to the running loop
+		if self._lock is None:
+			self._lock = asyncio.Lock()
+		return self._lock
+
+	def _get_mutex(self):
+		return _RadioMutex(self.radio, self.poll_time)
+
+	async def _wait_for_packet(self, poll_time):
+		event = self.radio._config.get('packet_ready_event')
+		if event is None:
+			await asyncio.sleep(poll_time)
+			return None
+
+		timeout = self.radio._config.get('packet_ready_timeout', 1.0)
+		if hasattr(event, 'wait_async'):
+			fired = await event.wait_async(timeout)
+		else:
+			fired = await _get_running_loop().run_in_executor(None, event.wait, timeout)
+
+		if fired:
+			event.clear()
+
+		return None
+
+	async def _transmit(self, message, channel, post_delay, syncword, format_config, repeat = False, check_ack = False):
+		# Must be called with the lock held
+		radio = self.radio
+		sent_packet = True
+
+		# The radio lock is let go of while the frame is being sent, so
+		# keep a background receiver from polling (and listening) until
+		# it is done
+		async with self._get_mutex():
+			radio._receiver_suspended += 1
+
+		try:
+			async with self._get_mutex():
+				[channel, manual_terminate] = radio._transmit_start(message, channel, syncword, format_config, repeat = repeat)
+
+			radio._transmit_fifo_state = None
+			while not manual_terminate:
+				async with self._get_mutex():
+					sent_packet = radio._transmit_poll(check_ack)
+				if sent_packet is not None:
+					break
+				if radio._transmit_remaining is None:
+					await self._wait_for_packet(self.poll_time)
+				else:
+					# Let other tasks run while refilling the FIFO
+					await asyncio.sleep(0)
+
+			async with self._get_mutex():
+				radio._transmit_finish(channel, manual_terminate)
+		finally:
+			async with self._get_mutex():
+				radio._receiver_suspended -= 1
+				if radio._receiver_suspended == 0:
+					radio._resume_receiver()
+
+		if post_delay != 0:
+			await asyncio.sleep(post_delay)
+
+		return sent_packet
+
+	async def transmit(self, message, channel = None, post_delay = 0, syncword = None, format_config = None):
+		async with self._get_lock():
+			return await self._transmit(message, channel, post_delay, syncword, format_config)
+
+	async def multi_transmit(self, message, channels, retries = 3, delay = 0.1, syncword = None, format_config = None, burst = None):
+		radio = self.radio
+		frames = radio._multi_transmit_frames(message, channels, retries, delay)
+
+		if burst is None:
+			burst = radio._config.get('burst_transmit', True)
+
+		# The lock is held for the whole burst so that the FIFO is not
+		# disturbed between frames
+		async with self._get_lock():
+			# Keep a background receiver from listening (and clearing
+			# the FIFO) until the last frame has been sent
+			async with self._get_mutex():
+				radio._receiver_suspended += 1
+
+			try:
+				repeat = False
+				for frame_idx, (channel, post_delay) in enumerate(frames):
+					check_ack = burst and frame_idx != (len(frames) - 1)
+					if not await self._transmit(message, channel, post_delay, syncword, format_config, repeat = repeat, check_ack = check_ack):
+						return False
+
+					# An acknowledgement empties the FIFO, which then has
+					# to be loaded again for the next frame
+					if check_ack:
+						async with self._get_mutex():
+							repeat = not radio._transmit_acked(radio._transmit_fifo_state)
+			finally:
+				async with self._get_mutex():
+					radio._receiver_suspended -= 1
+					if radio._receiver_suspended == 0:
+						radio._resume_receiver()
+
+		return True
+
+	async def receive(self, channel = None, wait = True, length = None, format_config = None, wait_time = 0.1):
+		# The lock is only held while talking to the radio, so that
+		# transmits may happen while waiting for a packet.  If the radio
+		# was used meanwhile (by this or any other thread), it is put
+		# back into listening mode
+		radio = self.radio
+
+		# If the background receiver is running, take the next packet
+		# it has received instead of talking to the radio.  It is waited
+		# for in an executor, "wait_time" seconds at a time, in case the
+		# receiver is stopped meanwhile
+		while radio._receiver is not None:
+			try:
+				packet = await _get_running_loop().run_in_executor(None, radio.get_packet, wait_time if wait else 0)
+			except ValueError:
+				# The receiver was stopped
+				break
+
+			if packet is not None:
+				return packet.payload
+
+			if not wait:
+				return None
+
+		state = {'crc_error_count': 0, 'receiving': False}
+		generation = None
+		while True:
+			async with self._get_lock():
+				async with self._get_mutex():
+					# Leave a transmit which let go of the radio while
+					# sending alone until it is done
+					if radio._receiver_suspended != 0:
+						message = None
+						state['receiving'] = False
+					else:
+						if generation is None or (wait and radio._listen_generation != generation):
+							[channel, length] = radio._receive_start(channel, wait, length, format_config)
+							state['partial'] = None
+
+						message = radio._receive_poll(channel, length, state)
+						generation = radio._listen_generation
+
+			if message is not None:
+				return message
+
+			if not wait:
+				return None
+
+			if state.get('receiving'):
+				await asyncio.sleep(0)
+			else:
+				await self._wait_for_packet(wait_time)
+
+	async def packets(self, channel = None, length = None, format_config = None, wait_time = 0.1):
+		# Asynchronous iterator of received packets
+		while True:
+			yield await self.receive(channel, wait = True, length = length, format_config = format_config, wait_time = wait_time)
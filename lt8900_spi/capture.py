@@ -0,0 +1,188 @@
+#! /usr/bin/env python3
+
+# Capture of the packets sent and received by a Radio, as fixed-size
+# binary records appended to a file, and replay of captures:
+#
+#     capture = lt8900_spi.capture.CaptureWriter('radio.cap')
+#     radio = lt8900_spi.Radio(0, 0, {'capture': capture})
+#     ...
+#     for record in lt8900_spi.capture.read('radio.cap'):
+#         print(record)
+#
+# The file starts with a header (magic, format version, record size)
+# followed by records, each:
+#   timestamp:    time.monotonic() when the record was written (double)
+#   direction:    direction_tx, direction_rx, or direction_queued
+#   channel:      channel, or 255 if not known
+#   syncword_len: number of 16-bit syncword words (0 if not known)
+#   length:       length of the payload
+#   syncword:     4 16-bit words, padded with zeros
+#   format_flags: value of the format_config register
+#   status:       value of the status register when the packet was
+#                 sent or received (0 for queued packets)
+#   payload:      255 bytes, padded with zeros
+
+import argparse
+import collections
+import struct
+import sys
+import time
+
+direction_tx = 0
+direction_rx = 1
+direction_queued = 2
+direction_names = ['tx', 'rx', 'queued']
+
+_magic = b'LT8900CP'
+_version = 1
+_header = struct.Struct('<8sHH')
+_record = struct.Struct('<dBBBB4HHH255sx')
+
+CaptureRecord = collections.namedtuple('CaptureRecord', ['timestamp', 'direction', 'channel', 'syncword', 'format_flags', 'status', 'payload'])
+
+class CaptureWriter():
+	def __init__(self, path, buffer_size = 65536):
+		# Records are appended, through a buffer of "buffer_size" bytes,
+		# so a capture may be continued across restarts
+		self._file = open(path, 'ab', buffering = buffer_size)
+		if self._file.tell() == 0:
+			self._file.write(_header.pack(_magic, _version, _record.size))
+
+		self.record_count = 0
+
+	def write(self, direction, channel, syncword, format_flags, status, payload):
+		if channel is None:
+			channel = 255
+
+		if syncword is None:
+			syncword = ()
+		words = list(syncword) + [0, 0, 0, 0]
+
+		if not isinstance(payload, (bytes, bytearray)):
+			payload = bytes(payload)
+
+		self._file.write(_record.pack(time.monotonic(), direction, channel, len(syncword), len(payload), words[0], words[1], words[2], words[3], format_flags, status, payload))
+		self.record_count += 1
+
+		return None
+
+	def flush(self):
+		self._file.flush()
+
+		return None
+
+	def close(self):
+		self._file.close()
+
+		return None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+		return False
+
+def read(path):
+	# Iterate over the records in a capture, one record at a time
+	with open(path, 'rb') as capture_file:
+		header = capture_file.read(_header.size)
+		if len(header) != _header.size:
+			raise ValueError('Not a capture file: {}'.format(path))
+
+		magic, version, record_size = _header.unpack(header)
+		if magic != _magic:
+			raise ValueError('Not a capture file: {}'.format(path))
+		if version != _version or record_size != _record.size:
+			raise ValueError('Unsupported capture file version {} (record size {})'.format(version, record_size))
+
+		while True:
+			data = capture_file.read(_record.size)
+			if len(data) < _record.size:
+				# A partial record at the end is from an interrupted
+				# write, and is skipped
+				return
+
+			fields = _record.unpack(data)
+			(timestamp, direction, channel, syncword_len, length) = fields[0:5]
+			syncword = list(fields[5:5 + syncword_len])
+			(format_flags, status, payload) = fields[9:12]
+
+			if channel == 255:
+				channel = None
+
+			yield CaptureRecord(timestamp, direction_names[direction], channel, syncword, format_flags, status, payload[:length])
+
+def replay(radio, records, speed = 1.0, directions = ('tx',)):
+	# Send the packets in a capture (a path, or an iterable of records)
+	# again with "radio", keeping their original spacing divided by
+	# "speed" (as fast as possible if None).  Only records whose
+	# direction is in "directions" are sent.  Returns the number of
+	# packets sent and the number which failed
+	if isinstance(records, str):
+		records = read(records)
+
+	sent = 0
+	failed = 0
+	first_timestamp = None
+	start_time = time.monotonic()
+	for record in records:
+		if record.direction not in directions:
+			continue
+
+		if speed is not None:
+			if first_timestamp is None:
+				first_timestamp = record.timestamp
+			wait = start_time + (record.timestamp - first_timestamp) / speed - time.monotonic()
+			if wait > 0:
+				time.sleep(wait)
+
+		format_config = radio.get_register_bits('format_config', record.format_flags)
+		del format_config['name']
+
+		syncword = record.syncword
+		if len(syncword) == 0:
+			syncword = None
+
+		if radio.transmit(record.payload, record.channel, syncword = syncword, submit_queue = None, format_config = format_config):
+			sent += 1
+		else:
+			failed += 1
+
+	return (sent, failed)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = 'Print, or replay, an LT8900 packet capture')
+	parser.add_argument('path', help = 'capture file')
+	parser.add_argument('--replay', action = 'store_true', help = 'send the transmitted packets again')
+	parser.add_argument('--bus', type = int, default = 0, help = 'SPI bus of the radio to replay with')
+	parser.add_argument('--device', type = int, default = 0, help = 'SPI device of the radio to replay with')
+	parser.add_argument('--speed', type = float, default = 1.0, help = 'replay speed, 0 for as fast as possible')
+	args = parser.parse_args(argv)
+
+	if not args.replay:
+		for record in read(args.path):
+			syncword = ' '.join('{:04x}'.format(word) for word in record.syncword)
+			print('{:.6f} {:6} channel={} syncword={} format={:04x} status={:04x} payload={}'.format(record.timestamp, record.direction, record.channel, syncword, record.format_flags, record.status, record.payload.hex()))
+		return 0
+
+	# Imported here, as lt8900_spi imports this module
+	from . import Radio
+
+	radio = Radio(args.bus, args.device)
+	if not radio.initialize():
+		print('Failed to initialize the radio', file = sys.stderr)
+		return 1
+
+	speed = args.speed
+	if speed == 0:
+		speed = None
+
+	(sent, failed) = replay(radio, args.path, speed)
+	print('Sent {} packets, {} failed'.format(sent, failed))
+
+	return 0 if failed == 0 else 1
+
+if __name__ == '__main__':
+	sys.exit(main())
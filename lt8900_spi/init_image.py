@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+
+# The register writes made by Radio.initialize(), compiled once into a
+# flat list of (register, value, delay) tuples which is written in a
+# single batch.  An image may be saved for a board, it is used as saved
+# unless the register values or delays it was compiled from have
+# changed since, in which case it is compiled again and rewritten:
+#
+#     radio = lt8900_spi.Radio(0, 0, {
+#         'init_registers': {'crystal': {'trim_adjust': 3}},
+#         'init_image': '/var/lib/radio/lt8900-init.json'
+#     })
+#
+# Delays are in microseconds.
+
+import hashlib
+import json
+
+_version = 3
+
+def compile_image(radio):
+	# Encode the radio's register defaults (including any overrides from
+	# the "init_registers" configuration option) in the order they are
+	# written, using the radio's timing profile for the delays
+	image = []
+	for name, bits in radio._default_register_values.items():
+		reg = radio._register_numbers[name]
+		delay = radio._timing['register_write']
+		if name == 'format_config':
+			bits = radio._resolve_packet_format_config({})
+			delay = radio._timing['format_config']
+
+		image.append((reg, radio._encode_register_bits(reg, bits), delay))
+
+	return image
+
+def fingerprint(image):
+	# Hash of the register values and delays of an image, saved with it
+	# so that a stale image can be recognized
+	encoded = json.dumps([[reg, value, delay] for reg, value, delay in image])
+
+	return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def source_fingerprint(radio):
+	# Hash of what the radio's image is compiled from: its register map,
+	# register defaults (with any overrides), and delays
+	encoded = json.dumps({
+		'version': _version,
+		'register_map': radio._register_map,
+		'registers': radio._default_register_values,
+		'format_config': radio._resolve_packet_format_config({}),
+		'delays': [radio._timing['register_write'], radio._timing['format_config']]
+	}, sort_keys = True)
+
+	return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def load(path, with_fingerprint = False):
+	# If "with_fingerprint" is set, returns the image, the fingerprint
+	# saved with it, and the fingerprint of what it was compiled from
+	# (None for images saved before either was)
+	with open(path, 'r') as image_file:
+		data = json.load(image_file)
+
+	if data.get('version') not in (1, 2, _version):
+		raise ValueError('Unsupported init image version {} in {}'.format(data.get('version'), path))
+
+	image = []
+	for entry in data['registers']:
+		reg = entry['register']
+		value = entry['value']
+		delay = entry['delay']
+		if not 0 <= reg < 0x80 or not 0 <= value <= 0xffff or delay < 0:
+			raise ValueError('Invalid init image entry {} in {}'.format(entry, path))
+		image.append((reg, value, delay))
+
+	if with_fingerprint:
+		return [image, data.get('fingerprint'), data.get('source')]
+
+	return image
+
+def save(image, path, register_names = None, source = None):
+	# "register_names", e.g., from the radio's register map, are saved
+	# alongside the register numbers for the reader's benefit only.
+	# "source" is the source_fingerprint() of the radio it was compiled
+	# for, without it the image is compiled again when next used
+	registers = []
+	for reg, value, delay in image:
+		entry = {'register': reg, 'value': value, 'delay': delay}
+		if register_names is not None:
+			entry['name'] = register_names[reg]
+		registers.append(entry)
+
+	with open(path, 'w') as image_file:
+		json.dump({'version': _version, 'fingerprint': fingerprint(image), 'source': source, 'registers': registers}, image_file, indent = 4, sort_keys = True)
+		image_file.write('\n')
+
+	return None
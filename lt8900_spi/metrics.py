@@ -0,0 +1,243 @@
+#! /usr/bin/env python3
+
+# Counters and latency histograms describing what a Radio is doing.
+# Updates are plain integer and list operations (no locking) so that
+# they can be left enabled in production; under heavy contention from
+# several threads an occasional update may be lost.  Only the per-queue
+# dictionaries, which grow as queues are used, are updated under a lock
+# so that they can be read while the queue thread changes them.
+
+import bisect
+import threading
+
+def _label(name, value):
+	# A 'name="value"' label, with the value escaped as the Prometheus
+	# text format requires
+	value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+	return '{}="{}"'.format(name, value)
+
+def _sample(metric, labels, value):
+	# A single sample line, "labels" is a list of 'name="value"' strings
+	labels = [label for label in labels if label != '']
+	if len(labels) == 0:
+		return '{} {}'.format(metric, value)
+	return '{}{{{}}} {}'.format(metric, ','.join(labels), value)
+
+class Histogram():
+	# Upper bounds of the buckets, in seconds
+	default_buckets = (
+		0.00005, 0.0001, 0.00025, 0.0005,
+		0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+		0.1, 0.25, 0.5, 1.0, 2.5
+	)
+
+	def __init__(self, buckets = None):
+		if buckets is None:
+			buckets = self.default_buckets
+		self.buckets = tuple(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+
+	def observe(self, value):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+
+	def snapshot(self):
+		return {
+			'buckets': list(self.buckets),
+			'counts': list(self.counts),
+			'count': self.count,
+			'sum': self.sum
+		}
+
+	def prometheus(self, name, labels = ()):
+		lines = []
+		cumulative = 0
+		for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+			cumulative += count
+			lines.append(_sample(name + '_bucket', list(labels) + [_label('le', bound)], cumulative))
+		lines.append(_sample(name + '_sum', labels, self.sum))
+		lines.append(_sample(name + '_count', labels, self.count))
+
+		return lines
+
+class RadioMetrics():
+	# Descriptions of the counters, used for the Prometheus export
+	counter_descriptions = {
+		'spi_transactions': 'SPI transactions (ioctls) performed',
+		'packets_sent': 'Packets sent successfully',
+		'failed_sends': 'Packets the radio failed to send (framer_status == 0)',
+		'acks_received': 'Reliable transmits which were acknowledged',
+		'acks_missed': 'Reliable transmits which were never acknowledged',
+		'packets_received': 'Packets received',
+		'crc_errors': 'Packets received with CRC errors',
+		'reinitializations': 'Full reinitializations of the radio',
+		'fill_fifo_resets': 'Recoveries triggered by FIFO write errors',
+		'crc_error_resets': 'Recoveries triggered by repeated CRC errors',
+		'registers_repaired': 'Registers found to differ, and rewritten, during recovery',
+		'syncword_switches': 'Changes of syncword',
+		'format_config_switches': 'Changes of packet format configuration',
+		'channel_switches': 'Changes of channel',
+		'queue_preemptions': 'Software tx queue runs cut short for a more urgent queue',
+		'queue_deadline_drops': 'Software tx queue items dropped after missing their deadline',
+		'queue_rate_limited': 'Times a software tx queue was held back by its rate limits'
+	}
+
+	# Steps taken to recover the radio after an error, in order
+	recovery_tiers = ('repair_registers', 'reset_state', 'reinitialize')
+
+	def __init__(self, register_names):
+		self.register_names = list(register_names)
+		self.counters = dict.fromkeys(self.counter_descriptions, 0)
+
+		# SPI transfers and bytes, indexed by register number
+		self.spi_transfers = [0] * len(self.register_names)
+		self.spi_bytes = [0] * len(self.register_names)
+
+		self.tx_latency = Histogram()
+		self.pkt_flag_latency = Histogram()
+
+		# Time taken by each recovery step, the count of each is how
+		# often that step was needed
+		self.recovery_latency = {tier: Histogram() for tier in self.recovery_tiers}
+
+		# Software tx queue depth and item wait time, by queue name,
+		# changed under "_queue_lock"
+		self.queue_depth = {}
+		self.queue_wait = {}
+		self._queue_lock = threading.Lock()
+
+		self.last_channel = None
+
+		# Locks with statistics (see Radio.lock_statistics), by name
+		self.locks = {}
+
+	def increment(self, name, amount = 1):
+		self.counters[name] += amount
+
+	def spi_transfer(self, reg, byte_count):
+		if reg < len(self.spi_transfers):
+			self.spi_transfers[reg] += 1
+			self.spi_bytes[reg] += byte_count
+
+	def channel(self, channel):
+		if channel != self.last_channel:
+			if self.last_channel is not None:
+				self.counters['channel_switches'] += 1
+			self.last_channel = channel
+
+	def queue_depth_changed(self, submit_queue, depth):
+		with self._queue_lock:
+			self.queue_depth[submit_queue] = depth
+
+	def queue_item_waited(self, submit_queue, wait_time):
+		with self._queue_lock:
+			histogram = self.queue_wait.get(submit_queue)
+			if histogram is None:
+				histogram = Histogram()
+				self.queue_wait[submit_queue] = histogram
+			histogram.observe(wait_time)
+
+	def _queue_snapshot(self):
+		# Copies of the per-queue dictionaries, safe to iterate
+		with self._queue_lock:
+			return [dict(self.queue_depth), {name: histogram.snapshot() for name, histogram in self.queue_wait.items()}]
+
+	def _spi_by_register(self, values):
+		result = {}
+		for reg, value in enumerate(values):
+			if value != 0:
+				result['{}:{}'.format(reg, self.register_names[reg])] = value
+
+		return result
+
+	def snapshot(self):
+		[queue_depth, queue_wait] = self._queue_snapshot()
+
+		return {
+			'counters': dict(self.counters),
+			'spi_transfers': self._spi_by_register(self.spi_transfers),
+			'spi_bytes': self._spi_by_register(self.spi_bytes),
+			'tx_latency': self.tx_latency.snapshot(),
+			'pkt_flag_latency': self.pkt_flag_latency.snapshot(),
+			'recovery_latency': {tier: histogram.snapshot() for tier, histogram in self.recovery_latency.items()},
+			'queue_depth': queue_depth,
+			'queue_wait': queue_wait,
+			'locks': {name: lock.statistics() for name, lock in self.locks.items()}
+		}
+
+	def prometheus(self, prefix = 'lt8900', labels = None):
+		# Export in the Prometheus text exposition format, "labels" is
+		# an optional dictionary of labels added to every sample
+		base_labels = []
+		if labels is not None:
+			base_labels = [_label(key, value) for key, value in sorted(labels.items())]
+
+		lines = []
+		for name, value in self.counters.items():
+			metric = '{}_{}_total'.format(prefix, name)
+			lines.append('# HELP {} {}'.format(metric, self.counter_descriptions[name]))
+			lines.append('# TYPE {} counter'.format(metric))
+			lines.append(_sample(metric, base_labels, value))
+
+		for name, values, description in [
+			('spi_transfers', self.spi_transfers, 'SPI transfers by register'),
+			('spi_bytes', self.spi_bytes, 'SPI bytes transferred by register')
+		]:
+			metric = '{}_{}_total'.format(prefix, name)
+			lines.append('# HELP {} {}'.format(metric, description))
+			lines.append('# TYPE {} counter'.format(metric))
+			for reg, value in enumerate(values):
+				if value != 0:
+					lines.append(_sample(metric, base_labels + [_label('register', self.register_names[reg])], value))
+
+		for name, histogram, description in [
+			('tx_latency_seconds', self.tx_latency, 'Time taken to transmit a packet'),
+			('pkt_flag_latency_seconds', self.pkt_flag_latency, 'Time from enabling the transmitter until PKT_FLAG')
+		]:
+			metric = '{}_{}'.format(prefix, name)
+			lines.append('# HELP {} {}'.format(metric, description))
+			lines.append('# TYPE {} histogram'.format(metric))
+			lines += histogram.prometheus(metric, base_labels)
+
+		metric = '{}_recovery_seconds'.format(prefix)
+		lines.append('# HELP {} Time taken by each step of recovering the radio after an error'.format(metric))
+		lines.append('# TYPE {} histogram'.format(metric))
+		for tier, histogram in self.recovery_latency.items():
+			lines += histogram.prometheus(metric, base_labels + [_label('tier', tier)])
+
+		# Copied first, the queue thread may add queues meanwhile
+		with self._queue_lock:
+			queue_depth = dict(self.queue_depth)
+			queue_wait = dict(self.queue_wait)
+
+		metric = '{}_queue_depth'.format(prefix)
+		lines.append('# HELP {} Items waiting in the software tx queue'.format(metric))
+		lines.append('# TYPE {} gauge'.format(metric))
+		for submit_queue, depth in queue_depth.items():
+			lines.append(_sample(metric, base_labels + [_label('queue', submit_queue)], depth))
+
+		metric = '{}_queue_wait_seconds'.format(prefix)
+		lines.append('# HELP {} Time items waited in the software tx queue'.format(metric))
+		lines.append('# TYPE {} histogram'.format(metric))
+		for submit_queue, histogram in queue_wait.items():
+			lines += histogram.prometheus(metric, base_labels + [_label('queue', submit_queue)])
+
+		for name, kind, description in [
+			('acquisitions', 'counter', 'Times the lock was taken'),
+			('contentions', 'counter', 'Times the lock had to be waited for'),
+			('wait_time', 'counter', 'Time spent waiting for the lock, in seconds'),
+			('hold_time', 'counter', 'Time the lock was held, in seconds'),
+			('max_hold_time', 'gauge', 'Longest time the lock was held, in seconds')
+		]:
+			metric = '{}_lock_{}'.format(prefix, name)
+			if kind == 'counter':
+				metric += '_total'
+			lines.append('# HELP {} {}'.format(metric, description))
+			lines.append('# TYPE {} {}'.format(metric, kind))
+			for lock_name, lock in self.locks.items():
+				lines.append(_sample(metric, base_labels + [_label('lock', lock_name)], getattr(lock, name)))
+
+		return '\n'.join(lines) + '\n'
@@ -0,0 +1,190 @@
+#! /usr/bin/env python3
+
+# Several LT8900 radios used together, each with its own worker thread
+# so that radios on separate SPI buses transmit in parallel:
+#
+#     pool = lt8900_spi.pool.RadioPool([
+#         lt8900_spi.Radio(0, 0, config),
+#         lt8900_spi.Radio(1, 0, config)
+#     ])
+#     pool.multi_transmit([0x01, 0x02], [9, 40, 71])
+#     pool.start_receiver([9, 40])
+#     for packet in pool.received_packets():
+#         ...
+
+import collections
+import concurrent.futures
+import threading
+
+from . import ReceivedPacket, _PacketBuffer
+
+# A packet received by one of the radios in a pool, "radio" is the
+# index of that radio in the pool
+PoolPacket = collections.namedtuple('PoolPacket', ['radio'] + list(ReceivedPacket._fields))
+
+class RadioPool():
+	def __init__(self, radios):
+		if len(radios) == 0:
+			raise ValueError('A pool needs at-least one radio')
+
+		self.radios = list(radios)
+
+		# One worker per radio, each radio is only ever used by
+		# its own worker (and its receiver thread)
+		self._workers = [concurrent.futures.ThreadPoolExecutor(max_workers = 1) for radio in self.radios]
+		self._pending = [0] * len(self.radios)
+		self._pending_lock = threading.Lock()
+		self._next_radio = 0
+
+		self._receiver = None
+
+	def close(self):
+		self.stop_receiver()
+		for worker in self._workers:
+			worker.shutdown(wait = True)
+
+		return None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+		return False
+
+	def _least_busy(self, count = 1):
+		# Indexes of the "count" radios with the least work pending,
+		# starting the search after the last radio picked so that idle
+		# radios are used in turn
+		with self._pending_lock:
+			start = self._next_radio
+			order = [(index + start) % len(self.radios) for index in range(len(self.radios))]
+			order.sort(key = lambda index: self._pending[index])
+			picked = order[:count]
+			self._next_radio = (picked[-1] + 1) % len(self.radios)
+
+		return picked
+
+	def _job_done(self, index):
+		with self._pending_lock:
+			self._pending[index] -= 1
+
+		return None
+
+	def submit(self, method, *args, radio = None, **kwargs):
+		# Run "method" (the name of a Radio method) on the given radio,
+		# or the least busy one, returning a concurrent.futures.Future
+		if radio is None:
+			[radio] = self._least_busy()
+
+		with self._pending_lock:
+			self._pending[radio] += 1
+
+		future = self._workers[radio].submit(getattr(self.radios[radio], method), *args, **kwargs)
+		future.add_done_callback(lambda future: self._job_done(radio))
+
+		return future
+
+	def transmit(self, message, channel = None, post_delay = 0, syncword = None, format_config = None, radio = None):
+		future = self.submit('transmit', message, channel, post_delay = post_delay, syncword = syncword, format_config = format_config, radio = radio)
+
+		return future.result()
+
+	def multi_transmit(self, message, channels, retries = 3, delay = 0.1, syncword = None, format_config = None):
+		# Split the channels between the least busy radios, each radio
+		# sending the message on its share of the channels in parallel
+		if len(channels) == 0:
+			return self.radios[0].multi_transmit(message, channels, retries, delay, syncword = syncword, format_config = format_config)
+
+		picked = self._least_busy(min(len(channels), len(self.radios)))
+
+		futures = []
+		for position, radio in enumerate(picked):
+			start = (position * len(channels)) // len(picked)
+			end = ((position + 1) * len(channels)) // len(picked)
+			futures.append(self.submit('multi_transmit', message, channels[start:end], retries, delay, syncword = syncword, format_config = format_config, radio = radio))
+
+		# Wait for every radio, even if one of them fails
+		results = [future.result() for future in futures]
+
+		return all(results)
+
+	def start_receiver(self, channels, buffer_size = 64, callback = None, length = None, format_config = None, wait_time = 0.1):
+		# Start every radio's background receiver, merging the packets
+		# received into a single ring buffer.  "channels" is either a
+		# single channel for all of the radios or a list with one channel
+		# for each radio
+		if self._receiver is not None:
+			raise ValueError('Receiver is already running')
+
+		if not isinstance(channels, (list, tuple)):
+			channels = [channels] * len(self.radios)
+
+		if len(channels) != len(self.radios):
+			raise ValueError('Expected {} channels, got {}'.format(len(self.radios), len(channels)))
+
+		# The radios' own receivers keep no packets, they only pass
+		# them on to the pool's.  Callback errors are reported by the
+		# radio which received the packet
+		buffer = _PacketBuffer(buffer_size, callback)
+		self._receiver = buffer
+
+		for index, (radio, channel) in enumerate(zip(self.radios, channels)):
+			if channel is None:
+				continue
+
+			radio.start_receiver(channel, buffer_size = 0, callback = self._packet_callback(buffer, index), length = length, format_config = format_config, wait_time = wait_time)
+
+		return None
+
+	def _packet_callback(self, buffer, index):
+		def callback(packet):
+			buffer.put(PoolPacket(index, *packet))
+
+			return None
+
+		return callback
+
+	def stop_receiver(self):
+		receiver = self._receiver
+		if receiver is None:
+			return None
+
+		for radio in self.radios:
+			radio.stop_receiver()
+
+		receiver.stop()
+
+		self._receiver = None
+
+		return None
+
+	def add_receiver_callback(self, callback):
+		if self._receiver is None:
+			raise ValueError('Receiver is not running')
+
+		return self._receiver.add_callback(callback)
+
+	def receiver_statistics(self):
+		receiver = self._receiver
+		if receiver is None:
+			return None
+
+		return receiver.statistics()
+
+	def get_packet(self, timeout = None):
+		# Take the oldest packet received by any radio, waiting up to
+		# "timeout" seconds (forever if None) for one to arrive
+		receiver = self._receiver
+		if receiver is None:
+			raise ValueError('Receiver is not running')
+
+		return receiver.get(timeout)
+
+	def received_packets(self, timeout = None):
+		while True:
+			packet = self.get_packet(timeout)
+			if packet is None:
+				return
+			yield packet
@@ -0,0 +1,477 @@
+#! /usr/bin/env python3
+
+# In-process model of an LT8900 radio, usable as the "transport" of
+# an lt8900_spi.Radio so that it can be exercised without hardware:
+#
+#     air = lt8900_spi.simulator.SimulatedAir()
+#     chip = lt8900_spi.simulator.SimulatedLT8900(air)
+#     radio = lt8900_spi.Radio(0, 0, {
+#         'transport': chip,
+#         'reset_command': chip.reset
+#     })
+
+import random
+import threading
+import time
+
+from . import Radio
+
+class SimulatedAir():
+	# Shared medium which carries packets between simulated radios
+	def __init__(self, loss_rate = 0.0, seed = None):
+		self.loss_rate = loss_rate
+		self._random = random.Random(seed)
+		self._lock = threading.Lock()
+		self._chips = []
+
+	def attach(self, chip):
+		with self._lock:
+			if chip not in self._chips:
+				self._chips.append(chip)
+
+	def detach(self, chip):
+		with self._lock:
+			if chip in self._chips:
+				self._chips.remove(chip)
+
+	def transmit(self, sender, channel, syncword, payload):
+		with self._lock:
+			chips = [chip for chip in self._chips if chip is not sender]
+
+		delivered = 0
+		acked = False
+		for chip in chips:
+			if self.loss_rate != 0 and self._random.random() < self.loss_rate:
+				continue
+			result = chip._receive_from_air(channel, syncword, payload)
+			if result != 0:
+				delivered += 1
+			if result == 2:
+				acked = True
+
+		# Acknowledgements can be lost too
+		if acked and not (self.loss_rate != 0 and self._random.random() < self.loss_rate):
+			sender._receive_ack()
+
+		return delivered
+
+class SimulatedLT8900():
+	# Register numbers used by the model
+	_reg = Radio._register_numbers
+	_fifo_register = _reg['fifo']
+	_fifo_state_register = _reg['fifo_state']
+	_radio_state_register = _reg['radio_state']
+	_status_register = _reg['status']
+	_packet_config_register = _reg['packet_config']
+	_thresholds_register = _reg['thresholds']
+	_format_config_register = _reg['format_config']
+	_raw_rssi_register = _reg['raw_rssi']
+	_scan_rssi_register = _reg['scan_rssi']
+	_scan_rssi_state_register = _reg['scan_rssi_state']
+	_syncword_registers = [_reg['syncword_0'], _reg['syncword_1'], _reg['syncword_2'], _reg['syncword_3']]
+
+	chip_id = (0x6fe0, 0x5681)
+	fifo_size = 64
+
+	def __init__(self, air = None, latency = 0.0, honor_delays = False, crc_error_rate = 0.0, packet_ready_event = None, seed = None, settling_times = None, byte_rate = 125000.0):
+		self.air = air
+		self.latency = latency
+		self.honor_delays = honor_delays
+		self.crc_error_rate = crc_error_rate
+		self.packet_ready_event = packet_ready_event
+		self._random = random.Random(seed)
+		self._lock = threading.RLock()
+
+		# Time, in microseconds, the chip needs after a write to each
+		# register (per byte for the FIFO) before it accepts another
+		# transfer.  Transfers made before that time has passed, less
+		# the delay requested with the write, are lost
+		self.settling_times = {}
+		if settling_times is not None:
+			for reg, settling_time in settling_times.items():
+				self.settling_times[self._reg[reg]] = settling_time
+		self._busy_until = 0
+		self.lost_transfer_count = 0
+
+		# Frames too large for the FIFO are sent and received at
+		# "byte_rate" bytes per second, so that the FIFO must be
+		# refilled (or drained) while the frame is on the air.  Frames
+		# lost because that was not done quickly enough are counted
+		self.byte_rate = byte_rate
+		self.stream_error_count = 0
+
+		# Signal strength (0 to 63) heard on each channel, see
+		# set_channel_rssi()
+		self.channel_rssi = [0] * 128
+
+		self.settings = {}
+		self.max_speed_hz = 0
+
+		# Counters of SPI activity, a transaction is a single call
+		# into the transport (which may carry several transfers)
+		self.transaction_count = 0
+		self.transfer_count = 0
+		self.byte_count = 0
+
+		# Packets sent and received, as (channel, payload) tuples
+		self.transmitted = []
+		self.received = []
+
+		# Acknowledgements received for packets sent with auto_ack
+		self.ack_count = 0
+
+		self._pending_crc_errors = 0
+		self._outgoing = None
+
+		self.reset()
+
+		if air is not None:
+			air.attach(self)
+
+	def reset(self):
+		with self._lock:
+			self.registers = [0] * len(Radio._register_map)
+			self.registers[0], self.registers[1] = self.chip_id
+			self.fifo = bytearray()
+			self.fifo_read_ptr = 0
+			self.packet_flag = False
+			self.crc_error = False
+			self.syncword_rx = False
+			self.framer_status = 0
+			self._busy_until = 0
+			self._streaming_tx = None
+			self._streaming_rx = None
+
+	def set_channel_rssi(self, channel, rssi):
+		with self._lock:
+			self.channel_rssi[channel] = rssi & 0x3f
+
+	def inject_crc_error(self, count = 1):
+		# The next "count" packets received will have CRC errors
+		with self._lock:
+			self._pending_crc_errors += count
+
+	# Transport interface
+	def configure(self, settings):
+		self.settings.update(settings)
+		self.max_speed_hz = self.settings.get('max_speed_hz', 0)
+
+	def xfer(self, data, delay = 0):
+		if self.latency != 0:
+			time.sleep(self.latency)
+
+		with self._lock:
+			self.transaction_count += 1
+
+		return self._transfer(data, delay)
+
+	def xfer_many(self, segments):
+		if self.latency != 0:
+			time.sleep(self.latency)
+
+		with self._lock:
+			self.transaction_count += 1
+
+		return [self._transfer(data, delay) for (data, delay) in segments]
+
+	def close(self):
+		if self.air is not None:
+			self.air.detach(self)
+
+	def _transfer(self, data, delay):
+		if self.honor_delays and delay != 0:
+			time.sleep(delay / 1000000.0)
+
+		with self._lock:
+			self.transfer_count += 1
+			self.byte_count += len(data)
+
+			reg = data[0] & 0x7f
+
+			if len(self.settling_times) != 0:
+				now = time.perf_counter()
+				if now < self._busy_until:
+					self.lost_transfer_count += 1
+					return [0] * len(data)
+
+				settling_time = self.settling_times.get(reg)
+				if settling_time is not None and data[0] & 0x80 == 0:
+					if reg == self._fifo_register:
+						settling_time *= len(data) - 1
+					if not self.honor_delays:
+						settling_time -= delay
+					self._busy_until = now + (settling_time / 1000000.0)
+
+			self._advance()
+
+			if data[0] & 0x80 == 0x80:
+				result = self._read(reg, len(data) - 1)
+			else:
+				self._write(reg, data[1:])
+				result = [1] * len(data)
+
+			outgoing = self._outgoing
+			self._outgoing = None
+
+		# Deliver any packet sent outside of the lock, so that two
+		# radios sending to each other cannot deadlock
+		if outgoing is not None and self.air is not None:
+			self.air.transmit(self, *outgoing)
+
+		return result
+
+	def _advance_later(self, byte_count):
+		# Move a streamed frame along once "byte_count" bytes have had
+		# time to be sent, even if nothing talks to the chip meanwhile
+		timer = threading.Timer((byte_count + 0.5) / self.byte_rate, self._advance_now)
+		timer.daemon = True
+		timer.start()
+
+	def _advance_now(self):
+		with self._lock:
+			self._advance()
+			outgoing = self._outgoing
+			self._outgoing = None
+
+		if outgoing is not None and self.air is not None:
+			self.air.transmit(self, *outgoing)
+
+	def _advance(self):
+		# Move streamed frames along to the current time
+		if self._streaming_tx is None and self._streaming_rx is None:
+			return None
+
+		now = time.perf_counter()
+
+		stream = self._streaming_tx
+		if stream is not None:
+			sent = min(stream['total'], int((now - stream['start']) * self.byte_rate))
+			if stream['offset'] + sent > len(self.fifo):
+				# The FIFO ran dry before the whole frame was sent
+				self._streaming_tx = None
+				self.framer_status = 0
+				self.stream_error_count += 1
+			else:
+				self.fifo_read_ptr = stream['offset'] + sent
+				if sent == stream['total']:
+					self._streaming_tx = None
+					payload = bytes(self.fifo[stream['offset']:self.fifo_read_ptr])
+					self.transmitted.append((stream['channel'], payload))
+					self._outgoing = (stream['channel'], self._syncword(), payload)
+					self._raise_packet_flag()
+
+		stream = self._streaming_rx
+		if stream is not None:
+			payload = stream['payload']
+			arrived = min(len(payload), int((now - stream['start']) * self.byte_rate))
+			if arrived > len(self.fifo):
+				self.fifo += payload[len(self.fifo):arrived]
+				if len(self.fifo) - self.fifo_read_ptr > self.fifo_size:
+					# The FIFO was not drained quickly enough
+					if not self.crc_error:
+						self.stream_error_count += 1
+					self.crc_error = True
+				elif self._status_value() & Radio._status_fifo_flag and self.packet_ready_event is not None:
+					# As if FIFO_FLAG was wired to the event too
+					self.packet_ready_event.set()
+			if arrived == len(payload):
+				self._streaming_rx = None
+				self.received.append((stream['channel'], payload))
+				self._raise_packet_flag()
+
+		return None
+
+	# Register model
+	def _status_value(self):
+		value = self.framer_status << 8
+		if self.crc_error:
+			value |= Radio._status_crc_error
+		if self.syncword_rx:
+			value |= 1 << 7
+		if self.packet_flag:
+			value |= Radio._status_packet_flag
+
+		# The FIFO flag is raised when the FIFO is almost empty while
+		# sending, or almost full otherwise
+		thresholds = self.registers[self._thresholds_register]
+		if self._streaming_tx is not None:
+			if len(self.fifo) - self.fifo_read_ptr <= (thresholds >> 11) & 0x1f:
+				value |= Radio._status_fifo_flag
+		elif len(self.fifo) - self.fifo_read_ptr >= self.fifo_size - ((thresholds >> 6) & 0x1f):
+			value |= Radio._status_fifo_flag
+
+		return value
+
+	def _read(self, reg, count):
+		if reg == self._fifo_register:
+			result = [0]
+			for index in range(count):
+				if self.fifo_read_ptr < len(self.fifo):
+					result.append(self.fifo[self.fifo_read_ptr])
+					self.fifo_read_ptr += 1
+				else:
+					result.append(0)
+			return result
+
+		if reg == self._status_register:
+			value = self._status_value()
+		elif reg == self._fifo_state_register:
+			value = ((len(self.fifo) & 0x3f) << 8) | (self.fifo_read_ptr & 0x3f)
+		elif reg == self._raw_rssi_register:
+			state = self.registers[self._radio_state_register]
+			value = 0
+			if state & (1 << 7):
+				value = self.channel_rssi[state & 0x7f] << 10
+		else:
+			value = self.registers[reg]
+
+		result = [0, (value >> 8) & 0xff, value & 0xff]
+		return result + [0] * (count - 2)
+
+	def _write(self, reg, data):
+		if reg == self._fifo_register:
+			self.fifo += bytes(data)
+			return None
+
+		value = (data[0] << 8) | data[1]
+		self.registers[reg] = value
+
+		if reg == self._fifo_state_register:
+			if value & (1 << 15):
+				self.fifo = bytearray()
+				self.fifo_read_ptr = 0
+			if value & (1 << 7):
+				self.fifo_read_ptr = 0
+		elif reg == self._radio_state_register:
+			self._streaming_tx = None
+			self._streaming_rx = None
+			self.packet_flag = False
+			self.crc_error = False
+			self.syncword_rx = False
+			self.framer_status = 0
+			if value & (1 << 8):
+				self._transmit(value & 0x7f)
+			elif value & (1 << 7) and self.registers[self._scan_rssi_state_register] & (1 << 15):
+				self._scan_rssi()
+
+		return None
+
+	def _syncword(self):
+		syncword_len = (self.registers[self._packet_config_register] >> 11) & 0x3
+		sw0, sw1, sw2, sw3 = [self.registers[reg] for reg in self._syncword_registers]
+		return [
+			(sw0,),
+			(sw3, sw0),
+			(sw3, sw2, sw0),
+			(sw3, sw2, sw1, sw0)
+		][syncword_len]
+
+	def _is_listening(self, channel):
+		state = self.registers[self._radio_state_register]
+		return state & (1 << 7) and (state & 0x7f) == channel
+
+	def _raise_packet_flag(self):
+		self.packet_flag = True
+		if self.packet_ready_event is not None:
+			self.packet_ready_event.set()
+
+	def _scan_rssi(self):
+		# Hardware RSSI scan, the RSSI of each channel scanned is
+		# written to the FIFO
+		count = ((self.registers[self._scan_rssi_register] >> 10) & 0x3f) + 1
+		offset = (self.registers[self._scan_rssi_state_register] >> 8) & 0x7f
+		self.fifo = bytearray(self.channel_rssi[(offset + index) & 0x7f] for index in range(count))
+		self.fifo_read_ptr = 0
+		self._raise_packet_flag()
+
+	def _auto_ack(self):
+		return self.registers[self._format_config_register] & (1 << 11) != 0
+
+	def _receive_ack(self):
+		# An acknowledgement empties the FIFO of the packet sent
+		with self._lock:
+			if not self._auto_ack():
+				return None
+			self.fifo = bytearray()
+			self.fifo_read_ptr = 0
+			self.ack_count += 1
+
+	def _length_encoded(self):
+		return self.registers[self._format_config_register] & (1 << 13) != 0
+
+	def _transmit(self, channel):
+		# A length encoded frame longer than the FIFO contents is sent
+		# as it is written
+		available = len(self.fifo) - self.fifo_read_ptr
+		if self._length_encoded() and available != 0 and self.fifo[self.fifo_read_ptr] + 1 > available:
+			total = self.fifo[self.fifo_read_ptr] + 1
+			self._streaming_tx = {
+				'channel': channel,
+				'start': time.perf_counter(),
+				'offset': self.fifo_read_ptr,
+				'total': total
+			}
+			self.framer_status = 1
+			self._advance_later(total)
+			return None
+
+		payload = bytes(self.fifo[self.fifo_read_ptr:])
+		self.fifo_read_ptr = len(self.fifo)
+		self.transmitted.append((channel, payload))
+		self._outgoing = (channel, self._syncword(), payload)
+
+		self.framer_status = 1
+		self._raise_packet_flag()
+
+	def _receive_from_air(self, channel, syncword, payload):
+		# Returns 0 if the packet was not received, 1 if it was, or 2 if
+		# it was and an acknowledgement was sent
+		with self._lock:
+			result = self._receive_from_air_locked(channel, syncword, payload)
+
+		# Frames too large for the FIFO are moved along by timers, which
+		# are started without holding up the chip's SPI bus
+		if result != 0 and len(payload) > self.fifo_size:
+			self._advance_later(self.fifo_size - ((self.registers[self._thresholds_register] >> 6) & 0x1f))
+			self._advance_later(len(payload))
+
+		return result
+
+	def _receive_from_air_locked(self, channel, syncword, payload):
+		if not self._is_listening(channel):
+			return 0
+		if syncword != self._syncword():
+			return 0
+		if self.packet_flag or self._streaming_rx is not None:
+			return 0
+
+		self.syncword_rx = True
+		if self._pending_crc_errors != 0:
+			self._pending_crc_errors -= 1
+			self.crc_error = True
+		elif self.crc_error_rate != 0 and self._random.random() < self.crc_error_rate:
+			self.crc_error = True
+
+		self.fifo_read_ptr = 0
+		self.framer_status = 1
+
+		# Frames too large for the FIFO arrive over time
+		if len(payload) > self.fifo_size:
+			self.fifo = bytearray()
+			self._streaming_rx = {
+				'channel': channel,
+				'start': time.perf_counter(),
+				'payload': payload
+			}
+			return self._ack_result()
+
+		self.fifo = bytearray(payload)
+		self.received.append((channel, payload))
+		self._raise_packet_flag()
+
+		return self._ack_result()
+
+	def _ack_result(self):
+		if self._auto_ack() and not self.crc_error:
+			return 2
+		return 1
@@ -0,0 +1,307 @@
+#! /usr/bin/env python3
+
+# Delays used when talking to the radio, and a routine to find the
+# smallest delays which work for a particular radio:
+#
+#     lt8900_spi.timing.calibrate(radio, receiver, path = 'lt8900-timing.json')
+#     ...
+#     radio = lt8900_spi.Radio(0, 0, {
+#         'timing_profile': lt8900_spi.timing.load('lt8900-timing.json')
+#     })
+
+import json
+import time
+
+# All delays are in microseconds
+#   register_write: after each register write (and FIFO read)
+#   fifo_byte:      after writing the FIFO, per byte written
+#   tx_enable:      after enabling the transmitter
+#   format_config:  after writing the packet format configuration
+#   set_channel:    after changing channel with set_channel()
+#   frame_gap:      minimum time between frames in multi_transmit()
+default_profile = {
+	'register_write': 10,
+	'fifo_byte': 10,
+	'tx_enable': 1000,
+	'format_config': 5000,
+	'set_channel': 130,
+	'frame_gap': 650
+}
+
+# Named profiles, usable as the "timing_profile" configuration option
+profiles = {
+	'default': default_profile
+}
+
+def resolve(profile):
+	# Turn a profile name, or a dictionary of delays to override, into
+	# a complete profile
+	if profile is None:
+		profile = 'default'
+
+	if isinstance(profile, str):
+		if profile not in profiles:
+			raise ValueError('Unknown timing profile {}'.format(profile))
+		profile = profiles[profile]
+
+	for key in profile:
+		if key not in default_profile:
+			raise ValueError('Unknown delay {} in timing profile'.format(key))
+
+	result = dict(default_profile)
+	result.update(profile)
+
+	return result
+
+def load(path):
+	with open(path, 'r') as profile_file:
+		return resolve(json.load(profile_file))
+
+def save(profile, path):
+	with open(path, 'w') as profile_file:
+		json.dump(resolve(profile), profile_file, indent = 4, sort_keys = True)
+		profile_file.write('\n')
+
+	return None
+
+def _test_message(trial, length = 8):
+	return [(trial * 31 + index) & 0xff for index in range(length)]
+
+def _drain(receiver):
+	while receiver.get_packet(timeout = 0) is not None:
+		pass
+
+	return None
+
+def _delivered(receiver, messages, timeout = 0.1):
+	# Check that the receiver got each of the messages, in order
+	if receiver is None:
+		return True
+
+	for message in messages:
+		packet = receiver.get_packet(timeout = timeout)
+		if packet is None or list(packet.payload) != message:
+			return False
+
+	return True
+
+def _check_register_write(radio, receiver, channel, trial):
+	# Write the syncword registers back to back, then send a packet
+	# (which writes the radio state and FIFO state registers back to
+	# back too) and check that it arrives, since a register written too
+	# soon after another may read back correctly but not take effect
+	syncword = radio._last_syncword
+	radio.set_syncword(syncword, submit_queue = None, force = True)
+
+	registers = {
+		1: ['syncword_0'],
+		2: ['syncword_3', 'syncword_0'],
+		3: ['syncword_3', 'syncword_2', 'syncword_0'],
+		4: ['syncword_3', 'syncword_2', 'syncword_1', 'syncword_0']
+	}[len(syncword)]
+	for reg, value in zip(registers, syncword):
+		if radio.get_register(reg, cached = False) != value:
+			return False
+
+	message = _test_message(trial)
+	if not radio.transmit(message, channel, submit_queue = None):
+		return False
+
+	return _delivered(receiver, [message])
+
+def _check_fifo_byte(radio, receiver, channel, trial):
+	message = _test_message(trial, 32)
+	if not radio.transmit(message, channel, submit_queue = None):
+		return False
+
+	return _delivered(receiver, [message])
+
+def _check_tx_enable(radio, receiver, channel, trial):
+	message = _test_message(trial)
+	if not radio.transmit(message, channel, submit_queue = None):
+		return False
+
+	return _delivered(receiver, [message])
+
+def _check_format_config(radio, receiver, channel, trial):
+	# Force the packet format configuration to be written again
+	radio._last_format_config = None
+
+	message = _test_message(trial)
+	if not radio.transmit(message, channel, submit_queue = None):
+		return False
+
+	return _delivered(receiver, [message])
+
+def _check_set_channel(radio, receiver, channel, trial):
+	new_channel = (channel + 1 + trial) & 0x7f
+	radio.set_channel(new_channel)
+	if radio.get_register_bits('radio_state', cached = False)['channel'] != new_channel:
+		return False
+
+	message = _test_message(trial)
+	if not radio.transmit(message, channel, submit_queue = None):
+		return False
+
+	return _delivered(receiver, [message])
+
+def _check_frame_gap(radio, receiver, channel, trial):
+	# Two frames separated by the frame gap must both be received
+	message = _test_message(trial)
+	if not radio.multi_transmit(message, [channel], retries = 2, delay = 0, submit_queue = None):
+		return False
+
+	return _delivered(receiver, [message, message])
+
+_checks = {
+	'register_write': _check_register_write,
+	'fifo_byte': _check_fifo_byte,
+	'tx_enable': _check_tx_enable,
+	'format_config': _check_format_config,
+	'set_channel': _check_set_channel,
+	'frame_gap': _check_frame_gap
+}
+
+def _restore(radio, profile):
+	# Put the radio back into a known state using known good delays
+	test_profile = radio._timing
+	radio._timing = profile
+	try:
+		if radio._last_syncword is not None:
+			radio.set_syncword(radio._last_syncword, submit_queue = None, force = True)
+	finally:
+		radio._timing = test_profile
+
+	return None
+
+def _passes(radio, receiver, channel, key, value, trials, profile, safe_profile):
+	# Run the check for "key" with that delay set to "value" and the
+	# others taken from "profile", putting the radio back into a known
+	# state with the delays from "safe_profile" afterwards
+	test_profile = dict(profile)
+	test_profile[key] = value
+	radio._timing = test_profile
+
+	try:
+		for trial in range(trials):
+			if receiver is not None:
+				_drain(receiver)
+
+			try:
+				passed = _checks[key](radio, receiver, channel, trial)
+			except Exception as error_info:
+				radio._error("Timing check failed: {}", error_info.args)
+				passed = False
+
+			if not passed:
+				# Give the radio time to settle, then start over
+				radio._timing = safe_profile
+				time.sleep(0.01)
+				radio._reinitialize()
+				return False
+
+			_restore(radio, safe_profile)
+			radio._timing = test_profile
+	finally:
+		radio._timing = safe_profile
+
+	return True
+
+def _validate(radio, receiver, channel, keys, trials, profile, safe_profile):
+	# Check that the delays in "profile" work together, moving them back
+	# towards those in "safe_profile" until they do.  The delay whose
+	# check failed is moved back first, then all of them
+	profile = dict(profile)
+	while True:
+		failed = None
+		for key in keys:
+			if not _passes(radio, receiver, channel, key, profile[key], trials, profile, safe_profile):
+				failed = key
+				break
+
+		if failed is None:
+			return profile
+
+		if profile[failed] < safe_profile[failed]:
+			backoff = [failed]
+		else:
+			backoff = [key for key in keys if profile[key] < safe_profile[key]]
+			if len(backoff) == 0:
+				raise ValueError('The {} check failed with the delays known to pass on their own'.format(failed))
+
+		for key in backoff:
+			profile[key] += (safe_profile[key] - profile[key] + 1) // 2
+			radio._info("Backed off {} delay to {} microseconds", key, profile[key])
+
+def calibrate(radio, receiver = None, channel = 9, trials = 5, margin = 1.25, max_factor = 64, keys = None, path = None):
+	# Find the smallest value of each delay, in turn, for which "trials"
+	# checks in a row pass, with the delays already found in use.  The
+	# checks read back registers written and check that packets are sent
+	# (and received by "receiver", another Radio, if supplied).  The
+	# frame gap is only calibrated with a receiver.  The checks already
+	# passed are run again with the delays found so far before each
+	# search, and with the whole profile at the end, and the delays are
+	# backed off towards values known to pass until they do.  Nothing
+	# else may use the radios while calibrating.
+	# Returns the new profile, with each delay multiplied by "margin"
+	# (but no more than a delay known to pass), which is also saved to
+	# "path"
+	if radio._last_syncword is None:
+		raise ValueError('Set a syncword before calibrating')
+
+	if keys is None:
+		keys = [key for key in _checks if key != 'frame_gap' or receiver is not None]
+
+	original = dict(radio._timing)
+	result = dict(original)
+
+	# Make sure the packet format configuration has been applied
+	radio._apply_packet_format_config(None)
+
+	if receiver is not None:
+		receiver.start_receiver(channel, wait_time = 0.001)
+
+	# The longest delay known to pass for each key
+	known_good = dict(original)
+
+	try:
+		for index, key in enumerate(keys):
+			low = 0
+			high = original[key]
+
+			# If the current delay does not work, with the others known
+			# to be good, look for one that does (up to "max_factor"
+			# times longer)
+			limit = max(1, original[key]) * max_factor
+			while not _passes(radio, receiver, channel, key, high, trials, known_good, known_good):
+				low = high + 1
+				high = max(1, high * 2)
+				if high > limit:
+					raise ValueError('No {} delay up to {} microseconds passed the checks'.format(key, limit))
+			passed = high
+			known_good[key] = passed
+
+			# The delays already found must also pass this check
+			result[key] = passed
+			result = _validate(radio, receiver, channel, keys[:index + 1], trials, result, known_good)
+
+			while low < high:
+				middle = (low + high) // 2
+				if _passes(radio, receiver, channel, key, middle, trials, result, known_good):
+					high = middle
+				else:
+					low = middle + 1
+
+			result[key] = min(passed, int(high * margin + 0.999))
+			radio._info("Calibrated {} delay to {} microseconds (was {})", key, result[key], original[key])
+
+		result = _validate(radio, receiver, channel, keys, trials, result, known_good)
+	finally:
+		radio._timing = original
+		if receiver is not None:
+			receiver.stop_receiver()
+
+	if path is not None:
+		save(result, path)
+
+	return result
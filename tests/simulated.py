@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+
+# Helpers shared by the tests, which run against the simulated radio
+# from lt8900_spi.simulator
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import lt8900_spi
+from lt8900_spi.simulator import SimulatedAir, SimulatedLT8900
+
+syncword = [0x258B, 0x147A]
+message = [0xB0, 0x51, 0xF0, 0x00, 0x00, 0x01, 212]
+
+def new_radio(air = None, config = None, initialize = True, **chip_args):
+	chip = SimulatedLT8900(air, **chip_args)
+
+	radio_config = {
+		'transport': chip,
+		'reset_command': chip.reset
+	}
+	if config is not None:
+		radio_config.update(config)
+
+	radio = lt8900_spi.Radio(0, 0, radio_config)
+	if initialize:
+		if not radio.initialize():
+			raise RuntimeError('Failed to initialize the simulated radio')
+		radio.set_syncword(syncword, submit_queue = None)
+
+	return radio, chip
+
+def new_pair(sender_config = None, receiver_config = None, **chip_args):
+	# Two radios which can hear each other
+	air = SimulatedAir()
+	sender, sender_chip = new_radio(air, sender_config, **chip_args)
+	receiver, receiver_chip = new_radio(air, receiver_config, **chip_args)
+
+	return sender, sender_chip, receiver, receiver_chip
+
+def wait_until(condition, timeout = 5.0):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			return False
+		time.sleep(0.001)
+
+	return True
@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+
+import asyncio
+import threading
+import unittest
+import warnings
+
+from simulated import lt8900_spi, new_pair, new_radio, message
+
+from lt8900_spi.aio import AsyncPacketReadyEvent, AsyncRadio
+
+class AsyncRadioTests(unittest.TestCase):
+	def test_transmit_and_receive(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+
+		async def run():
+			async_sender = AsyncRadio(sender)
+			async_receiver = AsyncRadio(receiver)
+
+			receive = asyncio.ensure_future(async_receiver.receive(9, wait_time = 0.001))
+			await asyncio.sleep(0.01)
+			self.assertTrue(await async_sender.transmit(message, 9))
+
+			return await asyncio.wait_for(receive, 5)
+
+		self.assertEqual(list(asyncio.run(run())), message)
+
+	def test_receive_uses_background_receiver(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			async def run():
+				async_receiver = AsyncRadio(receiver)
+				self.assertIsNone(await async_receiver.receive(wait = False))
+
+				receive = asyncio.ensure_future(async_receiver.receive(wait_time = 0.01))
+				await asyncio.sleep(0.02)
+				sender.transmit(message, 9)
+				return await asyncio.wait_for(receive, 5)
+
+			self.assertEqual(list(asyncio.run(run())), message)
+			self.assertEqual(receiver.receiver_statistics(), {'received': 1, 'dropped': 0, 'buffered': 0})
+		finally:
+			receiver.stop_receiver()
+
+	def test_transmit_with_background_receiver(self):
+		# The receiver leaves the radio alone while a frame (too large
+		# for the FIFO) is being sent, and then goes back to listening
+		sender, sender_chip, receiver, receiver_chip = new_pair(byte_rate = 2000)
+		frame = list(range(100))
+		sender.start_receiver(9, wait_time = 0.001)
+		try:
+			async def run():
+				async_sender = AsyncRadio(sender)
+				sent = []
+				for index in range(5):
+					sent.append(await async_sender.transmit(frame, 40))
+				for index in range(3):
+					sent.append(await async_sender.multi_transmit(message, [20, 30, 40], retries = 3, delay = 0.01))
+				return sent
+
+			self.assertEqual(asyncio.run(run()), [True] * 8)
+			self.assertEqual(sender_chip.stream_error_count, 0)
+			self.assertEqual([payload[1:] for channel, payload in sender_chip.transmitted[:5]], [bytes(frame)] * 5)
+			self.assertEqual(len(sender_chip.transmitted), 5 + 3 * 9)
+			self.assertEqual(sender.receiver_statistics()['received'], 0)
+
+			receiver.transmit([1, 2, 3], 9)
+			self.assertEqual(list(sender.get_packet(5).payload), [1, 2, 3])
+		finally:
+			sender.stop_receiver()
+
+	def test_multi_transmit(self):
+		radio, chip = new_radio()
+
+		async def run():
+			return await AsyncRadio(radio).multi_transmit(message, [9, 40], retries = 2, delay = 0)
+
+		self.assertTrue(asyncio.run(run()))
+		self.assertEqual([channel for channel, payload in chip.transmitted], [9, 9, 40, 40])
+
+	def test_transmit_while_receiving(self):
+		# A transmit from the receiving radio goes ahead, and the radio
+		# then goes back to listening on the receive channel
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+
+		async def run():
+			async_receiver = AsyncRadio(receiver)
+
+			receive = asyncio.ensure_future(async_receiver.receive(9, wait_time = 0.001))
+			await asyncio.sleep(0.01)
+			self.assertTrue(await async_receiver.transmit(message, 40))
+			await asyncio.sleep(0.01)
+			sender.transmit([1, 2, 3], 9)
+
+			return await asyncio.wait_for(receive, 5)
+
+		self.assertEqual(list(asyncio.run(run())), [1, 2, 3])
+		self.assertEqual(receiver_chip.transmitted, [(40, bytes([len(message)] + message))])
+
+	def test_transmit_from_thread_while_receiving(self):
+		# A transmit made through the Radio itself, from another thread,
+		# also puts the radio back into listening mode afterwards
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+
+		async def run():
+			receive = asyncio.ensure_future(AsyncRadio(receiver).receive(9, wait_time = 0.001))
+			await asyncio.sleep(0.01)
+			await asyncio.get_running_loop().run_in_executor(None, receiver.transmit, message, 40)
+			await asyncio.sleep(0.01)
+			sender.transmit([1, 2, 3], 9)
+
+			return await asyncio.wait_for(receive, 5)
+
+		self.assertEqual(list(asyncio.run(run())), [1, 2, 3])
+
+	def test_radio_held_by_thread(self):
+		# While another thread holds the radio, the event loop keeps
+		# running and the transmit waits for the radio
+		radio, chip = new_radio()
+		held = threading.Event()
+		release = threading.Event()
+
+		def hold():
+			with radio._get_mutex():
+				held.set()
+				release.wait(5)
+
+		thread = threading.Thread(target = hold, daemon = True)
+		thread.start()
+		held.wait(5)
+
+		async def run():
+			transmit = asyncio.ensure_future(AsyncRadio(radio).transmit(message, 9))
+			ticks = 0
+			while ticks < 5:
+				await asyncio.sleep(0.005)
+				ticks += 1
+			self.assertFalse(transmit.done())
+			self.assertEqual(chip.transmitted, [])
+
+			release.set()
+			return await asyncio.wait_for(transmit, 5)
+
+		self.assertTrue(asyncio.run(run()))
+		self.assertEqual(len(chip.transmitted), 1)
+
+	def test_packets(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+
+		async def run():
+			packets = AsyncRadio(receiver).packets(9, wait_time = 0.001)
+			received = []
+			for index in range(3):
+				next_packet = asyncio.ensure_future(packets.__anext__())
+				await asyncio.sleep(0.01)
+				sender.transmit([index], 9)
+				received.append(list(await asyncio.wait_for(next_packet, 5)))
+
+			return received
+
+		self.assertEqual(asyncio.run(run()), [[0], [1], [2]])
+
+	def test_packet_ready_event(self):
+		# Created outside of any loop, it belongs to the loop which
+		# first awaits it
+		event = AsyncPacketReadyEvent()
+		event.set()
+
+		async def run():
+			self.assertTrue(await event.wait_async(0))
+			event.clear()
+			self.assertFalse(await event.wait_async(0.01))
+
+			threading.Timer(0.01, event.set).start()
+			return await event.wait_async(5)
+
+		with warnings.catch_warnings():
+			warnings.simplefilter('error', DeprecationWarning)
+			self.assertTrue(asyncio.run(run()))
+
+	def test_receive_with_packet_ready_event(self):
+		event = AsyncPacketReadyEvent()
+		sender, sender_chip, receiver, receiver_chip = new_pair(receiver_config = {'packet_ready_event': event})
+		receiver_chip.packet_ready_event = event
+
+		async def run():
+			receive = asyncio.ensure_future(AsyncRadio(receiver).receive(9, wait_time = 5))
+			await asyncio.sleep(0.01)
+			sender.transmit(message, 9)
+			return await asyncio.wait_for(receive, 1)
+
+		self.assertEqual(list(asyncio.run(run())), message)
+
+if __name__ == '__main__':
+	unittest.main()
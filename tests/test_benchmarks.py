@@ -0,0 +1,26 @@
+#! /usr/bin/env python3
+
+import importlib.util
+import os
+import unittest
+
+# The benchmarks are a script, not part of the package
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'run.py')
+spec = importlib.util.spec_from_file_location('benchmarks_run', path)
+benchmarks = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmarks)
+
+class BenchmarkTests(unittest.TestCase):
+	def test_spi_usage_within_limits(self):
+		self.assertEqual(benchmarks.check_spi_usage(benchmarks.measure_spi_usage()), [])
+
+	def test_spi_usage_regression(self):
+		usage = benchmarks.measure_spi_usage()
+		usage['transmit']['transactions'] += 100
+		self.assertEqual(len(benchmarks.check_spi_usage(usage)), 1)
+
+	def test_bench_transmit(self):
+		self.assertEqual(benchmarks.bench_transmit(10)['count'], 10)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+from simulated import lt8900_spi, new_pair, new_radio, message, syncword
+
+from lt8900_spi import capture
+
+class CaptureTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, 'radio.cap')
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_capture_tx_and_rx(self):
+		with capture.CaptureWriter(self.path) as writer:
+			sender, sender_chip, receiver, receiver_chip = new_pair({'capture': writer}, {'capture': writer})
+			receiver.start_listening(9)
+			sender.transmit(message, 9)
+			receiver.receive(9)
+
+		records = list(capture.read(self.path))
+		self.assertEqual([record.direction for record in records], ['tx', 'rx'])
+		for record in records:
+			self.assertEqual(record.channel, 9)
+			self.assertEqual(record.syncword, syncword)
+			self.assertEqual(list(record.payload), message)
+			self.assertEqual(record.format_flags, sender._last_format_flags)
+		self.assertLessEqual(records[0].timestamp, records[1].timestamp)
+
+	def test_capture_appends(self):
+		for index in range(2):
+			with capture.CaptureWriter(self.path) as writer:
+				writer.write(capture.direction_queued, None, None, 0, 0, [index])
+
+		records = list(capture.read(self.path))
+		self.assertEqual([list(record.payload) for record in records], [[0], [1]])
+		self.assertEqual([record.channel for record in records], [None, None])
+
+	def test_not_a_capture(self):
+		with open(self.path, 'wb') as capture_file:
+			capture_file.write(b'something else')
+
+		with self.assertRaises(ValueError):
+			list(capture.read(self.path))
+
+	def test_replay(self):
+		with capture.CaptureWriter(self.path) as writer:
+			radio, chip = new_radio(config = {'capture': writer})
+			radio.transmit(message, 9)
+			radio.transmit(message[:3], 40)
+
+		replay_radio, replay_chip = new_radio()
+		self.assertEqual(capture.replay(replay_radio, self.path, speed = None), (2, 0))
+		self.assertEqual(replay_chip.transmitted, chip.transmitted)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+
+from simulated import lt8900_spi, new_radio
+
+class InitImageTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, 'init.json')
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_initialize_writes_image(self):
+		radio, chip = new_radio(initialize = False)
+		transactions = chip.transaction_count
+		self.assertTrue(radio.initialize())
+		for reg, value, delay in radio._get_init_image():
+			if reg not in radio._volatile_registers:
+				self.assertEqual(chip.registers[reg], value)
+
+		# The image is written in one transaction, then the chip ID is
+		# read back
+		self.assertEqual(chip.transaction_count - transactions, 3)
+
+	def test_init_registers(self):
+		radio, chip = new_radio(config = {'init_registers': {'crystal': {'trim_adjust': 3}}})
+		self.assertEqual(radio.get_register_bits('crystal', cached = False)['trim_adjust'], 3)
+
+		with self.assertRaises(ValueError):
+			new_radio(config = {'init_registers': {'no_such_register': {}}}, initialize = False)
+
+	def test_verify_init_image(self):
+		radio, chip = new_radio(config = {'verify_init_image': True})
+		self.assertTrue(radio.initialize())
+
+		# A register which does not take the value written
+		reg = radio._register_numbers['thresholds']
+		chip_write = chip._write
+		def stuck_write(write_reg, data):
+			if write_reg == reg:
+				data = [0, 0]
+			return chip_write(write_reg, data)
+		chip._write = stuck_write
+		self.assertFalse(radio.initialize())
+
+	def test_saved_image(self):
+		radio, chip = new_radio(config = {'init_image': self.path})
+		self.assertTrue(os.path.exists(self.path))
+
+		image = lt8900_spi.init_image.load(self.path)
+		self.assertEqual(image, radio._get_init_image())
+
+		other_radio, other_chip = new_radio(config = {'init_image': self.path})
+		self.assertEqual(other_chip.registers, chip.registers)
+
+	def test_saved_image_is_used(self):
+		# An image saved for the same register values and delays is
+		# written as saved, without being compiled again
+		radio, chip = new_radio(config = {'init_image': self.path})
+		[image, saved_fingerprint, saved_source] = lt8900_spi.init_image.load(self.path, with_fingerprint = True)
+		self.assertEqual(saved_source, lt8900_spi.init_image.source_fingerprint(radio))
+
+		reg = radio._register_numbers['thresholds']
+		tuned = [(image_reg, value ^ 1 if image_reg == reg else value, delay) for image_reg, value, delay in image]
+		lt8900_spi.init_image.save(tuned, self.path, source = saved_source)
+
+		other_radio, other_chip = new_radio(config = {'init_image': self.path})
+		self.assertEqual(other_radio._get_init_image(), tuned)
+		self.assertEqual(other_chip.registers[reg], chip.registers[reg] ^ 1)
+
+	def test_stale_saved_image(self):
+		radio, chip = new_radio(config = {'init_image': self.path})
+		[image, saved_fingerprint, saved_source] = lt8900_spi.init_image.load(self.path, with_fingerprint = True)
+		self.assertEqual(saved_fingerprint, lt8900_spi.init_image.fingerprint(image))
+
+		# Changing a register default or a delay compiles the image again
+		# and saves it over the old one
+		other_radio, other_chip = new_radio(config = {'init_image': self.path, 'init_registers': {'crystal': {'trim_adjust': 3}}})
+		self.assertEqual(other_radio.get_register_bits('crystal', cached = False)['trim_adjust'], 3)
+		self.assertEqual(lt8900_spi.init_image.load(self.path), other_radio._get_init_image())
+
+		other_radio, other_chip = new_radio(config = {'init_image': self.path, 'timing_profile': {'register_write': 20}})
+		self.assertEqual(set(delay for reg, value, delay in lt8900_spi.init_image.load(self.path)), {20, 5000})
+
+	def test_edited_saved_image(self):
+		radio, chip = new_radio(config = {'init_image': self.path})
+		image = lt8900_spi.init_image.load(self.path)
+		edited = [(reg, value ^ 1, delay) for reg, value, delay in image]
+		lt8900_spi.init_image.save(edited, self.path, source = lt8900_spi.init_image.source_fingerprint(radio))
+
+		with open(self.path, 'r') as image_file:
+			data = json.load(image_file)
+		data['fingerprint'] = lt8900_spi.init_image.fingerprint(image)
+		with open(self.path, 'w') as image_file:
+			json.dump(data, image_file)
+
+		other_radio, other_chip = new_radio(config = {'init_image': self.path})
+		self.assertEqual(other_chip.registers, chip.registers)
+		self.assertEqual(lt8900_spi.init_image.load(self.path), image)
+
+	def test_image_without_fingerprint(self):
+		# Images saved before fingerprints were are compiled again
+		radio, chip = new_radio(initialize = False)
+		image = radio._get_init_image()
+		with open(self.path, 'w') as image_file:
+			json.dump({'version': 1, 'registers': [{'register': reg, 'value': value, 'delay': delay} for reg, value, delay in image]}, image_file)
+
+		other_radio, other_chip = new_radio(config = {'init_image': self.path})
+		[saved_image, saved_fingerprint, saved_source] = lt8900_spi.init_image.load(self.path, with_fingerprint = True)
+		self.assertEqual(saved_fingerprint, lt8900_spi.init_image.fingerprint(image))
+		self.assertEqual(saved_source, lt8900_spi.init_image.source_fingerprint(other_radio))
+
+	def test_image_option(self):
+		radio, chip = new_radio(initialize = False)
+		image = radio._get_init_image()
+		image = [(reg, value, 0) for reg, value, delay in image]
+
+		other_radio, other_chip = new_radio(config = {'init_image': image})
+		self.assertEqual(other_radio._get_init_image(), image)
+
+if __name__ == '__main__':
+	unittest.main()
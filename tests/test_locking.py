@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+
+import asyncio
+import threading
+import unittest
+
+from simulated import new_pair, new_radio, message, wait_until
+
+from lt8900_spi.aio import AsyncRadio
+
+class LockingTests(unittest.TestCase):
+	def test_lock_statistics(self):
+		radio, chip = new_radio()
+		before = radio.lock_statistics()
+		radio.transmit(message, 9)
+		after = radio.lock_statistics()
+
+		for name in ['bus', 'radio']:
+			self.assertGreater(after[name]['acquisitions'], before[name]['acquisitions'])
+			self.assertGreaterEqual(after[name]['hold_time'], before[name]['hold_time'])
+
+	def test_caller_mutex(self):
+		# A mutex supplied by the caller is taken along with the bus
+		mutex = threading.Lock()
+		radio, chip = new_radio(config = {'mutex': mutex})
+
+		with mutex:
+			thread = threading.Thread(target = radio.transmit, args = (message, 9), daemon = True)
+			thread.start()
+			self.assertFalse(wait_until(lambda: len(chip.transmitted) != 0, timeout = 0.05))
+
+		thread.join(5)
+		self.assertEqual(len(chip.transmitted), 1)
+		self.assertEqual(radio.lock_statistics()['bus']['contentions'], 1)
+
+	def test_context_manager_mutex(self):
+		# A mutex which is only a context manager is entered instead
+		class Mutex():
+			def __init__(self):
+				self.lock = threading.Lock()
+				self.entered = 0
+
+			def __enter__(self):
+				self.lock.acquire()
+				self.entered += 1
+
+			def __exit__(self, exc_type, exc_value, traceback):
+				self.lock.release()
+
+		mutex = Mutex()
+		radio, chip = new_radio(config = {'mutex': mutex})
+		entered = mutex.entered
+		self.assertGreater(entered, 0)
+
+		with mutex:
+			thread = threading.Thread(target = radio.transmit, args = (message, 9), daemon = True)
+			thread.start()
+			self.assertFalse(wait_until(lambda: len(chip.transmitted) != 0, timeout = 0.05))
+
+		thread.join(5)
+		self.assertEqual(len(chip.transmitted), 1)
+		self.assertGreater(mutex.entered, entered + 1)
+		self.assertEqual(radio.lock_statistics()['bus']['contentions'], 0)
+
+	def test_transmit_while_receive_waits(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		received = []
+		thread = threading.Thread(target = lambda: received.append(receiver.receive(9, wait = True, wait_time = 0.001)), daemon = True)
+		thread.start()
+		self.assertTrue(wait_until(lambda: receiver_chip._is_listening(9)))
+
+		# The waiting receive does not hold the radio, and it goes back
+		# to listening after the transmit
+		self.assertTrue(receiver.transmit(message, 40))
+		self.assertEqual(receiver_chip.transmitted, [(40, bytes([len(message)] + message))])
+		self.assertTrue(wait_until(lambda: receiver_chip._is_listening(9)))
+
+		sender.transmit([1, 2, 3], 9)
+		thread.join(5)
+		self.assertEqual([list(payload) for payload in received], [[1, 2, 3]])
+
+	def test_async_transmit_while_receive_waits(self):
+		# An AsyncRadio lets go of the radio while the frame is being
+		# sent, the waiting receive must not start listening meanwhile
+		sender, sender_chip, receiver, receiver_chip = new_pair(byte_rate = 2000)
+		frame = list(range(100))
+		received = []
+		thread = threading.Thread(target = lambda: received.append(receiver.receive(9, wait = True, wait_time = 0.001)), daemon = True)
+		thread.start()
+		self.assertTrue(wait_until(lambda: receiver_chip._is_listening(9)))
+
+		async def run():
+			async_receiver = AsyncRadio(receiver)
+			return [await async_receiver.transmit(frame, 40) for index in range(5)]
+
+		self.assertEqual(asyncio.run(run()), [True] * 5)
+		self.assertEqual(receiver_chip.stream_error_count, 0)
+		self.assertEqual([payload[1:] for channel, payload in receiver_chip.transmitted], [bytes(frame)] * 5)
+		self.assertTrue(wait_until(lambda: receiver_chip._is_listening(9)))
+
+		sender.transmit([1, 2, 3], 9)
+		thread.join(5)
+		self.assertEqual([list(payload) for payload in received], [[1, 2, 3]])
+
+if __name__ == '__main__':
+	unittest.main()
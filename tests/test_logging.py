@@ -0,0 +1,47 @@
+#! /usr/bin/env python3
+
+import logging
+import unittest
+
+from simulated import lt8900_spi, new_radio, message
+
+class Unformattable():
+	def __format__(self, format_spec):
+		raise AssertionError('A disabled log message was formatted')
+
+class LoggingTests(unittest.TestCase):
+	def test_log_commands(self):
+		debug = []
+		info = []
+		radio, chip = new_radio(config = {'debug_log_command': debug.append, 'info_log_command': info.append})
+		radio.transmit(message, 9)
+		self.assertNotEqual(debug, [])
+		self.assertNotEqual(info, [])
+
+	def test_levels_fall_back(self):
+		messages = []
+		radio, chip = new_radio(config = {'debug_log_command': messages.append})
+		radio._error('an {} message', 'error')
+		self.assertEqual(messages[-1], 'an error message')
+
+	def test_disabled_levels_are_not_formatted(self):
+		radio, chip = new_radio()
+		self.assertFalse(radio._debug_enabled)
+		radio._debug('{}', Unformattable())
+		radio._info('{}', Unformattable())
+		radio._error('{}', Unformattable())
+
+	def test_logger(self):
+		logger = logging.getLogger('lt8900_spi.test')
+		with self.assertLogs(logger, logging.INFO) as logs:
+			radio, chip = new_radio(config = {'logger': logger})
+			radio.transmit(message, 9)
+
+		# Only the levels the logger has enabled are used
+		self.assertFalse(radio._debug_enabled)
+		self.assertNotEqual(logs.output, [])
+		for output in logs.output:
+			self.assertTrue(output.startswith('INFO:'))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,79 @@
+#! /usr/bin/env python3
+
+import threading
+import unittest
+
+from simulated import lt8900_spi, new_radio, message
+
+from lt8900_spi.metrics import Histogram
+
+class MetricsTests(unittest.TestCase):
+	def test_histogram(self):
+		histogram = Histogram([1.0, 2.0])
+		for value in [0.5, 1.0, 1.5, 3.0]:
+			histogram.observe(value)
+
+		self.assertEqual(histogram.snapshot(), {'buckets': [1.0, 2.0], 'counts': [2, 1, 1], 'count': 4, 'sum': 6.0})
+		self.assertEqual(histogram.prometheus('x'), [
+			'x_bucket{le="1.0"} 2',
+			'x_bucket{le="2.0"} 3',
+			'x_bucket{le="+Inf"} 4',
+			'x_sum 6.0',
+			'x_count 4'
+		])
+
+	def test_counters(self):
+		radio, chip = new_radio()
+		transactions = radio.metrics.counters['spi_transactions']
+		chip_transactions = chip.transaction_count
+		radio.transmit(message, 9)
+
+		snapshot = radio.metrics.snapshot()
+		self.assertEqual(snapshot['counters']['packets_sent'], 1)
+		self.assertEqual(snapshot['counters']['spi_transactions'] - transactions, chip.transaction_count - chip_transactions)
+		self.assertEqual(snapshot['tx_latency']['count'], 1)
+		self.assertIn('7:radio_state', snapshot['spi_transfers'])
+		self.assertIn('bus', snapshot['locks'])
+
+	def test_prometheus(self):
+		radio, chip = new_radio()
+		radio.transmit(message, 9)
+		text = radio.metrics.prometheus(labels = {'radio': 'kitchen'})
+
+		self.assertIn('lt8900_packets_sent_total{radio="kitchen"} 1\n', text)
+		self.assertIn('# TYPE lt8900_tx_latency_seconds histogram\n', text)
+		self.assertIn('lt8900_spi_transfers_total{radio="kitchen",register="radio_state"}', text)
+
+	def test_prometheus_label_escaping(self):
+		radio, chip = new_radio()
+		radio.metrics.queue_depth_changed('a "b"\\c\nd', 2)
+		text = radio.metrics.prometheus(labels = {'radio': 'back\\slash'})
+
+		self.assertIn('lt8900_queue_depth{radio="back\\\\slash",queue="a \\"b\\"\\\\c\\nd"} 2\n', text)
+
+	def test_prometheus_while_queues_change(self):
+		# Queues appearing while exporting must not break the export
+		radio, chip = new_radio()
+		metrics = radio.metrics
+
+		def add_queues():
+			for index in range(2000):
+				metrics.queue_depth_changed('queue{}'.format(index), index)
+				metrics.queue_item_waited('queue{}'.format(index), 0.001)
+
+		thread = threading.Thread(target = add_queues, daemon = True)
+		thread.start()
+		while thread.is_alive():
+			metrics.prometheus()
+			metrics.snapshot()
+		thread.join()
+
+		self.assertEqual(len(metrics.snapshot()['queue_wait']), 2000)
+
+	def test_disabled(self):
+		radio, chip = new_radio(config = {'metrics': False})
+		self.assertIsNone(radio.metrics)
+		self.assertTrue(radio.transmit(message, 9))
+
+if __name__ == '__main__':
+	unittest.main()
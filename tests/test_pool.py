@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from simulated import SimulatedAir, new_radio, message, wait_until
+
+from lt8900_spi.pool import RadioPool
+
+class PoolTests(unittest.TestCase):
+	def test_transmit(self):
+		radios = [new_radio() for index in range(2)]
+		with RadioPool([radio for radio, chip in radios]) as pool:
+			for index in range(4):
+				self.assertTrue(pool.transmit(message, 9))
+
+			self.assertTrue(pool.transmit(message, 40, radio = 1))
+
+		self.assertEqual(sum(len(chip.transmitted) for radio, chip in radios), 5)
+		self.assertEqual(radios[1][1].transmitted[-1][0], 40)
+
+	def test_multi_transmit_splits_channels(self):
+		radios = [new_radio() for index in range(2)]
+		with RadioPool([radio for radio, chip in radios]) as pool:
+			self.assertTrue(pool.multi_transmit(message, [9, 40, 71, 102], retries = 2, delay = 0))
+
+		channels = sorted(channel for radio, chip in radios for channel, payload in chip.transmitted)
+		self.assertEqual(channels, [9, 9, 40, 40, 71, 71, 102, 102])
+		for radio, chip in radios:
+			self.assertNotEqual(len(chip.transmitted), 0)
+
+	def test_receiver(self):
+		air = SimulatedAir()
+		sender, sender_chip = new_radio(air)
+		radios = [new_radio(air) for index in range(2)]
+		seen = []
+		with RadioPool([radio for radio, chip in radios]) as pool:
+			pool.start_receiver([9, 40], callback = seen.append, wait_time = 0.001)
+			sender.transmit([1], 9)
+			sender.transmit([2], 40)
+			self.assertTrue(wait_until(lambda: len(seen) == 2))
+
+			packets = list(pool.received_packets(timeout = 0))
+			self.assertEqual(sorted((packet.radio, packet.channel, list(packet.payload)) for packet in packets), [(0, 9, [1]), (1, 40, [2])])
+			self.assertEqual(pool.receiver_statistics(), {'received': 2, 'dropped': 0, 'buffered': 0})
+
+			# The radios only pass their packets on to the pool
+			for radio, chip in radios:
+				self.assertEqual(radio.receiver_statistics(), {'received': 1, 'dropped': 0, 'buffered': 0})
+				with self.assertRaises(ValueError):
+					radio.get_packet(0)
+
+	def test_empty_pool(self):
+		with self.assertRaises(ValueError):
+			RadioPool([])
+
+if __name__ == '__main__':
+	unittest.main()
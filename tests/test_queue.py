@@ -0,0 +1,118 @@
+#! /usr/bin/env python3
+
+import time
+import unittest
+
+from simulated import new_radio, message, syncword, wait_until
+
+class QueueTests(unittest.TestCase):
+	def setUp(self):
+		self.radios = []
+
+	def tearDown(self):
+		for radio in self.radios:
+			radio.configure({'use_software_tx_queue': False})
+
+	def new_queue_radio(self, config = None, **chip_args):
+		queue_config = {'use_software_tx_queue': True}
+		if config is not None:
+			queue_config.update(config)
+		radio, chip = new_radio(config = queue_config, **chip_args)
+		self.radios.append(radio)
+
+		return radio, chip
+
+	def test_order_within_queue(self):
+		radio, chip = self.new_queue_radio()
+		for index in range(10):
+			radio.transmit([1, index], 9, submit_queue = 'a')
+			radio.transmit([2, index], 40, submit_queue = 'b')
+
+		self.assertTrue(wait_until(lambda: len(chip.transmitted) == 20))
+		for queue in [1, 2]:
+			sent = [payload[2] for channel, payload in chip.transmitted if payload[1] == queue]
+			self.assertEqual(sent, list(range(10)))
+
+	def test_post_delay(self):
+		radio, chip = self.new_queue_radio()
+		start = time.monotonic()
+		radio.transmit(message, 9, post_delay = 0.05, submit_queue = 'a')
+		radio.transmit(message, 9, submit_queue = 'a')
+
+		self.assertTrue(wait_until(lambda: len(chip.transmitted) == 2))
+		self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+	def test_reordering_avoids_switches(self):
+		radio, chip = self.new_queue_radio()
+		other_syncword = [0x1234, 0x5678]
+
+		# The first item is taken by the dequeue thread, which then
+		# waits for the radio while the rest are added, so that they
+		# are all sent in the next run
+		with radio._get_mutex():
+			radio.transmit([0, 0], 9, syncword = syncword, submit_queue = 'first')
+			self.assertTrue(wait_until(lambda: len(radio._software_tx_queue['first']) == 0))
+
+			radio.transmit([1, 0], 9, syncword = syncword, submit_queue = 'a')
+			radio.transmit([1, 1], 9, syncword = other_syncword, submit_queue = 'a')
+			radio.transmit([2, 0], 9, syncword = syncword, submit_queue = 'b')
+
+		self.assertTrue(wait_until(lambda: len(chip.transmitted) == 4))
+
+		# Queue "b" goes before the change of syncword for queue "a"
+		self.assertEqual([list(payload[1:]) for channel, payload in chip.transmitted], [[0, 0], [1, 0], [2, 0], [1, 1]])
+		statistics = radio.queue_statistics()
+		self.assertEqual(statistics['syncword_switches'], 1)
+		self.assertEqual(statistics['syncword_switches_avoided'], 1)
+
+	def test_priority_preempts_bulk(self):
+		radio, chip = self.new_queue_radio({'queue_config': {'urgent': {'priority': 10}}}, latency = 0.001)
+		for index in range(100):
+			radio.transmit(message, 9, submit_queue = 'bulk')
+
+		self.assertTrue(wait_until(lambda: len(chip.transmitted) >= 5))
+		radio.transmit([0xee], 40, submit_queue = 'urgent')
+
+		self.assertTrue(wait_until(lambda: (40, bytes([1, 0xee])) in chip.transmitted))
+		self.assertLess(chip.transmitted.index((40, bytes([1, 0xee]))), 50)
+		self.assertEqual(radio.queue_statistics()['preemptions'], 1)
+
+		self.assertTrue(wait_until(lambda: len(chip.transmitted) == 101))
+
+	def test_rate_limit(self):
+		radio, chip = self.new_queue_radio({'queue_config': {'slow': {'rate': 100, 'burst': 2}}})
+		start = time.monotonic()
+		for index in range(6):
+			radio.transmit(message, 9, submit_queue = 'slow')
+
+		self.assertTrue(wait_until(lambda: len(chip.transmitted) == 6))
+
+		# Two are sent straight away, then one every 10 milliseconds
+		self.assertGreaterEqual(time.monotonic() - start, 0.035)
+		self.assertGreater(radio.queue_statistics()['rate_limited'], 0)
+
+	def test_deadline(self):
+		radio, chip = self.new_queue_radio()
+		radio.configure_queue('stale', {'deadline': 0.005, 'rate': 50})
+		for index in range(5):
+			radio.transmit(message, 9, submit_queue = 'stale')
+
+		self.assertTrue(wait_until(lambda: radio.queue_statistics()['deadline_drops'] == 4))
+		self.assertEqual(len(chip.transmitted), 1)
+		self.assertEqual(radio.metrics.counters['queue_deadline_drops'], 4)
+
+	def test_unknown_queue_setting(self):
+		radio, chip = self.new_queue_radio()
+		with self.assertRaises(ValueError):
+			radio.configure_queue('a', {'no_such_setting': 1})
+		with self.assertRaises(ValueError):
+			radio.configure_queue('a', {'rate': 0})
+		with self.assertRaises(ValueError):
+			radio.configure_queue('a', {'rate': 10, 'burst': 0})
+		with self.assertRaises(ValueError):
+			radio.configure_queue('a', {'airtime': 0.5, 'airtime_burst': -0.01})
+		with self.assertRaises(ValueError):
+			new_radio(config = {'queue_config': {'a': {'burst': 0.5}}}, initialize = False)
+
+if __name__ == '__main__':
+	unittest.main()
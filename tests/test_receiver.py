@@ -0,0 +1,221 @@
+#! /usr/bin/env python3
+
+import threading
+import time
+import unittest
+
+from simulated import SimulatedAir, SimulatedLT8900, lt8900_spi, new_pair, new_radio, message, wait_until
+
+class ReceiverTests(unittest.TestCase):
+	def test_background_receiver(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		seen = []
+		receiver.start_receiver(9, callback = seen.append, wait_time = 0.001)
+		try:
+			for index in range(5):
+				sender.transmit([index], 9)
+				self.assertTrue(wait_until(lambda: len(seen) == index + 1))
+
+			packets = list(receiver.received_packets(timeout = 0))
+			self.assertEqual([list(packet.payload) for packet in packets], [[index] for index in range(5)])
+			self.assertEqual([packet.channel for packet in packets], [9] * 5)
+			self.assertEqual(seen, packets)
+			self.assertEqual(receiver.receiver_statistics(), {'received': 5, 'dropped': 0, 'buffered': 0})
+		finally:
+			receiver.stop_receiver()
+
+		self.assertIsNone(receiver.receiver_statistics())
+
+	def test_ring_buffer_drops_oldest(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, buffer_size = 2, wait_time = 0.001)
+		try:
+			for index in range(4):
+				sender.transmit([index], 9)
+				self.assertTrue(wait_until(lambda: receiver.receiver_statistics()['received'] == index + 1))
+
+			self.assertEqual(receiver.receiver_statistics()['dropped'], 2)
+			self.assertEqual(list(receiver.get_packet(0).payload), [2])
+			self.assertEqual(list(receiver.get_packet(0).payload), [3])
+			self.assertIsNone(receiver.get_packet(0))
+		finally:
+			receiver.stop_receiver()
+
+	def test_callback_only_receiver(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		seen = []
+		receiver.start_receiver(9, buffer_size = 0, callback = seen.append, wait_time = 0.001)
+		try:
+			for index in range(3):
+				sender.transmit([index], 9)
+				self.assertTrue(wait_until(lambda: len(seen) == index + 1))
+
+			self.assertEqual([list(packet.payload) for packet in seen], [[0], [1], [2]])
+			self.assertEqual(receiver.receiver_statistics(), {'received': 3, 'dropped': 0, 'buffered': 0})
+			with self.assertRaises(ValueError):
+				receiver.get_packet(0)
+		finally:
+			receiver.stop_receiver()
+
+	def test_receive_uses_background_receiver(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			sender.transmit(message, 9)
+			self.assertEqual(list(receiver.receive(wait = True)), message)
+		finally:
+			receiver.stop_receiver()
+
+	def test_transmit_resumes_listening(self):
+		# A transmit from the receiving radio puts it back into
+		# listening mode afterwards
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			receiver.transmit(message, 40)
+			sender.transmit(message, 9)
+			self.assertIsNotNone(receiver.get_packet(timeout = 5))
+		finally:
+			receiver.stop_receiver()
+
+	def test_transmit_keeps_receiver_format(self):
+		# A receiver for fixed length packets goes back to receiving
+		# them after a (length encoded) transmit
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, length = 3, wait_time = 0.001)
+		try:
+			self.assertEqual(receiver._last_format_config['packet_length_encoded'], 0)
+			receiver.transmit(message, 40)
+			self.assertEqual(receiver._last_format_config['packet_length_encoded'], 0)
+
+			sender.transmit([1, 2, 3], 9, format_config = {'packet_length_encoded': 0})
+			self.assertEqual(list(receiver.get_packet(timeout = 5).payload), [1, 2, 3])
+		finally:
+			receiver.stop_receiver()
+
+	def test_receiver_survives_first_poll_error(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		errors = []
+		receiver.configure({'error_log_command': errors.append})
+
+		# Fail the first transfer made by the receiver's thread
+		main_thread = threading.current_thread()
+		xfer = receiver_chip.xfer
+		failed = []
+		def failing_xfer(data, delay = 0):
+			if threading.current_thread() is not main_thread and len(failed) == 0:
+				failed.append(data)
+				raise OSError('Simulated SPI failure')
+			return xfer(data, delay)
+		receiver_chip.xfer = failing_xfer
+
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			self.assertTrue(wait_until(lambda: len(errors) != 0))
+			sender.transmit(message, 9)
+			self.assertEqual(list(receiver.get_packet(timeout = 5).payload), message)
+		finally:
+			receiver.stop_receiver()
+
+		self.assertEqual(len(errors), 1)
+
+	def test_fake_packet_ready_event(self):
+		event = lt8900_spi.FakePacketReadyEvent()
+		self.assertFalse(event.wait(0))
+		event.set()
+		self.assertTrue(event.wait(0))
+		event.clear()
+		self.assertFalse(event.wait(0))
+
+		# With a delay it fires by itself after being cleared
+		event = lt8900_spi.FakePacketReadyEvent(0.01)
+		event.clear()
+		self.assertTrue(event.wait(1))
+
+	def test_wait_on_packet_ready_event(self):
+		# The simulated radio sets the event when PKT_FLAG is raised
+		event = lt8900_spi.PacketReadyEvent()
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver_chip.packet_ready_event = event
+		receiver.configure({'packet_ready_event': event, 'packet_ready_timeout': 0.5})
+		receiver.start_receiver(9)
+		try:
+			start = time.monotonic()
+			sender.transmit(message, 9)
+			self.assertIsNotNone(receiver.get_packet(timeout = 5))
+			self.assertLess(time.monotonic() - start, 0.25)
+		finally:
+			receiver.stop_receiver()
+
+	def _receive_large_frame(self, receiver_config = None, background = False, supply_length = True, byte_rate = 10000.0, attempts = 1):
+		# 200 bytes is far more than the 64 byte FIFO holds, so the
+		# receiver must drain the FIFO while the frame is arriving.  The
+		# frame is put on the air directly, as if sent by another device,
+		# since a second radio busy in this process would hold up the
+		# receiver
+		air = SimulatedAir()
+		receiver, receiver_chip = new_radio(air, receiver_config, byte_rate = byte_rate)
+		if receiver_config is not None and 'packet_ready_event' in receiver_config:
+			receiver_chip.packet_ready_event = receiver_config['packet_ready_event']
+
+		# The frame is length encoded.  If its length is supplied, the
+		# length byte is received as part of it
+		large_message = bytes(index & 0xff for index in range(200))
+		frame = bytes([len(large_message)]) + large_message
+		if supply_length:
+			length = len(frame)
+			expected = frame
+		else:
+			length = None
+			expected = large_message
+		received = []
+
+		if background:
+			receiver.start_receiver(9, callback = received.append, length = length)
+		else:
+			thread = threading.Thread(target = lambda: received.append(receiver.receive(9, wait = True, length = length)), daemon = True)
+			thread.start()
+
+		try:
+			# Let the receiver start listening
+			time.sleep(0.05)
+
+			# At full speed the FIFO fills in half a millisecond, and a
+			# busy machine may not run the receiving thread that often,
+			# so the frame may be sent again if it was lost
+			for attempt in range(attempts):
+				self.assertTrue(wait_until(lambda: receiver_chip._is_listening(9) and receiver_chip._streaming_rx is None and not receiver_chip.crc_error))
+				self.assertEqual(air.transmit(SimulatedLT8900(), 9, receiver_chip._syncword(), frame), 1)
+				if not wait_until(lambda: len(received) != 0 or receiver_chip.stream_error_count > attempt):
+					break
+				if len(received) != 0:
+					break
+				time.sleep(0.01)
+		finally:
+			if background:
+				receiver.stop_receiver()
+
+		if background:
+			received = [packet.payload for packet in received]
+
+		self.assertEqual(len(received), 1, receiver_chip.stream_error_count)
+		self.assertLess(receiver_chip.stream_error_count, attempts)
+		self.assertEqual(bytes(received[0]), expected)
+
+	def test_receive_large_frame(self):
+		self._receive_large_frame()
+
+	def test_receiver_large_frame(self):
+		self._receive_large_frame(background = True)
+
+	def test_receive_large_frame_with_event(self):
+		self._receive_large_frame({'packet_ready_event': lt8900_spi.PacketReadyEvent(), 'packet_ready_timeout': 0.5})
+
+	def test_receive_large_frame_without_length(self):
+		self._receive_large_frame({'max_frame_length': 256}, supply_length = False, byte_rate = 125000.0, attempts = 5)
+
+	def test_receiver_large_frame_without_length(self):
+		self._receive_large_frame({'max_frame_length': 256}, background = True, supply_length = False, byte_rate = 125000.0, attempts = 5)
+
+if __name__ == '__main__':
+	unittest.main()
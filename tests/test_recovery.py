@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from simulated import new_pair, new_radio, message
+
+class RecoveryTests(unittest.TestCase):
+	def test_repair_corrupted_register(self):
+		radio, chip = new_radio()
+		reg = radio._register_numbers['thresholds']
+		expected = chip.registers[reg]
+		chip.registers[reg] = expected ^ 0x0101
+
+		self.assertTrue(radio._recover('a test'))
+		self.assertEqual(chip.registers[reg], expected)
+		self.assertEqual(radio.metrics.counters['registers_repaired'], 1)
+		self.assertEqual(radio.metrics.counters['reinitializations'], 0)
+		self.assertEqual(radio.metrics.recovery_latency['repair_registers'].count, 1)
+		self.assertEqual(radio.metrics.recovery_latency['reset_state'].count, 1)
+
+	def test_repair_register_read_since_corrupted(self):
+		# Reading the corrupted register updates the register shadow,
+		# but the value the driver wrote is still restored
+		radio, chip = new_radio()
+		reg = radio._register_numbers['thresholds']
+		expected = chip.registers[reg]
+		chip.registers[reg] = expected ^ 0x0101
+		self.assertEqual(radio.get_register(reg, cached = False), expected ^ 0x0101)
+
+		self.assertTrue(radio._recover('a test'))
+		self.assertEqual(chip.registers[reg], expected)
+		self.assertEqual(radio.metrics.counters['registers_repaired'], 1)
+
+	def test_nothing_to_repair(self):
+		radio, chip = new_radio()
+		self.assertTrue(radio._recover('a test'))
+		self.assertEqual(radio.metrics.counters['registers_repaired'], 0)
+		self.assertTrue(radio.transmit(message, 9))
+
+	def test_reinitialize_on_wrong_chip_id(self):
+		radio, chip = new_radio()
+		chip.registers[0] = 0
+
+		self.assertFalse(radio._recover('a test'))
+		self.assertEqual(radio.metrics.counters['reinitializations'], 1)
+		self.assertEqual(chip.registers[0], chip.chip_id[0])
+
+		# The syncword is set again after reinitializing
+		self.assertEqual(chip._syncword(), (radio._last_syncword[0], radio._last_syncword[1]))
+
+	def test_crc_errors_trigger_recovery(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_listening(9)
+
+		# As if the last 30 polls had all seen CRC errors
+		state = {'crc_error_count': 30}
+		receiver_chip.inject_crc_error()
+		sender.transmit(message, 9)
+		self.assertIsNone(receiver._receive_poll(9, None, state))
+
+		self.assertEqual(state['crc_error_count'], 0)
+		self.assertEqual(receiver.metrics.counters['crc_error_resets'], 1)
+		self.assertEqual(receiver.metrics.recovery_latency['repair_registers'].count, 1)
+
+		# The radio is listening again afterwards
+		sender.transmit(message, 9)
+		self.assertEqual(list(receiver.receive(9)), message)
+
+if __name__ == '__main__':
+	unittest.main()
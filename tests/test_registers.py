@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from simulated import lt8900_spi, new_radio
+
+class RegisterTests(unittest.TestCase):
+	def test_initialize_checks_chip_id(self):
+		radio, chip = new_radio(initialize = False)
+		self.assertTrue(radio.initialize())
+
+		chip.chip_id = (0x1234, 0x5678)
+		self.assertFalse(radio.initialize())
+
+	def test_register_bits_round_trip(self):
+		radio, chip = new_radio()
+		radio.put_register_bits('radio_state', {'tx_enabled': 0, 'rx_enabled': 1, 'channel': 42})
+
+		state = radio.get_register_bits('radio_state', cached = False)
+		self.assertEqual(state['rx_enabled'], 1)
+		self.assertEqual(state['channel'], 42)
+		self.assertEqual(chip.registers[radio._register_numbers['radio_state']], (1 << 7) | 42)
+
+	def test_batch_is_one_transaction(self):
+		radio, chip = new_radio()
+		transactions = chip.transaction_count
+		with radio.batch():
+			radio.put_register('syncword_0', 0x1111)
+			radio.put_register('syncword_1', 0x2222)
+			radio.put_register('syncword_2', 0x3333)
+			self.assertEqual(chip.transaction_count, transactions)
+
+		self.assertEqual(chip.transaction_count, transactions + 1)
+		self.assertEqual(radio.get_register('syncword_1', cached = False), 0x2222)
+
+	def test_register_cache(self):
+		radio, chip = new_radio(config = {'use_register_cache': True})
+		radio.put_register('syncword_2', 0xabcd)
+
+		transactions = chip.transaction_count
+		self.assertEqual(radio.get_register('syncword_2'), 0xabcd)
+		self.assertEqual(chip.transaction_count, transactions)
+
+		# Volatile registers are always read from the radio
+		radio.get_register('status')
+		self.assertEqual(chip.transaction_count, transactions + 1)
+
+	def test_verify_register_cache(self):
+		radio, chip = new_radio()
+		radio.put_register('syncword_2', 0xabcd)
+		self.assertEqual(radio.verify_register_cache(['syncword_2']), {})
+
+		chip.registers[radio._register_numbers['syncword_2']] = 0x1234
+		self.assertEqual(radio.verify_register_cache(['syncword_2']), {'syncword_2': (0xabcd, 0x1234)})
+
+	def test_unknown_register(self):
+		radio, chip = new_radio(initialize = False)
+		with self.assertRaises(NameError):
+			radio.get_register('no_such_register')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from simulated import new_pair, new_radio, message
+
+class ScanTests(unittest.TestCase):
+	def new_scan_radio(self, **chip_args):
+		radio, chip = new_radio(**chip_args)
+		for channel in range(128):
+			chip.set_channel_rssi(channel, (channel * 7) % 64)
+
+		# Record the (first channel, channel count) of each sweep
+		sweeps = []
+		chip_scan_rssi = chip._scan_rssi
+		def scan_rssi():
+			sweeps.append((
+				(chip.registers[chip._scan_rssi_state_register] >> 8) & 0x7f,
+				((chip.registers[chip._scan_rssi_register] >> 10) & 0x3f) + 1
+			))
+			return chip_scan_rssi()
+		chip._scan_rssi = scan_rssi
+
+		return radio, chip, sweeps
+
+	def test_hardware_scan(self):
+		radio, chip, sweeps = self.new_scan_radio()
+		channels = [40, 3, 9]
+		rssi = radio.scan_channels(channels)
+		self.assertEqual(list(rssi), [chip.channel_rssi[channel] for channel in channels])
+		self.assertEqual(sweeps, [(3, 38)])
+
+	def test_hardware_scan_passes(self):
+		# At most 64 channels are swept at a time
+		radio, chip, sweeps = self.new_scan_radio()
+		channels = list(range(0, 128, 2))
+		rssi = radio.scan_channels(reversed(channels))
+		self.assertEqual(list(rssi), [chip.channel_rssi[channel] for channel in reversed(channels)])
+		self.assertEqual(sweeps, [(0, 63), (64, 63)])
+
+	def test_raw_rssi(self):
+		radio, chip, sweeps = self.new_scan_radio()
+		channels = [70, 5]
+		self.assertEqual(list(radio.scan_channels(channels, hardware = False)), [chip.channel_rssi[channel] for channel in channels])
+
+		radio.configure({'hardware_rssi_scan': False})
+		self.assertEqual(list(radio.scan_channels(channels)), [chip.channel_rssi[channel] for channel in channels])
+		self.assertEqual(sweeps, [])
+
+	def test_raw_rssi_fallback(self):
+		# A sweep which never completes falls back to reading raw_rssi
+		radio, chip, sweeps = self.new_scan_radio()
+		errors = []
+		radio.configure({'error_log_command': errors.append})
+		chip._scan_rssi = lambda: None
+
+		channels = [70, 5]
+		self.assertEqual(list(radio.scan_channels(channels)), [chip.channel_rssi[channel] for channel in channels])
+		self.assertEqual(len(errors), 1)
+
+	def test_scan_registers_restored(self):
+		radio, chip, sweeps = self.new_scan_radio()
+		registers = [chip._scan_rssi_register, chip._scan_rssi_state_register]
+		expected = [chip.registers[reg] for reg in registers]
+
+		radio.scan_channels(range(80))
+		self.assertEqual([chip.registers[reg] for reg in registers], expected)
+
+		chip._scan_rssi = lambda: None
+		radio.scan_channels(range(80))
+		self.assertEqual([chip.registers[reg] for reg in registers], expected)
+
+	def test_quietest_channels(self):
+		radio, chip, sweeps = self.new_scan_radio()
+		for channel in range(10):
+			chip.set_channel_rssi(channel, 10 - channel)
+
+		self.assertEqual(radio.quietest_channels(range(10), 3, samples = 2), [9, 8, 7])
+		self.assertEqual(len(sweeps), 2)
+
+	def test_receiver_resumes_after_scan(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			receiver.scan_channels(range(10))
+			sender.transmit(message, 9)
+			packet = receiver.get_packet(timeout = 5)
+			self.assertIsNotNone(packet)
+			self.assertEqual(list(packet.payload), message)
+		finally:
+			receiver.stop_receiver()
+
+if __name__ == '__main__':
+	unittest.main()
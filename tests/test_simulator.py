@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from simulated import SimulatedAir, new_radio, message, syncword
+
+class SimulatorTests(unittest.TestCase):
+	def test_transport_is_used(self):
+		radio, chip = new_radio(initialize = False)
+		self.assertEqual(chip.settings['max_speed_hz'], 4000000)
+
+		transfers = chip.transfer_count
+		self.assertTrue(radio.initialize())
+		self.assertGreater(chip.transfer_count, transfers)
+
+	def test_lossy_air(self):
+		air = SimulatedAir(loss_rate = 1.0)
+		sender, sender_chip = new_radio(air)
+		receiver, receiver_chip = new_radio(air)
+		receiver.start_listening(9)
+
+		self.assertTrue(sender.transmit(message, 9))
+		self.assertEqual(receiver_chip.received, [])
+		self.assertIsNone(receiver.receive(9))
+
+	def test_syncword_must_match(self):
+		air = SimulatedAir()
+		sender, sender_chip = new_radio(air)
+		receiver, receiver_chip = new_radio(air)
+		receiver.set_syncword([0x1234, 0x5678], submit_queue = None)
+		receiver.start_listening(9)
+
+		self.assertTrue(sender.transmit(message, 9))
+		self.assertIsNone(receiver.receive(9))
+
+		receiver.set_syncword(syncword, submit_queue = None)
+		receiver.start_listening(9)
+		self.assertTrue(sender.transmit(message, 9))
+		self.assertEqual(list(receiver.receive(9)), message)
+
+	def test_crc_error(self):
+		air = SimulatedAir()
+		sender, sender_chip = new_radio(air)
+		receiver, receiver_chip = new_radio(air)
+		receiver.start_listening(9)
+
+		receiver_chip.inject_crc_error()
+		sender.transmit(message, 9)
+		self.assertTrue(receiver.get_register_bits('status')['crc_error'])
+
+if __name__ == '__main__':
+	unittest.main()
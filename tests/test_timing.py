@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+from simulated import lt8900_spi, new_pair, new_radio, message
+
+from lt8900_spi import timing
+
+class TimingTests(unittest.TestCase):
+	def test_resolve(self):
+		self.assertEqual(timing.resolve(None), timing.default_profile)
+		self.assertEqual(timing.resolve({'tx_enable': 5})['tx_enable'], 5)
+		self.assertEqual(timing.resolve({'tx_enable': 5})['fifo_byte'], timing.default_profile['fifo_byte'])
+
+		with self.assertRaises(ValueError):
+			timing.resolve('no_such_profile')
+		with self.assertRaises(ValueError):
+			timing.resolve({'no_such_delay': 5})
+
+	def test_save_and_load(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'timing.json')
+			timing.save({'tx_enable': 5}, path)
+			self.assertEqual(timing.load(path), timing.resolve({'tx_enable': 5}))
+
+	def test_profile_is_used(self):
+		radio, chip = new_radio(config = {'timing_profile': {'set_channel': 777}})
+		requested = []
+		chip_transfer = chip._transfer
+		def transfer(data, delay):
+			requested.append((data[0], delay))
+			return chip_transfer(data, delay)
+		chip._transfer = transfer
+
+		radio.set_channel(9)
+		self.assertIn((radio._register_numbers['radio_state'], 777), requested)
+
+	def test_fifo_read_delay(self):
+		radio, chip = new_radio(config = {'timing_profile': {'register_write': 777}})
+		requested = []
+		chip_transfer = chip._transfer
+		def transfer(data, delay):
+			requested.append((data[0], delay))
+			return chip_transfer(data, delay)
+		chip._transfer = transfer
+
+		radio._read_fifo(4)
+		self.assertEqual(requested, [(0x80 | radio._register_numbers['fifo'], 777)])
+
+	def test_calibrate(self):
+		# The radio state register needs time to settle after being
+		# written, which only shows up once the delays are shortened
+		# together
+		sender, sender_chip, receiver, receiver_chip = new_pair(settling_times = {'radio_state': 8})
+		profile = timing.calibrate(sender, receiver, trials = 10)
+		self.assertEqual(sorted(profile), sorted(timing.default_profile))
+
+		sender.configure({'timing_profile': profile})
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			for index in range(20):
+				self.assertTrue(sender.transmit([index], 9, submit_queue = None))
+				packet = receiver.get_packet(timeout = 1)
+				self.assertIsNotNone(packet)
+				self.assertEqual(list(packet.payload), [index])
+		finally:
+			receiver.stop_receiver()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from simulated import lt8900_spi, new_pair, new_radio, message
+
+class TransmitTests(unittest.TestCase):
+	def test_transmit_and_receive(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_listening(9)
+
+		self.assertTrue(sender.transmit(message, 9))
+		self.assertEqual(sender_chip.transmitted, [(9, bytes([len(message)] + message))])
+		self.assertEqual(list(receiver.receive()), message)
+
+		# Nothing else has arrived
+		self.assertIsNone(receiver.receive(9))
+
+	def test_receive_into(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_listening(9)
+		sender.transmit(message, 9)
+
+		# A message too large for the buffer is dropped
+		with self.assertRaises(ValueError):
+			receiver.receive(into = bytearray(len(message) - 1))
+		self.assertIsNone(receiver.receive())
+
+		sender.transmit(message, 9)
+		buffer = bytearray(16)
+		self.assertEqual(receiver.receive(into = buffer), len(message))
+		self.assertEqual(list(buffer[:len(message)]), message)
+
+	def test_receive_into_from_receiver(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		receiver.start_receiver(9, wait_time = 0.001)
+		try:
+			sender.transmit(message, 9)
+			buffer = bytearray(16)
+			self.assertEqual(receiver.receive(wait = True, into = buffer), len(message))
+			self.assertEqual(list(buffer[:len(message)]), message)
+		finally:
+			receiver.stop_receiver()
+
+	def test_buffer_payloads(self):
+		radio, chip = new_radio()
+		for payload in [bytes(message), bytearray(message), memoryview(bytes(message))]:
+			self.assertTrue(radio.transmit(payload, 9))
+			self.assertEqual(chip.transmitted[-1], (9, bytes([len(message)] + message)))
+
+	def test_multi_transmit_burst(self):
+		radio, chip = new_radio()
+		self.assertTrue(radio.multi_transmit(message, [9, 40], retries = 2, delay = 0))
+		self.assertEqual([channel for channel, payload in chip.transmitted], [9, 9, 40, 40])
+		for channel, payload in chip.transmitted:
+			self.assertEqual(list(payload[1:]), message)
+
+	def test_multi_transmit_frame_by_frame(self):
+		radio, chip = new_radio()
+		self.assertTrue(radio.multi_transmit(message, [9, 40, 71], retries = 1, delay = 0, burst = False))
+		self.assertEqual([channel for channel, payload in chip.transmitted], [9, 40, 71])
+
+	def test_stream_large_frame(self):
+		# 200 bytes is far more than the 64 byte FIFO holds, so the rest
+		# is written as the frame is sent
+		radio, chip = new_radio(byte_rate = 20000.0)
+		large_message = bytes(index & 0xff for index in range(200))
+		self.assertTrue(radio.transmit(large_message, 9))
+		self.assertEqual(chip.stream_error_count, 0)
+		self.assertEqual(chip.transmitted, [(9, bytes([200]) + large_message)])
+
+	def test_fill_fifo(self):
+		radio, chip = new_radio()
+		written = radio.fill_fifo([1, 2, 3])
+		self.assertEqual(written, bytes([radio._register_numbers['fifo'], 3, 1, 2, 3]))
+
+		# The copy returned is not changed by later writes
+		radio.transmit([4, 5], 9)
+		self.assertEqual(written, bytes([radio._register_numbers['fifo'], 3, 1, 2, 3]))
+
+		with self.assertWarns(DeprecationWarning):
+			radio.fill_fifo([1], lock = False)
+
+	def test_transmit_too_long(self):
+		radio, chip = new_radio()
+		with self.assertRaises(ValueError):
+			radio.transmit(bytes(256), 9)
+
+	def test_transmit_reliable(self):
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+
+		# Nobody listening, every attempt is made
+		result = sender.transmit_reliable(message, [9, 40], retries = 2)
+		self.assertEqual(result, lt8900_spi.TransmitResult(False, 40, 4))
+
+		receiver._apply_packet_format_config({'auto_ack': 1})
+		receiver.start_listening(40)
+		result = sender.transmit_reliable(message, [9, 40], retries = 2)
+		self.assertEqual(result, lt8900_spi.TransmitResult(True, 40, 3))
+		self.assertEqual(sender.metrics.counters['acks_received'], 1)
+		self.assertEqual(sender.metrics.counters['acks_missed'], 1)
+
+	def test_transmit_reliable_too_long(self):
+		radio, chip = new_radio()
+		with self.assertRaises(ValueError):
+			radio.transmit_reliable(bytes(63), [9])
+
+	def test_transmit_reliable_empty(self):
+		# Without a length byte, nothing would be left in the FIFO to
+		# tell whether an empty message was acknowledged
+		sender, sender_chip, receiver, receiver_chip = new_pair()
+		with self.assertRaises(ValueError):
+			sender.transmit_reliable([], [9], format_config = {'packet_length_encoded': 0})
+		self.assertEqual(sender_chip.transmitted, [])
+
+		# With one, only the length byte is left until it is
+		self.assertEqual(sender.transmit_reliable([], [9], retries = 2), lt8900_spi.TransmitResult(False, 9, 2))
+
+if __name__ == '__main__':
+	unittest.main()